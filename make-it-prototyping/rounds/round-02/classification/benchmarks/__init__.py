@@ -0,0 +1 @@
+# Performance benchmarks for the sports classification pipeline
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Cold-start time and memory: training checkpoint vs exported TorchScript model
+
+Each variant runs in a fresh interpreter, which imports what it needs, loads
+the model and class names, and classifies one image:
+
+    checkpoint  create_model + torch.load(best_model.pth), as load_and_evaluate_model does
+    exported    ExportedClassifier on the file written by src.export
+
+Reported are the wall time until the first prediction and the peak resident
+memory of the process.
+
+Usage:
+    python -m src.export --model-path ../models/best_model.pth --output ../models/sports_classifier.pt
+    python -m benchmarks.bench_cold_start --model-path ../models/best_model.pth \\
+        --exported ../models/sports_classifier.pt --model resnet50
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+CHECKPOINT_SCRIPT = '''
+import time
+start = time.perf_counter()
+import torch
+from PIL import Image
+from src.data_loader import SportsDataset, get_transforms
+from src.model import create_model
+class_names = SportsDataset({csv_file!r}, {root_dir!r}, split='train').get_class_names()
+model = create_model(model_name={model_name!r}, num_classes=len(class_names), pretrained=False)
+model.load_state_dict(torch.load({model_path!r}, map_location='cpu')['model_state_dict'])
+model.eval()
+image = get_transforms(image_size={image_size}, augment=False)['val'](Image.new('RGB', (256, 256)))
+with torch.no_grad():
+    model(image.unsqueeze(0))
+elapsed = time.perf_counter() - start
+'''
+
+EXPORTED_SCRIPT = '''
+import time
+start = time.perf_counter()
+from PIL import Image
+from src.export import ExportedClassifier
+classifier = ExportedClassifier({exported!r})
+classifier.predict([Image.new('RGB', (256, 256))])
+elapsed = time.perf_counter() - start
+'''
+
+REPORT = '''
+import json, resource
+print(json.dumps({'seconds': elapsed, 'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+def run(script):
+    result = subprocess.run([sys.executable, '-c', script + REPORT], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-path', default='../models/best_model.pth')
+    parser.add_argument('--exported', default='../models/sports_classifier.pt')
+    parser.add_argument('--model', default='resnet50')
+    parser.add_argument('--csv-file', default='../archive/sports.csv')
+    parser.add_argument('--root-dir', default='../archive')
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    scripts = {
+        'checkpoint': CHECKPOINT_SCRIPT.format(csv_file=os.path.abspath(args.csv_file),
+                                               root_dir=os.path.abspath(args.root_dir),
+                                               model_name=args.model, image_size=args.image_size,
+                                               model_path=os.path.abspath(args.model_path)),
+        'exported': EXPORTED_SCRIPT.format(exported=os.path.abspath(args.exported)),
+    }
+
+    print(f"{'variant':>10} | {'first prediction s':>18} | {'peak RSS MB':>11}")
+    for name, script in scripts.items():
+        # Best of several runs, so the numbers reflect a warm page cache for both
+        results = [run(script) for _ in range(args.repeats)]
+        seconds = min(result['seconds'] for result in results)
+        peak_rss = min(result['peak_rss_mb'] for result in results)
+        print(f"{name:>10} | {seconds:18.2f} | {peak_rss:11.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Cost of the evaluation analysis after inference on large evaluation sets
+
+Evaluation results are synthesized (no model runs), so only the analysis is
+timed: the confusion matrix, compute_metrics, analyze_misclassifications and
+save_results of ModelEvaluator, against the former per-sample Python loop
+that counted misclassified pairs in a dict keyed by class names.
+
+Usage:
+    python -m benchmarks.bench_eval_analysis --samples 100000 1000000 --classes 100
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from src.evaluate import ModelEvaluator, confusion_matrix_from_labels
+
+def per_sample_misclassifications(true_labels, predictions, class_names, top_n=10):
+    """Former analyze_misclassifications: one dict update per misclassified sample"""
+    misclass_pairs = defaultdict(int)
+    for idx in np.where(true_labels != predictions)[0]:
+        misclass_pairs[(class_names[true_labels[idx]], class_names[predictions[idx]])] += 1
+    return sorted(misclass_pairs.items(), key=lambda x: x[1], reverse=True)[:top_n]
+
+def timed_ms(fn):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--classes', type=int, default=100)
+    parser.add_argument('--accuracy', type=float, default=0.7, help='Share of correct synthetic predictions')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    class_names = [f'class {i}' for i in range(args.classes)]
+    for num_samples in args.samples:
+        true_labels = rng.integers(0, args.classes, num_samples)
+        random_predictions = rng.integers(0, args.classes, num_samples)
+        predictions = np.where(rng.random(num_samples) < args.accuracy, true_labels, random_predictions)
+
+        evaluator = ModelEvaluator(None, None, 'cpu', class_names)
+        evaluator.true_labels, evaluator.predictions = true_labels, predictions
+        evaluator.top_k_correct = int((true_labels == predictions).sum())
+
+        timings = {
+            'per-sample misclassification loop': lambda: per_sample_misclassifications(
+                true_labels, predictions, class_names),
+            'bincount confusion matrix': lambda: confusion_matrix_from_labels(
+                true_labels, predictions, args.classes),
+            'analyze_misclassifications': evaluator.analyze_misclassifications,
+            'compute_metrics (cached)': evaluator.compute_metrics,
+        }
+        print(f"\n{num_samples} samples, {args.classes} classes (ms, best of {args.repeats}):")
+        for name, fn in timings.items():
+            print(f"  {name:<36} {min(timed_ms(fn) for _ in range(args.repeats)):10.2f}")
+        with tempfile.TemporaryDirectory() as save_dir:
+            cost = min(timed_ms(lambda: evaluator.save_results(save_dir)) for _ in range(args.repeats))
+        print(f"  {'save_results (JSON + CSV)':<36} {cost:10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for SportsDataset.__getitem__ bookkeeping overhead
+
+Image decoding is left out: _load_image is replaced by a function returning
+a constant image, so the timings only cover the per-sample metadata lookup.
+The pandas `.iloc` baseline reproduces the previous implementation.
+
+Usage:
+    python -m benchmarks.bench_getitem --num-samples 13500
+"""
+
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_synthetic_csv
+from src.data_loader import SportsDataset
+
+def time_per_call(fn, num_calls, indices):
+    start = time.perf_counter()
+    for i in range(num_calls):
+        fn(indices[i])
+    return (time.perf_counter() - start) / num_calls * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num-samples', type=int, default=13500)
+    parser.add_argument('--num-calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = os.path.join(tmp_dir, 'sports.csv')
+        write_synthetic_csv(csv_file, args.num_samples)
+
+        dataset = SportsDataset(csv_file, tmp_dir, split='train')
+        image = object()
+        dataset._load_image = lambda idx: (os.path.join(dataset.root_dir, dataset.get_filepath(idx)), image)
+
+        # Previous implementation: two pandas row lookups per sample
+        frame = pd.read_csv(csv_file)
+        frame = frame[frame['data set'] == 'train']
+        frame['encoded_labels'] = dataset.labels
+
+        def iloc_getitem(idx):
+            img_path = os.path.join(tmp_dir, frame.iloc[idx]['filepaths'])
+            label = frame.iloc[idx]['encoded_labels']
+            return (img_path, image), label
+
+        indices = np.random.default_rng(0).integers(0, len(dataset), size=args.num_calls).tolist()
+        iloc_us = time_per_call(iloc_getitem, args.num_calls, indices)
+        array_us = time_per_call(dataset.__getitem__, args.num_calls, indices)
+
+        del dataset._load_image
+        frame_bytes = len(pickle.dumps(frame))
+        dataset_bytes = len(pickle.dumps(dataset))
+
+    print(f"Samples: {args.num_samples:,}, calls: {args.num_calls:,}")
+    print(f"pandas .iloc lookup:  {iloc_us:8.2f} us/sample")
+    print(f"packed array lookup:  {array_us:8.2f} us/sample  ({iloc_us / array_us:.1f}x faster)")
+    print(f"Pickled DataFrame: {frame_bytes / 1024:.1f} KiB, pickled dataset: {dataset_bytes / 1024:.1f} KiB")
+
+if __name__ == "__main__":
+    main()
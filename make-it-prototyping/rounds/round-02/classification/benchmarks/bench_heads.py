@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Compare the CustomCNN classifier heads: parameters, checkpoint size and throughput
+
+For every head the benchmark reports the parameter count of the features and
+of the head, the size of the saved state dict, and training (forward,
+backward, optimizer step) and inference throughput on random inputs.
+
+Usage:
+    python -m benchmarks.bench_heads --heads mlp gap dwsep --batch-size 16 --image-size 224
+"""
+
+import argparse
+import io
+
+import torch
+
+from benchmarks.bench_precision import time_inference, time_training
+from src.model import CUSTOM_CNN_HEADS, count_parameters, create_model
+
+def state_dict_mb(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--heads', nargs='+', default=list(CUSTOM_CNN_HEADS), choices=CUSTOM_CNN_HEADS)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--num-classes', type=int, default=100)
+    parser.add_argument('--steps', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    inputs = torch.randn(args.batch_size, 3, args.image_size, args.image_size, device=device)
+    labels = torch.randint(0, args.num_classes, (args.batch_size,), device=device)
+
+    print(f"custom_cnn, device: {device}, batch: {args.batch_size}x{args.image_size}px")
+    print(f"{'head':>6} | {'features':>10} | {'head params':>11} | {'total':>11} | {'state MB':>8} | "
+          f"{'train img/s':>11} | {'infer img/s':>11}")
+    for head in args.heads:
+        torch.manual_seed(0)
+        model = create_model(model_name='custom_cnn', num_classes=args.num_classes, head=head).to(device)
+        per_module = count_parameters(model, per_module=True)
+        head_params = per_module['neck'] + per_module['classifier']
+        infer_rate, _ = time_inference(model, inputs, device, 'fp32', args.steps, args.warmup)
+        train_rate = time_training(model, inputs, labels, device, 'fp32', args.steps, args.warmup)
+        print(f"{head:>6} | {per_module['features']:10,} | {head_params:11,} | {count_parameters(model):11,} | "
+              f"{state_dict_mb(model):8.1f} | {train_rate:11.1f} | {infer_rate:11.1f}")
+        del model
+
+if __name__ == "__main__":
+    main()
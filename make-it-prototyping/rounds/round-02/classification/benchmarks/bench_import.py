@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Import-time regression benchmark for the src package
+
+Every module is imported in a fresh interpreter with -X importtime, so the
+numbers are cold-start costs. For each module the benchmark reports the
+total import time, the packages that time is spent in and any of
+the optional heavy dependencies (plotting, sklearn, pandas, EfficientNet)
+that must only load when they are used.
+
+The eval path (`python -m src eval --help`, i.e. everything loaded before
+evaluation can start) is checked against a target: at most --eval-budget-ms
+of import time in packages that `import torch, torchvision` does not load
+itself, since those two cannot be avoided. Comparing import time per
+package within one run keeps the target stable on noisy machines, where
+wall times of separate interpreters easily differ by a second. The exit
+code is 1 when the target is missed or a lazy dependency is imported eagerly.
+
+Usage:
+    python -m benchmarks.bench_import --output ../outputs/bench_import.json
+    python -m benchmarks.bench_import --compare ../outputs/bench_import.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ('src.evaluate', 'src.train', 'src.export', 'src.serve', 'src.quantize', 'src.feature_cache',
+           'src.reporting', 'src.prediction_store', 'src.bulk_inference')
+
+# Must not be imported by merely importing a module of src
+LAZY_DEPENDENCIES = ('matplotlib', 'seaborn', 'sklearn', 'scipy', 'pandas', 'efficientnet_pytorch')
+
+def parse_importtime(stderr):
+    """
+    Return {top-level package: microseconds} from -X importtime output
+
+    Every module's own (self) time is attributed to its top-level package,
+    so e.g. 'torch' covers all torch.* modules, wherever they were imported.
+    """
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return packages
+
+def run(code, repeats, args=None):
+    """Median wall time and the importtime breakdown of a fresh interpreter running code"""
+    command = [sys.executable, '-X', 'importtime'] + (args or ['-c', code])
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    walls, packages = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=PROJECT_DIR, env=env, capture_output=True, text=True)
+        walls.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} failed:\n{result.stderr[-2000:]}")
+        packages = parse_importtime(result.stderr)
+    return statistics.median(walls), packages
+
+def loaded_lazy_dependencies(module):
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {LAZY_DEPENDENCIES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_DIR, capture_output=True, text=True)
+    return [name for name in result.stdout.strip().split(',') if name]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=list(MODULES))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--top', type=int, default=5, help='Heaviest packages to show per module')
+    parser.add_argument('--eval-budget-ms', type=float, default=300.0,
+                        help='Allowed eval-path startup on top of importing torch and torchvision')
+    parser.add_argument('--output', default='../outputs/bench_import.json')
+    parser.add_argument('--compare', default=None, help='Earlier result file to compare against')
+    args = parser.parse_args()
+
+    results = {'python': sys.version.split()[0], 'modules': {}}
+    baseline_ms, baseline_packages = run('import torch, torchvision', args.repeats)
+    results['torch_torchvision_ms'] = baseline_ms
+    print(f"import torch, torchvision: {baseline_ms:.0f} ms (baseline)")
+
+    failed = False
+    for module in args.modules:
+        wall_ms, packages = run(f'import {module}', args.repeats)
+        lazy = loaded_lazy_dependencies(module)
+        heaviest = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+        results['modules'][module] = {
+            'wall_ms': wall_ms,
+            'import_ms': sum(packages.values()) / 1000,
+            'heaviest': {name: us / 1000 for name, us in heaviest},
+            'lazy_dependencies_loaded': lazy,
+        }
+        print(f"\n{module}: {wall_ms:.0f} ms wall, {sum(packages.values()) / 1000:.0f} ms importing")
+        for name, us in heaviest:
+            print(f"  {name:<40} {us / 1000:8.1f} ms")
+        if lazy:
+            failed = True
+            print(f"  FAIL: imports {', '.join(lazy)} at module load")
+
+    eval_ms, packages = run(None, args.repeats, args=['-m', 'src', 'eval', '--help'])
+    extra = {name: us / 1000 for name, us in packages.items() if name not in baseline_packages}
+    overhead = sum(extra.values())
+    results['eval_startup'] = {'wall_ms': eval_ms, 'overhead_ms': overhead, 'budget_ms': args.eval_budget_ms,
+                               'overhead_packages': dict(sorted(extra.items(), key=lambda item: -item[1]))}
+    status = 'OK' if overhead <= args.eval_budget_ms else 'FAIL'
+    failed = failed or status == 'FAIL'
+    print(f"\nEval path (python -m src eval --help): {eval_ms:.0f} ms wall, {overhead:.0f} ms importing "
+          f"beyond torch + torchvision (target {args.eval_budget_ms:.0f} ms): {status}")
+    for name, ms in list(results['eval_startup']['overhead_packages'].items())[:args.top]:
+        print(f"  {name:<40} {ms:8.1f} ms")
+
+    if args.compare:
+        from benchmarks.bench_pipeline import print_comparison
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"\nResults written to {args.output}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
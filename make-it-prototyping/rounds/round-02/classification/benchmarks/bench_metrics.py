@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Per-step cost of metric bookkeeping in the training loop
+
+Two measurements:
+
+    bookkeeping   the metric code of one step in isolation: reading loss
+                  and accuracy back with .item() and formatting the
+                  progress bar every batch (the former Trainer loop),
+                  against queuing the sums on the device with
+                  MetricAccumulator and reading them every N steps
+    trainer       Trainer.train_epoch + validate_epoch of a small model
+                  on in-memory data for several log_interval values, so
+                  the bookkeeping is a visible share of every step
+
+On a GPU every .item() also waits for all queued kernels, which stalls
+the launch of the next step; on a CPU only the Python overhead shows.
+
+Usage:
+    python -m benchmarks.bench_metrics --intervals 1 10 50 0 --batches 200
+"""
+
+import argparse
+import os
+import time
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, TensorDataset
+from tqdm import tqdm
+
+from src.train import MetricAccumulator, Trainer
+
+# Progress bars render as in training, just not to the terminal
+DEVNULL = open(os.devnull, 'w')
+
+def per_step_item(batches, loss, outputs, labels):
+    """Former bookkeeping: three host syncs and a progress bar refresh per batch"""
+    progress_bar = tqdm(range(batches), file=DEVNULL)
+    running_loss, correct_predictions, total_samples = 0.0, 0, 0
+    for _ in progress_bar:
+        running_loss += loss.item()
+        step_loss = loss.item()
+        _, predicted = torch.max(outputs.data, 1)
+        total_samples += labels.size(0)
+        correct_predictions += (predicted == labels).sum().item()
+        progress_bar.set_postfix({
+            'Loss': f'{step_loss:.4f}',
+            'Acc': f'{100 * correct_predictions / total_samples:.2f}%'
+        })
+    return running_loss, correct_predictions
+
+def accumulated(batches, loss, outputs, labels, device, interval):
+    progress_bar = tqdm(range(batches), file=DEVNULL)
+    metrics = MetricAccumulator(device)
+    for step in progress_bar:
+        metrics.update(loss, outputs, labels)
+        if interval and (step + 1) % interval == 0:
+            progress_bar.set_postfix(metrics.postfix())
+    return metrics.sync()
+
+def timed_us(fn, batches, device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    fn()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / batches * 1e6
+
+def make_model(num_features, num_classes, width):
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Linear(num_features, width), nn.ReLU(), nn.Linear(width, num_classes))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--intervals', type=int, nargs='+', default=[1, 10, 50, 0],
+                        help='log_interval values to compare (0: only at epoch end)')
+    parser.add_argument('--batches', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--num-classes', type=int, default=100)
+    parser.add_argument('--num-features', type=int, default=64, help='Inputs of the benchmark model')
+    parser.add_argument('--width', type=int, default=64, help='Hidden units of the benchmark model')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"Device: {device}, {args.batches} batches of {args.batch_size}")
+
+    outputs = torch.randn(args.batch_size, args.num_classes, device=device)
+    labels = torch.randint(0, args.num_classes, (args.batch_size,), device=device)
+    loss = nn.functional.cross_entropy(outputs, labels)
+
+    print("\nBookkeeping only (us per step):")
+    baseline = min(timed_us(lambda: per_step_item(args.batches, loss, outputs, labels), args.batches, device)
+                   for _ in range(args.repeats))
+    print(f"  {'.item() every step':<28} {baseline:8.1f}")
+    for interval in args.intervals:
+        cost = min(timed_us(lambda: accumulated(args.batches, loss, outputs, labels, device, interval),
+                            args.batches, device) for _ in range(args.repeats))
+        print(f"  {f'accumulator, interval {interval}':<28} {cost:8.1f}   ({baseline - cost:+.1f} saved)")
+
+    inputs = torch.randn(args.batches * args.batch_size, args.num_features)
+    targets = torch.randint(0, args.num_classes, (len(inputs),))
+    loader = DataLoader(TensorDataset(inputs, targets), batch_size=args.batch_size)
+
+    trainers = {}
+    for interval in args.intervals:
+        model = make_model(args.num_features, args.num_classes, args.width).to(device)
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+        trainers[interval] = Trainer(model, loader, loader, nn.CrossEntropyLoss(), optimizer, device,
+                                     log_interval=interval)
+        trainers[interval].is_main_process = True
+        trainers[interval].train_epoch()
+
+    # Interleaved repeats, so drifting machine load affects every interval alike
+    times = {interval: [] for interval in args.intervals}
+    for _ in range(args.repeats):
+        for interval, trainer in trainers.items():
+            times[interval].append(timed_us(lambda: (trainer.train_epoch(), trainer.validate_epoch()),
+                                            2 * args.batches, device))
+
+    print("\nTrainer.train_epoch + validate_epoch (us per step):")
+    reference = min(times[args.intervals[0]])
+    for interval in args.intervals:
+        cost = min(times[interval])
+        print(f"  {f'log_interval {interval}':<28} {cost:8.1f}   ({reference - cost:+.1f} saved)")
+
+if __name__ == "__main__":
+    main()
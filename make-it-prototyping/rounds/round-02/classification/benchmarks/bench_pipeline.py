@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+End-to-end training pipeline benchmark on a synthetic dataset
+
+Generates (or reuses) a synthetic sports.csv + JPEG tree and times every
+stage of the training pipeline separately:
+
+    data     CSV parsing (DatasetIndex), SportsDataset construction,
+             __getitem__ (decode + augmentation), collation, and a full
+             DataLoader pass
+    models   forward, backward and optimizer step for every architecture,
+             plus a Trainer.train_epoch pass over the same data
+
+Results are written as JSON together with the environment. With --compare,
+every timing is also shown relative to an earlier result file, so
+regressions in data_loader.py, model.py or Trainer show up as ratios.
+
+Usage:
+    python -m benchmarks.bench_pipeline --models resnet18 custom_cnn --output ../outputs/bench_pipeline.json
+    python -m benchmarks.bench_pipeline --compare ../outputs/bench_pipeline.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+
+import torch
+import torch.nn as nn
+import torchvision
+from torch.utils.data import DataLoader, Subset
+from torch.utils.data.dataloader import default_collate
+
+from benchmarks.synthetic import write_synthetic_dataset
+from src.data_loader import SportsDataset, get_transforms
+from src.dataset_index import DatasetIndex
+from src.model import MODEL_NAMES, count_parameters, create_model
+from src.train import Trainer
+
+def timed(fn, repeats, device=None):
+    """Median wall time of fn() in milliseconds"""
+    times = []
+    for _ in range(repeats):
+        if device is not None and device.type == 'cuda':
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        fn()
+        if device is not None and device.type == 'cuda':
+            torch.cuda.synchronize()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def bench_data(csv_file, root_dir, image_size, batch_size, num_workers, repeats, num_samples):
+    transform = get_transforms(image_size=image_size)['train']
+    index = DatasetIndex.from_csv(csv_file)
+    dataset = SportsDataset(csv_file, root_dir, transform=transform, split='train', index=index)
+    num_samples = min(num_samples, len(dataset))
+
+    samples = [dataset[i] for i in range(batch_size)]
+    getitem_ms = timed(lambda: [dataset[i] for i in range(num_samples)], repeats) / num_samples
+
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers)
+    start = time.perf_counter()
+    for _ in loader:
+        pass
+    loader_seconds = time.perf_counter() - start
+
+    return {
+        'num_train_images': len(dataset),
+        'csv_load_ms': timed(lambda: DatasetIndex.from_csv(csv_file), repeats),
+        'dataset_init_ms': timed(lambda: SportsDataset(csv_file, root_dir, transform=transform, index=index), repeats),
+        'getitem_ms': getitem_ms,
+        'collate_ms': timed(lambda: default_collate(samples), repeats),
+        'loader_images_per_sec': len(dataset) / loader_seconds,
+    }
+
+def bench_model(model_name, dataset, num_classes, device, batch_size, steps, warmup, trainer_batches):
+    torch.manual_seed(0)
+    model = create_model(model_name=model_name, num_classes=num_classes, pretrained=False).to(device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+    inputs, labels = default_collate([dataset[i % len(dataset)] for i in range(batch_size)])
+    inputs, labels = inputs.to(device), labels.to(device)
+    model.train()
+
+    state = {}
+
+    def forward():
+        state['loss'] = criterion(model(inputs), labels)
+
+    def backward():
+        state['loss'].backward()
+
+    def optimizer_step():
+        optimizer.step()
+        optimizer.zero_grad()
+
+    for _ in range(warmup):
+        forward()
+        backward()
+        optimizer_step()
+
+    forward_ms, backward_ms, optimizer_ms = [], [], []
+    for _ in range(steps):
+        forward_ms.append(timed(forward, 1, device))
+        backward_ms.append(timed(backward, 1, device))
+        optimizer_ms.append(timed(optimizer_step, 1, device))
+    step_ms = statistics.median(forward_ms) + statistics.median(backward_ms) + statistics.median(optimizer_ms)
+
+    # The full Trainer loop, including data loading, on a fixed number of batches
+    subset = Subset(dataset, range(min(len(dataset), trainer_batches * batch_size)))
+    loader = DataLoader(subset, batch_size=batch_size, shuffle=False, num_workers=0)
+    trainer = Trainer(model, loader, loader, criterion, optimizer, device)
+    start = time.perf_counter()
+    trainer.train_epoch()
+    trainer_seconds = time.perf_counter() - start
+
+    return {
+        'parameters': count_parameters(model),
+        'forward_ms': statistics.median(forward_ms),
+        'backward_ms': statistics.median(backward_ms),
+        'optimizer_ms': statistics.median(optimizer_ms),
+        'step_ms': step_ms,
+        'train_images_per_sec': batch_size / step_ms * 1000,
+        'trainer_epoch_images_per_sec': len(subset) / trainer_seconds,
+    }
+
+def environment(device):
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'torch': torch.__version__,
+        'torchvision': torchvision.__version__,
+        'device': torch.cuda.get_device_name(device) if device.type == 'cuda' else 'cpu',
+        'cpu_count': os.cpu_count(),
+        'torch_threads': torch.get_num_threads(),
+    }
+
+def print_comparison(results, baseline):
+    """Print every timing next to the baseline; ratios above 1 are slower"""
+    def rows(current, previous, prefix):
+        for key, value in current.items():
+            if isinstance(value, dict) and isinstance(previous.get(key), dict):
+                yield from rows(value, previous[key], f'{prefix}{key}.')
+            elif isinstance(value, (int, float)) and isinstance(previous.get(key), (int, float)) and previous[key]:
+                if key.endswith('_ms'):
+                    yield f'{prefix}{key}', previous[key], value, value / previous[key]
+                elif key.endswith('_per_sec'):
+                    yield f'{prefix}{key}', previous[key], value, previous[key] / value
+
+    print(f"\n{'metric':<48} | {'baseline':>10} | {'current':>10} | {'slowdown':>8}")
+    for name, previous, current, ratio in rows(results, baseline, ''):
+        print(f"{name:<48} | {previous:10.2f} | {current:10.2f} | {ratio:7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', nargs='+', default=list(MODEL_NAMES), choices=MODEL_NAMES)
+    parser.add_argument('--data-dir', default=None, help='Synthetic dataset location (default: a temporary directory)')
+    parser.add_argument('--num-classes', type=int, default=10)
+    parser.add_argument('--train-per-class', type=int, default=20)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--num-workers', type=int, default=0)
+    parser.add_argument('--steps', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--getitem-samples', type=int, default=64)
+    parser.add_argument('--trainer-batches', type=int, default=4)
+    parser.add_argument('--output', default='../outputs/bench_pipeline.json')
+    parser.add_argument('--compare', default=None, help='Earlier result file to compare against')
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root_dir = args.data_dir or tmp_dir
+        csv_file = write_synthetic_dataset(root_dir, num_classes=args.num_classes,
+                                           train_per_class=args.train_per_class, image_size=args.image_size)
+
+        print(f"Device: {device}, synthetic dataset: {args.num_classes} classes x {args.train_per_class} images")
+        results = {
+            'environment': environment(device),
+            'config': vars(args),
+            'data': bench_data(csv_file, root_dir, args.image_size, args.batch_size, args.num_workers,
+                               args.repeats, args.getitem_samples),
+            'models': {},
+        }
+        for name, value in results['data'].items():
+            print(f"  data.{name}: {value:.3f}")
+
+        dataset = SportsDataset(csv_file, root_dir, transform=get_transforms(image_size=args.image_size)['train'])
+        for model_name in args.models:
+            print(f"\nBenchmarking {model_name}...")
+            model_results = bench_model(model_name, dataset, args.num_classes, device, args.batch_size,
+                                        args.steps, args.warmup, args.trainer_batches)
+            results['models'][model_name] = model_results
+            print(f"  forward {model_results['forward_ms']:.1f} ms, backward {model_results['backward_ms']:.1f} ms, "
+                  f"optimizer {model_results['optimizer_ms']:.1f} ms, "
+                  f"{model_results['train_images_per_sec']:.1f} img/s "
+                  f"(Trainer: {model_results['trainer_epoch_images_per_sec']:.1f} img/s)")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
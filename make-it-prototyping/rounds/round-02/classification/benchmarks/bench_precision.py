@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Compare fp32 and mixed-precision training/inference throughput
+
+For each precision the benchmark times training steps (forward, backward,
+optimizer step) and inference batches on random inputs, then compares the
+inference logits against fp32. With --checkpoint, --csv-file and --root-dir
+it also evaluates test accuracy of a trained model in every precision.
+
+Usage:
+    python -m benchmarks.bench_precision --model resnet18 --precisions fp32 bf16
+"""
+
+import argparse
+import time
+
+import torch
+import torch.nn as nn
+
+from src.model import create_model
+from src.precision import PRECISIONS, autocast, create_grad_scaler
+
+def time_training(model, inputs, labels, device, precision, steps, warmup):
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+    scaler = create_grad_scaler(device, precision)
+    model.train()
+
+    def step():
+        optimizer.zero_grad()
+        with autocast(device, precision):
+            loss = criterion(model(inputs), labels)
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
+
+    for _ in range(warmup):
+        step()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    return steps * inputs.size(0) / (time.perf_counter() - start)
+
+def time_inference(model, inputs, device, precision, steps, warmup):
+    model.eval()
+    with torch.no_grad():
+        for _ in range(warmup):
+            with autocast(device, precision):
+                model(inputs)
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        for _ in range(steps):
+            with autocast(device, precision):
+                outputs = model(inputs)
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+    return steps * inputs.size(0) / (time.perf_counter() - start), outputs.float()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='resnet18')
+    parser.add_argument('--precisions', nargs='+', default=['fp32', 'bf16'], choices=list(PRECISIONS))
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--num-classes', type=int, default=100)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--checkpoint', help='Trained model to evaluate in every precision')
+    parser.add_argument('--csv-file', default='../archive/sports.csv')
+    parser.add_argument('--root-dir', default='../archive')
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    torch.manual_seed(0)
+    model = create_model(model_name=args.model, num_classes=args.num_classes, pretrained=False).to(device)
+    initial_state = {k: v.clone() for k, v in model.state_dict().items()}
+    inputs = torch.randn(args.batch_size, 3, args.image_size, args.image_size, device=device)
+    labels = torch.randint(0, args.num_classes, (args.batch_size,), device=device)
+
+    print(f"Model: {args.model}, device: {device}, batch: {args.batch_size}x{args.image_size}px")
+    print(f"{'precision':>9} | {'train img/s':>11} | {'infer img/s':>11} | {'top-1 agree':>11} | {'max |dlogit|':>12}")
+
+    reference = None
+    for precision in args.precisions:
+        model.load_state_dict(initial_state)
+        infer_rate, outputs = time_inference(model, inputs, device, precision, args.steps, args.warmup)
+        if reference is None:
+            reference = outputs
+        agreement = (outputs.argmax(1) == reference.argmax(1)).float().mean().item()
+        max_diff = (outputs - reference).abs().max().item()
+        train_rate = time_training(model, inputs, labels, device, precision, args.steps, args.warmup)
+        print(f"{precision:>9} | {train_rate:11.1f} | {infer_rate:11.1f} | {agreement:11.3f} | {max_diff:12.4f}")
+
+    if args.checkpoint:
+        from src.evaluate import load_and_evaluate_model
+
+        print("\nTest accuracy of the trained model:")
+        for precision in args.precisions:
+            _, metrics = load_and_evaluate_model(
+                args.checkpoint, csv_file=args.csv_file, root_dir=args.root_dir,
+                model_name=args.model, batch_size=args.batch_size, image_size=args.image_size,
+                precision=precision, save_dir=f'../outputs/precision_{precision}'
+            )
+            print(f"{precision:>9}: accuracy {metrics['accuracy']:.4f}")
+
+if __name__ == "__main__":
+    main()
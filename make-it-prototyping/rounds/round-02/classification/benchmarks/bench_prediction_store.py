@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Size and speed of the prediction output formats
+
+Synthetic predictions for many samples are written as the CSV of
+ModelEvaluator.save_results (class names, no probabilities; one more
+variant adds the full probability matrix as text columns) and as prediction
+stores with full, top-k and uint8-quantized probabilities. For every format
+the benchmark reports the size on disk, the write time and the time to read
+back the predictions and compute the accuracy.
+
+Usage:
+    python -m benchmarks.bench_prediction_store --samples 200000 --classes 100
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from src.prediction_store import PredictionStore, PredictionWriter
+
+def directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def write_csv(path, class_names, labels, predictions, paths, probs=None):
+    import pandas as pd
+
+    data = {
+        'true_label': pd.Categorical.from_codes(labels, categories=class_names),
+        'predicted_label': pd.Categorical.from_codes(predictions, categories=class_names),
+        'correct': labels == predictions,
+        'path': paths,
+    }
+    if probs is not None:
+        for i, name in enumerate(class_names):
+            data[f'p_{name}'] = probs[:, i]
+    pd.DataFrame(data).to_csv(path, index=False)
+
+def read_csv_accuracy(path):
+    import pandas as pd
+
+    df = pd.read_csv(path, usecols=['true_label', 'predicted_label'])
+    return (df['true_label'] == df['predicted_label']).mean()
+
+def read_store_accuracy(path):
+    store = PredictionStore(path)
+    return (store.predictions == store.labels).mean()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=200000)
+    parser.add_argument('--classes', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=256, help='Rows per write() of the stores')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    class_names = [f'class {i}' for i in range(args.classes)]
+    logits = rng.standard_normal((args.samples, args.classes), dtype=np.float32) * 3
+    probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probs /= probs.sum(axis=1, keepdims=True)
+    predictions = probs.argmax(axis=1)
+    labels = np.where(rng.random(args.samples) < 0.7, predictions, rng.integers(0, args.classes, args.samples))
+    paths = [f'test/{class_names[label]}/{i:07d}.jpg' for i, label in enumerate(labels)]
+    top_indices = np.argsort(-probs, axis=1)[:, :args.top_k]
+    top_probs = np.take_along_axis(probs, top_indices, axis=1)
+
+    variants = {
+        'store, full float32': dict(probs='full', probs_dtype='float32'),
+        'store, full float16': dict(probs='full', probs_dtype='float16'),
+        'store, full uint8': dict(probs='full', probs_dtype='uint8'),
+        f'store, top-{args.top_k} float16': dict(probs='topk', probs_dtype='float16'),
+        'store, no probabilities': dict(probs='none', probs_dtype='float16'),
+    }
+
+    print(f"{args.samples} samples, {args.classes} classes\n")
+    print(f"{'format':<28} {'size (MB)':>10} {'write (s)':>10} {'read (s)':>10}")
+    output_dir = tempfile.mkdtemp()
+    try:
+        for name, with_probs in (('csv, no probabilities', False), ('csv, full probabilities', True)):
+            path = os.path.join(output_dir, 'predictions.csv')
+            start = time.perf_counter()
+            write_csv(path, class_names, labels, predictions, paths, probs if with_probs else None)
+            write_s = time.perf_counter() - start
+            start = time.perf_counter()
+            read_csv_accuracy(path)
+            read_s = time.perf_counter() - start
+            print(f"{name:<28} {directory_size(path) / 1e6:10.1f} {write_s:10.2f} {read_s:10.2f}")
+
+        for name, options in variants.items():
+            path = os.path.join(output_dir, 'store')
+            start = time.perf_counter()
+            with PredictionWriter(path, class_names, top_k=args.top_k, **options) as writer:
+                for begin in range(0, args.samples, args.batch_size):
+                    rows = slice(begin, begin + args.batch_size)
+                    batch_probs = {'full': probs[rows], 'topk': top_probs[rows], 'none': None}[options['probs']]
+                    writer.write(predictions[rows], labels[rows], paths=paths[rows], probs=batch_probs,
+                                 top_k_indices=top_indices[rows] if options['probs'] == 'topk' else None)
+            write_s = time.perf_counter() - start
+            start = time.perf_counter()
+            read_store_accuracy(path)
+            read_s = time.perf_counter() - start
+            print(f"{name:<28} {directory_size(path) / 1e6:10.1f} {write_s:10.2f} {read_s:10.2f}")
+            shutil.rmtree(path)
+    finally:
+        shutil.rmtree(output_dir)
+
+if __name__ == "__main__":
+    main()
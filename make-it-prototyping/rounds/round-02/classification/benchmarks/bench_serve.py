@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Load generator for the micro-batching inference server (src/serve.py)
+
+Opens --concurrency keep-alive connections that each send --requests-per-client
+predictions back to back, and reports p50/p99 latency, throughput and the
+mean batch size the server formed. By default an in-process server with a
+randomly initialized model is started for every --max-batch-sizes value, so
+batched and unbatched (max batch 1) serving can be compared; with --port the
+load goes to an already running server instead.
+
+Usage:
+    python -m benchmarks.bench_serve --model resnet18 --max-batch-sizes 1 8 32 --concurrency 32
+    python -m benchmarks.bench_serve --port 8000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src.model import create_model
+from src.serve import InferenceServer
+
+def make_jpeg(image_size, seed=0):
+    """Encode a random image, as a client would upload it"""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(image_size, image_size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+async def post_image(reader, writer, image_bytes):
+    writer.write(b'POST /predict HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/octet-stream\r\n'
+                 + f'Content-Length: {len(image_bytes)}\r\n\r\n'.encode() + image_bytes)
+    await writer.drain()
+    status = (await reader.readline()).split()[1]
+    content_length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            content_length = int(value)
+    body = await reader.readexactly(content_length)
+    if status != b'200':
+        raise RuntimeError(f"Server answered {status.decode()}: {body.decode()}")
+    return json.loads(body)
+
+async def client(host, port, image_bytes, num_requests, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(num_requests):
+            start = time.perf_counter()
+            await post_image(reader, writer, image_bytes)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+async def generate_load(host, port, image_bytes, concurrency, requests_per_client):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, image_bytes, requests_per_client, latencies)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return np.array(latencies) * 1000, len(latencies) / elapsed
+
+async def run_in_process(args, model, class_names, image_bytes, max_batch_size):
+    server = InferenceServer(model, class_names, torch.device('cpu'), image_size=args.image_size,
+                             max_batch_size=max_batch_size, max_wait_ms=args.max_wait_ms,
+                             precision=args.precision)
+    await server.start(host='127.0.0.1', port=0)
+    port = server._server.sockets[0].getsockname()[1]
+    try:
+        # Warm up the model before measuring
+        await generate_load('127.0.0.1', port, image_bytes, 1, args.warmup)
+        server.batcher.num_batches = server.batcher.num_items = 0
+        latencies, throughput = await generate_load('127.0.0.1', port, image_bytes, args.concurrency,
+                                                    args.requests_per_client)
+        mean_batch = server.batcher.num_items / max(server.batcher.num_batches, 1)
+    finally:
+        await server.stop()
+    return latencies, throughput, mean_batch
+
+def report(label, latencies, throughput, mean_batch=None):
+    p50, p99 = np.percentile(latencies, [50, 99])
+    batch = f'{mean_batch:10.1f}' if mean_batch is not None else f'{"-":>10}'
+    print(f"{label:>9} | {p50:8.1f} | {p99:8.1f} | {throughput:8.1f} | {batch}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='resnet18')
+    parser.add_argument('--num-classes', type=int, default=100)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--max-batch-sizes', nargs='+', type=int, default=[1, 32])
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--precision', default='fp32')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests-per-client', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help='Benchmark a running server instead')
+    args = parser.parse_args()
+
+    image_bytes = make_jpeg(args.image_size)
+    print(f"{args.concurrency} clients x {args.requests_per_client} requests")
+    print(f"{'max batch':>9} | {'p50 ms':>8} | {'p99 ms':>8} | {'img/s':>8} | {'mean batch':>10}")
+
+    if args.port is not None:
+        latencies, throughput = asyncio.run(generate_load(args.host, args.port, image_bytes, args.concurrency,
+                                                          args.requests_per_client))
+        report('server', latencies, throughput)
+        return
+
+    torch.manual_seed(0)
+    model = create_model(model_name=args.model, num_classes=args.num_classes, pretrained=False)
+    class_names = [f'class {i}' for i in range(args.num_classes)]
+    for max_batch_size in args.max_batch_sizes:
+        latencies, throughput, mean_batch = asyncio.run(
+            run_in_process(args, model, class_names, image_bytes, max_batch_size)
+        )
+        report(str(max_batch_size), latencies, throughput, mean_batch)
+
+if __name__ == "__main__":
+    main()
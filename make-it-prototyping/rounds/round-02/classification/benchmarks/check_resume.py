@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Check that resuming from last_checkpoint.pth reproduces an uninterrupted run
+
+For every augmentation mode (per-sample transforms and batch-level
+flip/rotation/color jitter (BatchAugmentation)) a small model is trained on a synthetic dataset once without
+interruption and once stopped right after a mid-epoch last_checkpoint.pth
+was written, then resumed from it. The loss and accuracy histories and the
+final weights of both runs must be identical. Runs on CPU; exits with status
+1 on any mismatch (tests/test_resume.py runs it under pytest).
+
+Usage:
+    python -m benchmarks.check_resume --num-epochs 3 --checkpoint-every-steps 2 --interrupt-after 5
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+import torch
+
+import src.train as train_module
+from benchmarks.synthetic import write_synthetic_dataset
+
+AUGMENT_MODES = {'per-sample': False, 'batch': True}
+
+class Interrupted(Exception):
+    pass
+
+@contextlib.contextmanager
+def interrupt_after_checkpoints(count):
+    """Raise Interrupted once last_checkpoint.pth has been written count times"""
+    save_last_checkpoint = train_module.Trainer._save_last_checkpoint
+    calls = [0]
+
+    def interrupting(self, epoch_progress=None):
+        save_last_checkpoint(self, epoch_progress)
+        calls[0] += 1
+        if calls[0] == count:
+            raise Interrupted
+    train_module.Trainer._save_last_checkpoint = interrupting
+    try:
+        yield
+    finally:
+        train_module.Trainer._save_last_checkpoint = save_last_checkpoint
+
+def train_quietly(**kwargs):
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return train_module.train_sports_classifier(**kwargs)
+
+def compare_runs(reference, resumed):
+    """Names of the histories and weights that differ between two (model, trainer) results"""
+    mismatches = []
+    for name in ('train_losses', 'val_losses', 'train_accuracies', 'val_accuracies'):
+        # Epochs without a full validation hold NaN
+        if not np.array_equal(getattr(reference[1], name), getattr(resumed[1], name), equal_nan=True):
+            mismatches.append(name)
+    reference_state, resumed_state = reference[0].state_dict(), resumed[0].state_dict()
+    if reference_state.keys() != resumed_state.keys() or not all(
+            torch.equal(reference_state[key], resumed_state[key]) for key in reference_state):
+        mismatches.append('state_dict')
+    return mismatches
+
+def check_resume(csv_file, root_dir, output_dir, batch_augment, args):
+    common = dict(csv_file=csv_file, root_dir=root_dir, model_name=args.model, num_epochs=args.num_epochs,
+                  batch_size=args.batch_size, image_size=args.image_size, pretrained=False, num_workers=0,
+                  batch_augment=batch_augment, checkpoint_every_steps=args.checkpoint_every_steps,
+                  report='none')
+    reference = train_quietly(save_dir=os.path.join(output_dir, 'uninterrupted'), seed=args.seed, **common)
+
+    save_dir = os.path.join(output_dir, 'interrupted')
+    try:
+        with interrupt_after_checkpoints(args.interrupt_after):
+            train_quietly(save_dir=save_dir, seed=args.seed, **common)
+    except Interrupted:
+        pass
+    else:
+        raise ValueError(f"The run wrote fewer than {args.interrupt_after} checkpoints, "
+                         f"lower --interrupt-after or train longer")
+    checkpoint_file = os.path.join(save_dir, 'last_checkpoint.pth')
+    checkpoint = torch.load(checkpoint_file, map_location='cpu')
+    progress = checkpoint.get('epoch_progress')
+    position = f"epoch {checkpoint['epoch'] + 1}, batch {progress['batches']}" if progress else \
+        f"start of epoch {checkpoint['epoch'] + 1}"
+
+    # The seed comes from the checkpoint
+    resumed = train_quietly(save_dir=save_dir, resume_from=checkpoint_file, **common)
+    return position, compare_runs(reference, resumed)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=None, help='Synthetic dataset location (default: a temporary directory)')
+    parser.add_argument('--model', default='resnet18')
+    parser.add_argument('--num-classes', type=int, default=5)
+    parser.add_argument('--train-per-class', type=int, default=10)
+    parser.add_argument('--image-size', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--num-epochs', type=int, default=3)
+    parser.add_argument('--checkpoint-every-steps', type=int, default=2)
+    parser.add_argument('--interrupt-after', type=int, default=5,
+                        help='Stop the interrupted run after this many writes of last_checkpoint.pth')
+    parser.add_argument('--seed', type=int, default=123)
+    parser.add_argument('--augment', nargs='+', default=list(AUGMENT_MODES), choices=list(AUGMENT_MODES))
+    args = parser.parse_args(argv)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root_dir = args.data_dir or os.path.join(tmp_dir, 'data')
+        csv_file = write_synthetic_dataset(root_dir, num_classes=args.num_classes,
+                                           train_per_class=args.train_per_class, image_size=args.image_size)
+        for mode in args.augment:
+            output_dir = os.path.join(tmp_dir, mode)
+            position, mismatches = check_resume(csv_file, root_dir, output_dir, AUGMENT_MODES[mode], args)
+            if mismatches:
+                failed = True
+                print(f"{mode} augmentation: resumed at {position}, MISMATCH in {', '.join(mismatches)}")
+            else:
+                print(f"{mode} augmentation: resumed at {position}, identical to the uninterrupted run")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
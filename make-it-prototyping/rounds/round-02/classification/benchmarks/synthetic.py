@@ -0,0 +1,90 @@
+"""
+Synthetic stand-ins for the sports dataset, so benchmarks run offline
+
+write_synthetic_csv only writes a sports.csv-shaped file (no images behind
+it); write_synthetic_dataset also writes the JPEG tree. Every class gets its
+own base color, so models can learn something from the synthetic images.
+
+Usage:
+    python -m benchmarks.synthetic --root-dir /tmp/sports_synthetic --num-classes 100 --train-per-class 20
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+def class_names(num_classes):
+    return [f'sport {i:03d}' for i in range(num_classes)]
+
+def write_synthetic_csv(csv_file, num_samples, num_classes=100):
+    """Write a sports.csv-shaped file without any images behind it"""
+    labels = [class_names(num_classes)[i % num_classes] for i in range(num_samples)]
+    pd.DataFrame({
+        'class id': [i % num_classes for i in range(num_samples)],
+        'filepaths': [f'train/{label}/{i:05d}.jpg' for i, label in enumerate(labels)],
+        'labels': labels,
+        'data set': 'train'
+    }).to_csv(csv_file, index=False)
+
+def write_synthetic_dataset(root_dir, num_classes=10, train_per_class=20, valid_per_class=5, test_per_class=5,
+                            image_size=224, seed=0, overwrite=False):
+    """
+    Write sports.csv and a JPEG tree laid out like the real dataset
+
+    Args:
+        root_dir (str): Directory to create; images go to <split>/<class>/<n>.jpg
+        num_classes (int): Number of classes
+        train_per_class (int): Training images per class
+        valid_per_class (int): Validation images per class
+        test_per_class (int): Test images per class
+        image_size (int): Width and height of the images
+        seed (int): Seed of the image noise
+        overwrite (bool): Rewrite the dataset even if sports.csv already exists
+
+    Returns:
+        str: Path to the written sports.csv
+    """
+    csv_file = os.path.join(root_dir, 'sports.csv')
+    if os.path.exists(csv_file) and not overwrite:
+        return csv_file
+
+    rng = np.random.default_rng(seed)
+    names = class_names(num_classes)
+    base_colors = rng.integers(40, 216, size=(num_classes, 3))
+    rows = []
+    for split, per_class in (('train', train_per_class), ('valid', valid_per_class), ('test', test_per_class)):
+        for class_id, name in enumerate(names):
+            os.makedirs(os.path.join(root_dir, split, name), exist_ok=True)
+            for i in range(per_class):
+                filepath = f'{split}/{name}/{i:04d}.jpg'
+                noise = rng.integers(-40, 41, size=(image_size, image_size, 3))
+                pixels = np.clip(base_colors[class_id] + noise, 0, 255).astype(np.uint8)
+                Image.fromarray(pixels).save(os.path.join(root_dir, filepath), quality=90)
+                rows.append((class_id, filepath, name, split))
+
+    # Written last, so an interrupted run is not mistaken for a complete dataset
+    pd.DataFrame(rows, columns=['class id', 'filepaths', 'labels', 'data set']).to_csv(csv_file, index=False)
+    return csv_file
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root-dir', required=True)
+    parser.add_argument('--num-classes', type=int, default=10)
+    parser.add_argument('--train-per-class', type=int, default=20)
+    parser.add_argument('--valid-per-class', type=int, default=5)
+    parser.add_argument('--test-per-class', type=int, default=5)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args()
+
+    csv_file = write_synthetic_dataset(args.root_dir, num_classes=args.num_classes,
+                                       train_per_class=args.train_per_class, valid_per_class=args.valid_per_class,
+                                       test_per_class=args.test_per_class, image_size=args.image_size,
+                                       overwrite=args.overwrite)
+    print(f"Synthetic dataset written to {csv_file}")
+
+if __name__ == "__main__":
+    main()
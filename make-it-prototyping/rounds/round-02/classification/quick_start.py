@@ -6,27 +6,14 @@ This script demonstrates how to get started with the project
 
 import os
 import sys
-import torch
 
 # Add src to path
 sys.path.append('src')
 
-from src.train import train_sports_classifier
-from src.evaluate import load_and_evaluate_model
-from src.data_loader import create_data_loaders, visualize_batch
-
 def main():
     print("=== Sports Classification Quick Start ===\n")
     
-    # Check if GPU is available
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    print(f"Using device: {device}")
-    if device.type == 'cuda':
-        print(f"GPU: {torch.cuda.get_device_name(0)}")
-        print(f"Memory: {torch.cuda.get_device_properties(0).total_memory / 1e9:.1f} GB")
-    print()
-    
-    # Check if data exists
+    # Check if data exists before loading torch and the training stack
     data_paths = {
         'csv': '../archive/sports.csv',
         'root': '../archive'
@@ -40,6 +27,16 @@ def main():
             print("Please ensure your data is in the correct location.")
             return
     
+    import torch
+    from src.data_loader import create_data_loaders, visualize_batch
+    
+    # Check if GPU is available
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"\nUsing device: {device}")
+    if device.type == 'cuda':
+        print(f"GPU: {torch.cuda.get_device_name(0)}")
+        print(f"Memory: {torch.cuda.get_device_properties(0).total_memory / 1e9:.1f} GB")
+    
     print("\n=== Data Overview ===")
     
     # Create data loaders to inspect the dataset
@@ -79,6 +76,12 @@ def main():
     
     choice = input("\nEnter your choice (1-5): ")
     
+    # Only the modules the chosen path needs are imported
+    if choice in ['1', '2', '3']:
+        from src.train import train_sports_classifier
+    if choice in ['1', '2', '3', '4']:
+        from src.evaluate import load_and_evaluate_model
+    
     if choice == '1':
         print("\n=== Quick Training ===")
         model, trainer = train_sports_classifier(
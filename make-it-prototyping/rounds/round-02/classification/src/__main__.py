@@ -0,0 +1,73 @@
+"""
+Command-line entry point: python -m src <command> [options]
+
+Commands:
+    train      Train a model (src/train.py)
+    train-head Train only the head of a frozen backbone on cached features (src/feature_cache.py)
+    eval       Evaluate a checkpoint on the test split (src/evaluate.py)
+    export     Export a checkpoint as a self-contained TorchScript file (src/export.py)
+    quantize   Post-training int8 quantization with a report (src/quantize.py)
+    serve      HTTP inference server (src/serve.py)
+    infer      Sharded, resumable batch inference over an image directory (src/bulk_inference.py)
+    bench      Run a benchmark: python -m src bench <name> [options], e.g. bench pipeline
+
+Every command only imports the modules it needs, so e.g. `python -m src eval`
+does not load the training stack. `python -m src <command> --help` lists the
+options of a command.
+"""
+
+import importlib
+import os
+import sys
+
+COMMANDS = {
+    'train': '.train',
+    'train-head': '.feature_cache',
+    'eval': '.evaluate',
+    'export': '.export',
+    'quantize': '.quantize',
+    'serve': '.serve',
+    'infer': '.bulk_inference',
+}
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def available_benchmarks():
+    benchmark_dir = os.path.join(PROJECT_DIR, 'benchmarks')
+    return sorted(name[len('bench_'):-len('.py')] for name in os.listdir(benchmark_dir)
+                  if name.startswith('bench_') and name.endswith('.py'))
+
+def run_benchmark(argv):
+    if not argv or argv[0] in ('-h', '--help'):
+        print("usage: python -m src bench <name> [options]\n\nBenchmarks: " + ', '.join(available_benchmarks()))
+        return 0
+    name, options = argv[0], argv[1:]
+    if name not in available_benchmarks():
+        print(f"Unknown benchmark: {name}. Choose from {', '.join(available_benchmarks())}")
+        return 2
+    # benchmarks/ is a sibling of src/ and imports it as a top-level package
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    module_name = f'benchmarks.bench_{name}'
+    module = importlib.import_module(module_name)
+    sys.argv = [module_name] + options
+    module.main()
+    return 0
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(__doc__.strip())
+        return 0
+    command, options = argv[0], argv[1:]
+    if command == 'bench':
+        return run_benchmark(options)
+    if command not in COMMANDS:
+        print(f"Unknown command: {command}. Choose from {', '.join(list(COMMANDS) + ['bench'])}")
+        return 2
+    sys.argv = [f'python -m src {command}'] + options
+    importlib.import_module(COMMANDS[command], __package__).main(options)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import math
+import torch
+import torch.nn.functional as F
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+class BatchAugmentation:
+    """
+    Batched counterpart of the per-sample torchvision augmentation chain
+
+    Works on collated uint8 batches of shape (B, 3, H, W), ideally after they
+    have been moved to the training device, and applies the same operations
+    as get_transforms: random horizontal flip, random rotation, color jitter
+    and normalization. Every sample still gets its own random parameters, but
+    they are drawn for the whole batch at once from a generator seeded per
+    batch, so a given (seed, batch) pair always produces the same result.
+    """
+    def __init__(self, augment=True, flip_p=0.5, degrees=15, brightness=0.2, contrast=0.2,
+                 saturation=0.2, hue=0.1, mean=IMAGENET_MEAN, std=IMAGENET_STD, seed=0):
+        """
+        Args:
+            augment (bool): Whether to apply random augmentation or only normalize
+            flip_p (float): Probability of a horizontal flip
+            degrees (float): Rotation angles are drawn from [-degrees, degrees]
+            brightness (float): Brightness jitter strength, as in ColorJitter
+            contrast (float): Contrast jitter strength, as in ColorJitter
+            saturation (float): Saturation jitter strength, as in ColorJitter
+            hue (float): Hue jitter strength, as in ColorJitter
+            mean (list): Per-channel normalization mean
+            std (list): Per-channel normalization std
+            seed (int): Base seed; batch i is augmented with seed + i. num_batches
+                counts the batches seen so far; carry it over when replacing the
+                transform (Trainer.set_data_loaders does) to keep seeds unique
+        """
+        self.augment = augment
+        self.flip_p = flip_p
+        self.degrees = degrees
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self.hue = hue
+        self.mean = torch.tensor(mean).view(1, 3, 1, 1)
+        self.std = torch.tensor(std).view(1, 3, 1, 1)
+        self.seed = seed
+        self.num_batches = 0
+
+    def __call__(self, images, seed=None):
+        """
+        Augment and normalize a batch
+
+        Args:
+            images (torch.Tensor): uint8 batch of shape (B, 3, H, W)
+            seed (int, optional): Seed for this batch. Defaults to the base
+                seed plus the number of batches seen so far.
+
+        Returns:
+            torch.Tensor: Normalized float32 batch
+        """
+        images = images.float().div_(255)
+
+        if self.augment:
+            if seed is None:
+                seed = self.seed + self.num_batches
+            self.num_batches += 1
+
+            # Parameters are tiny, so draw them on the CPU and move them over
+            generator = torch.Generator().manual_seed(seed)
+            images = self._flip(images, generator)
+            images = self._rotate(images, generator)
+            images = self._color_jitter(images, generator)
+
+        mean = self.mean.to(images.device)
+        std = self.std.to(images.device)
+        return (images - mean) / std
+
+    def _uniform(self, generator, batch_size, low, high, device):
+        values = torch.rand(batch_size, generator=generator) * (high - low) + low
+        return values.to(device)
+
+    def _flip(self, images, generator):
+        flip = (torch.rand(images.size(0), generator=generator) < self.flip_p).to(images.device)
+        return torch.where(flip.view(-1, 1, 1, 1), images.flip(-1), images)
+
+    def _rotate(self, images, generator):
+        if not self.degrees:
+            return images
+        angles = self._uniform(generator, images.size(0), -self.degrees, self.degrees, images.device)
+        radians = angles * (math.pi / 180)
+        cos, sin = torch.cos(radians), torch.sin(radians)
+        zeros = torch.zeros_like(cos)
+
+        # Rotation about the image center; nearest sampling and zero fill
+        # match the RandomRotation defaults
+        theta = torch.stack([
+            torch.stack([cos, -sin, zeros], dim=1),
+            torch.stack([sin, cos, zeros], dim=1)
+        ], dim=1)
+        grid = F.affine_grid(theta, images.shape, align_corners=False)
+        return F.grid_sample(images, grid, mode='nearest', padding_mode='zeros', align_corners=False)
+
+    def _color_jitter(self, images, generator):
+        batch_size = images.size(0)
+        device = images.device
+
+        # ColorJitter applies its four adjustments in a random order; here the
+        # order is drawn once per batch
+        for fn_idx in torch.randperm(4, generator=generator).tolist():
+            if fn_idx == 0 and self.brightness:
+                factor = self._uniform(generator, batch_size, 1 - self.brightness, 1 + self.brightness, device)
+                images = (images * factor.view(-1, 1, 1, 1)).clamp_(0, 1)
+            elif fn_idx == 1 and self.contrast:
+                factor = self._uniform(generator, batch_size, 1 - self.contrast, 1 + self.contrast, device)
+                mean = _grayscale(images).mean(dim=(1, 2, 3), keepdim=True)
+                images = _blend(images, mean, factor)
+            elif fn_idx == 2 and self.saturation:
+                factor = self._uniform(generator, batch_size, 1 - self.saturation, 1 + self.saturation, device)
+                images = _blend(images, _grayscale(images), factor)
+            elif fn_idx == 3 and self.hue:
+                shift = self._uniform(generator, batch_size, -self.hue, self.hue, device)
+                hsv = _rgb_to_hsv(images)
+                hsv[:, 0] = (hsv[:, 0] + shift.view(-1, 1, 1)) % 1.0
+                images = _hsv_to_rgb(hsv)
+
+        return images
+
+def _grayscale(images):
+    r, g, b = images.unbind(dim=1)
+    return (0.2989 * r + 0.587 * g + 0.114 * b).unsqueeze(1)
+
+def _blend(images, other, factor):
+    factor = factor.view(-1, 1, 1, 1)
+    return (factor * images + (1 - factor) * other).clamp_(0, 1)
+
+def _rgb_to_hsv(images):
+    r, g, b = images.unbind(dim=1)
+    maxc = images.max(dim=1).values
+    minc = images.min(dim=1).values
+    eqc = maxc == minc
+
+    cr = maxc - minc
+    ones = torch.ones_like(maxc)
+    s = cr / torch.where(eqc, ones, maxc)
+    cr_divisor = torch.where(eqc, ones, cr)
+    rc = (maxc - r) / cr_divisor
+    gc = (maxc - g) / cr_divisor
+    bc = (maxc - b) / cr_divisor
+
+    hr = (maxc == r) * (bc - gc)
+    hg = ((maxc == g) & (maxc != r)) * (2.0 + rc - bc)
+    hb = ((maxc != g) & (maxc != r)) * (4.0 + gc - rc)
+    h = ((hr + hg + hb) / 6.0 + 1.0) % 1.0
+    return torch.stack((h, s, maxc), dim=1)
+
+def _hsv_to_rgb(images):
+    h, s, v = images.unbind(dim=1)
+    i = torch.floor(h * 6.0)
+    f = (h * 6.0) - i
+    i = i.to(dtype=torch.int32)
+
+    p = (v * (1.0 - s)).clamp_(0.0, 1.0)
+    q = (v * (1.0 - s * f)).clamp_(0.0, 1.0)
+    t = (v * (1.0 - s * (1.0 - f))).clamp_(0.0, 1.0)
+    i = i % 6
+
+    mask = i.unsqueeze(dim=1) == torch.arange(6, device=i.device).view(-1, 1, 1)
+    a1 = torch.stack((v, q, p, p, t, v), dim=1)
+    a2 = torch.stack((t, v, v, q, p, p), dim=1)
+    a3 = torch.stack((p, p, t, v, v, q), dim=1)
+    a4 = torch.stack((a1, a2, a3), dim=1)
+    return torch.einsum("...ijk, ...xijk -> ...xjk", mask.to(dtype=images.dtype), a4)
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Offline batch inference over large collections of unlabeled images
+
+The input is a directory (searched recursively for images) or a text file
+with one image path per line. The sorted file list is split into shards of
+shard_size images, and shards are processed by a pool of worker processes,
+each with its own copy of the model. Within a worker, images are decoded
+and preprocessed on a thread pool a few batches ahead of the model.
+
+Every shard is a prediction store (see prediction_store.py) under
+<output_dir>/shards/ that grows by one batch at a time, so an interrupted
+run continues where it stopped: rerun the same command and finished shards
+are skipped, partly done shards resume at their first missing image. When
+all shards are done they are merged into <output_dir>/predictions in file
+list order. Images that cannot be decoded get prediction -1.
+
+Usage:
+    python -m src.bulk_inference ../dump --output-dir ../outputs/bulk --model-path ../models/best_model.pth \\
+        --model resnet50 --num-workers 4
+    python -m src.bulk_inference files.txt --root-dir /data/images --output-dir ../outputs/bulk
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .data_loader import SportsDataset, get_transforms
+from .dataset_index import DatasetIndex
+from .model import create_model
+from .precision import autocast
+from .prediction_store import PROBS_DTYPES, PredictionStore, PredictionWriter
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tif', '.tiff')
+
+FILE_LIST = 'files.txt'
+PROGRESS_FILE = 'progress.json'
+
+# Settings that must not change between a run and its resumption
+RESUME_SETTINGS = ('root_dir', 'num_files', 'shard_size', 'model_path', 'model_name', 'head', 'image_size',
+                   'store_probs', 'top_k', 'probs_dtype')
+
+def list_images(source, root_dir=None):
+    """
+    Collect the images to classify
+
+    Args:
+        source (str): Directory to search recursively, or a text file with one path per line
+        root_dir (str, optional): Base of relative paths in a file list; defaults to the list's directory
+
+    Returns:
+        tuple: (root directory, sorted image paths relative to it)
+    """
+    if os.path.isdir(source):
+        root_dir = source
+        paths = []
+        for directory, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.relpath(os.path.join(directory, name), source))
+    else:
+        root_dir = root_dir or os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            paths = [line.strip() for line in f if line.strip()]
+    return root_dir, sorted(paths)
+
+def load_image(root_dir, path, transform):
+    """Decode and preprocess one image; None if it cannot be decoded"""
+    try:
+        with Image.open(os.path.join(root_dir, path)) as image:
+            return transform(image.convert('RGB'))
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+def prefetch_batches(paths, root_dir, transform, batch_size, executor, prefetch=2):
+    """
+    Yield the preprocessed images of paths in batches
+
+    Decoding of the next prefetch batches is submitted to executor before a
+    batch is yielded, so it overlaps with the forward pass of that batch.
+
+    Yields:
+        list: Image tensors of one batch, None for images that could not be decoded
+    """
+    batches = [paths[start:start + batch_size] for start in range(0, len(paths), batch_size)]
+    pending = collections.deque()
+    for batch in batches:
+        pending.append([executor.submit(load_image, root_dir, path, transform) for path in batch])
+        if len(pending) > prefetch:
+            yield [future.result() for future in pending.popleft()]
+    while pending:
+        yield [future.result() for future in pending.popleft()]
+
+class BatchPredictor:
+    """Runs the classifier on batches and returns NumPy predictions and probabilities"""
+    def __init__(self, model, device, num_classes, store_probs='topk', top_k=5, precision='fp32'):
+        self.model = model.to(device).eval()
+        self.device = device
+        self.num_classes = num_classes
+        self.store_probs = store_probs
+        self.top_k = top_k
+        self.precision = precision
+
+    def predict(self, images):
+        """
+        Classify a batch, with None entries for images that could not be decoded
+
+        Returns:
+            dict: 'predictions' (-1 where decoding failed), and 'probs' plus
+                'top_k_indices' as kept by store_probs
+        """
+        valid = np.array([image is not None for image in images])
+        width = self.num_classes if self.store_probs == 'full' else self.top_k
+        predictions = np.full(len(images), -1, dtype=np.int64)
+        probs = np.zeros((len(images), width), dtype=np.float32)
+        top_k_indices = np.full((len(images), self.top_k), -1, dtype=np.int64)
+
+        if valid.any():
+            inputs = torch.stack([image for image in images if image is not None]).to(self.device)
+            with torch.no_grad(), autocast(self.device, self.precision):
+                outputs = self.model(inputs)
+            probabilities = torch.softmax(outputs.float(), dim=1)
+            top_probs, top_indices = probabilities.topk(self.top_k, dim=1)
+            predictions[valid] = top_indices[:, 0].cpu().numpy()
+            if self.store_probs == 'full':
+                probs[valid] = probabilities.cpu().numpy()
+            else:
+                probs[valid] = top_probs.cpu().numpy()
+                top_k_indices[valid] = top_indices.cpu().numpy()
+
+        result = {'predictions': predictions, 'probs': None, 'top_k_indices': None}
+        if self.store_probs != 'none':
+            result['probs'] = probs
+        if self.store_probs == 'topk':
+            result['top_k_indices'] = top_k_indices
+        return result
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
+def _init_worker(config, worker_ids):
+    """Load the model once per worker process"""
+    worker_id = worker_ids.get() if worker_ids is not None else 0
+    if config['threads_per_worker']:
+        torch.set_num_threads(config['threads_per_worker'])
+    if torch.cuda.is_available():
+        device = torch.device('cuda', worker_id % torch.cuda.device_count())
+    else:
+        device = torch.device('cpu')
+
+    model = create_model(model_name=config['model_name'], num_classes=len(config['class_names']),
+                         pretrained=False, head=config['head'])
+    checkpoint = torch.load(config['model_path'], map_location=device)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    precision = config['precision'] or checkpoint.get('precision', 'fp32')
+    predictor = BatchPredictor(model, device, len(config['class_names']), store_probs=config['store_probs'],
+                               top_k=config['top_k'], precision=precision)
+
+    _worker.update(
+        id=worker_id,
+        config=config,
+        predictor=predictor,
+        transform=get_transforms(image_size=config['image_size'], augment=False)['val'],
+        executor=ThreadPoolExecutor(max_workers=config['decode_threads'], thread_name_prefix='decode'),
+    )
+
+def shard_dir(output_dir, shard):
+    return os.path.join(output_dir, 'shards', f'shard-{shard:05d}')
+
+def _run_shard(shard, paths):
+    """Classify the images of one shard, resuming after the last stored batch"""
+    config = _worker['config']
+    start_time = time.perf_counter()
+    with PredictionWriter(shard_dir(config['output_dir'], shard), config['class_names'],
+                          probs=config['store_probs'], top_k=config['top_k'], probs_dtype=config['probs_dtype'],
+                          append=True) as writer:
+        done = writer.num_rows
+        remaining = paths[done:]
+        failed = 0
+        batches = prefetch_batches(remaining, config['root_dir'], _worker['transform'], config['batch_size'],
+                                   _worker['executor'], prefetch=config['prefetch'])
+        for offset, images in zip(range(0, len(remaining), config['batch_size']), batches):
+            result = _worker['predictor'].predict(images)
+            failed += int((result['predictions'] < 0).sum())
+            labels = np.full(len(images), -1, dtype=np.int64)
+            writer.write(result['predictions'], labels, paths=remaining[offset:offset + len(images)],
+                         probs=result['probs'], top_k_indices=result['top_k_indices'])
+    return {
+        'shard': shard,
+        'worker': _worker['id'],
+        'images': len(remaining),
+        'resumed_at': done,
+        'failed': failed,
+        'seconds': time.perf_counter() - start_time,
+    }
+
+def _write_progress(output_dir, progress):
+    progress_file = os.path.join(output_dir, PROGRESS_FILE)
+    with open(progress_file + '.tmp', 'w') as f:
+        json.dump(progress, f, indent=4)
+    os.replace(progress_file + '.tmp', progress_file)
+
+def merge_shards(output_dir, num_shards, class_names, store_probs, top_k, probs_dtype):
+    """Concatenate the shard stores into <output_dir>/predictions, in file list order"""
+    path = os.path.join(output_dir, 'predictions')
+    with PredictionWriter(path, class_names, probs=store_probs, top_k=top_k, probs_dtype=probs_dtype) as writer:
+        for shard in range(num_shards):
+            store = PredictionStore(shard_dir(output_dir, shard))
+            columns = store.columns
+            writer.write(
+                store.predictions, store.labels, paths=store.paths(),
+                probs=store.column('probs') if 'probs' in columns else None,
+                top_k_indices=store.top_k_indices if 'top_k_indices' in columns else None
+            )
+    return path
+
+def run_bulk_inference(
+    source,
+    output_dir,
+    model_path,
+    csv_file='../archive/sports.csv',
+    root_dir=None,
+    model_name='resnet50',
+    head='mlp',
+    image_size=224,
+    index_file=None,
+    batch_size=64,
+    num_workers=2,
+    shard_size=2048,
+    decode_threads=4,
+    prefetch=2,
+    threads_per_worker=None,
+    store_probs='topk',
+    top_k=5,
+    probs_dtype='float16',
+    precision=None,
+    merge=True
+):
+    """
+    Classify every image of a directory or file list with a checkpoint written by train_sports_classifier
+
+    Args:
+        source (str): Image directory or text file with one path per line
+        output_dir (str): Output directory; rerunning with the same one resumes the run
+        model_path (str): Checkpoint to load
+        csv_file (str): Dataset CSV the class names are taken from (training split)
+        root_dir (str, optional): Base of relative paths in a file list
+        model_name (str), head (str), image_size (int): As the model was trained
+        index_file (str, optional): DatasetIndex sidecar of csv_file
+        batch_size (int): Images per forward pass
+        num_workers (int): Worker processes, each with its own model; 0 runs in this process
+        shard_size (int): Images per shard, the unit of work and of resumption
+        decode_threads (int): Decoding threads per worker
+        prefetch (int): Batches decoded ahead of the model
+        threads_per_worker (int, optional): torch intra-op threads per worker; defaults to
+            the CPU count divided by num_workers
+        store_probs (str): Probabilities to keep: 'full', 'topk' or 'none'
+        top_k (int): Number of probabilities kept with store_probs='topk'
+        probs_dtype (str): 'float32', 'float16' or 'uint8'
+        precision (str, optional): Inference precision; defaults to the checkpoint's
+        merge (bool): Merge the shards into <output_dir>/predictions at the end
+
+    Returns:
+        dict: Number of images, failed decodes, per-worker throughput and the output store path
+    """
+    if store_probs not in ('full', 'topk', 'none'):
+        raise ValueError(f"Unsupported store_probs: {store_probs}")
+    if probs_dtype not in PROBS_DTYPES:
+        raise ValueError(f"Unsupported probs_dtype: {probs_dtype}. Choose from {list(PROBS_DTYPES)}")
+
+    # Class names come from the training split, so output indices match the ones used in training
+    index = DatasetIndex.from_csv_or_sidecar(csv_file, index_file) if index_file else None
+    class_names = [str(name) for name in SportsDataset(csv_file, '.', split='train', index=index).get_class_names()]
+    top_k = min(top_k, len(class_names))
+
+    # The file list is fixed by the first run, so shards mean the same images on resumption
+    os.makedirs(output_dir, exist_ok=True)
+    file_list = os.path.join(output_dir, FILE_LIST)
+    progress_file = os.path.join(output_dir, PROGRESS_FILE)
+    settings = {'model_path': os.path.abspath(model_path), 'model_name': model_name, 'head': head,
+                'image_size': image_size, 'store_probs': store_probs, 'top_k': top_k, 'probs_dtype': probs_dtype,
+                'shard_size': shard_size}
+    if os.path.exists(progress_file):
+        with open(progress_file) as f:
+            progress = json.load(f)
+        with open(file_list) as f:
+            paths = f.read().splitlines()
+        settings.update(root_dir=progress['root_dir'], num_files=len(paths))
+        changed = [key for key in RESUME_SETTINGS if progress[key] != settings[key]]
+        if changed:
+            raise ValueError(f"{output_dir} was written with other {', '.join(changed)}; use a new output_dir")
+        print(f"Resuming: {len(progress['completed_shards'])} of {progress['num_shards']} shards done")
+    else:
+        image_root, paths = list_images(source, root_dir)
+        with open(file_list, 'w') as f:
+            f.writelines(path + '\n' for path in paths)
+        settings.update(root_dir=os.path.abspath(image_root), num_files=len(paths))
+        progress = dict(settings, num_shards=-(-len(paths) // shard_size), completed_shards=[], workers={})
+        _write_progress(output_dir, progress)
+
+    shards = [(shard, paths[start:start + shard_size])
+              for shard, start in enumerate(range(0, len(paths), shard_size))]
+    todo = [(shard, shard_paths) for shard, shard_paths in shards if shard not in progress['completed_shards']]
+    print(f"{len(paths)} images in {len(shards)} shards, {len(todo)} to do, {max(num_workers, 1)} worker(s)")
+
+    config = dict(settings, output_dir=output_dir, class_names=class_names, batch_size=batch_size,
+                  decode_threads=decode_threads, prefetch=prefetch, precision=precision,
+                  threads_per_worker=threads_per_worker or max(1, (os.cpu_count() or 1) // max(num_workers, 1)))
+
+    worker_stats = collections.defaultdict(lambda: {'images': 0, 'seconds': 0.0})
+    failed = 0
+    start_time = time.perf_counter()
+
+    def record(result):
+        nonlocal failed
+        failed += result['failed']
+        stats = worker_stats[result['worker']]
+        stats['images'] += result['images']
+        stats['seconds'] += result['seconds']
+        progress['completed_shards'].append(result['shard'])
+        progress['workers'] = {str(worker): dict(stats, images_per_second=stats['images'] / max(stats['seconds'], 1e-9))
+                               for worker, stats in sorted(worker_stats.items())}
+        _write_progress(output_dir, progress)
+        print(f"Shard {result['shard'] + 1}/{len(shards)}: {result['images']} images in {result['seconds']:.1f}s "
+              f"({result['images'] / max(result['seconds'], 1e-9):.1f} img/s, worker {result['worker']})")
+
+    if num_workers == 0:
+        _init_worker(config, None)
+        for shard, shard_paths in todo:
+            record(_run_shard(shard, shard_paths))
+        _worker['executor'].shutdown()
+    elif todo:
+        # spawn, not fork: every worker starts with a clean torch/CUDA state
+        context = multiprocessing.get_context('spawn')
+        worker_ids = context.Queue()
+        for worker_id in range(num_workers):
+            worker_ids.put(worker_id)
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(config, worker_ids)) as executor:
+            futures = [executor.submit(_run_shard, shard, shard_paths) for shard, shard_paths in todo]
+            for future in as_completed(futures):
+                record(future.result())
+
+    elapsed = time.perf_counter() - start_time
+    images = sum(stats['images'] for stats in worker_stats.values())
+    print(f"\nClassified {images} images in {elapsed:.1f}s ({images / max(elapsed, 1e-9):.1f} img/s overall)")
+    for worker, stats in sorted(worker_stats.items()):
+        print(f"  worker {worker}: {stats['images']} images, {stats['images'] / max(stats['seconds'], 1e-9):.1f} img/s")
+    if failed:
+        print(f"{failed} images could not be decoded (prediction -1)")
+
+    output_path = None
+    if merge:
+        output_path = merge_shards(output_dir, len(shards), class_names, store_probs, top_k, probs_dtype)
+        print(f"Predictions written to {output_path}")
+    return {
+        'images': images,
+        'failed': failed,
+        'seconds': elapsed,
+        'workers': progress['workers'],
+        'output': output_path,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='Image directory or text file with one image path per line')
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--root-dir', default=None, help='Base of relative paths in a file list')
+    parser.add_argument('--model-path', default='../models/best_model.pth')
+    parser.add_argument('--model', default='resnet50')
+    parser.add_argument('--head', default='mlp', help='custom_cnn head')
+    parser.add_argument('--csv-file', default='../archive/sports.csv', help='Dataset the class names come from')
+    parser.add_argument('--index-file', default=None)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--num-workers', type=int, default=2)
+    parser.add_argument('--shard-size', type=int, default=2048)
+    parser.add_argument('--decode-threads', type=int, default=4)
+    parser.add_argument('--prefetch', type=int, default=2)
+    parser.add_argument('--threads-per-worker', type=int, default=None)
+    parser.add_argument('--store-probs', default='topk', choices=('full', 'topk', 'none'))
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--probs-dtype', default='float16', choices=PROBS_DTYPES)
+    parser.add_argument('--precision', default=None, choices=('fp32', 'bf16', 'fp16'))
+    parser.add_argument('--no-merge', action='store_true', help='Keep the per-shard stores only')
+    args = parser.parse_args(argv)
+
+    run_bulk_inference(
+        args.source, args.output_dir, args.model_path, csv_file=args.csv_file, root_dir=args.root_dir,
+        model_name=args.model, head=args.head, image_size=args.image_size, index_file=args.index_file,
+        batch_size=args.batch_size, num_workers=args.num_workers, shard_size=args.shard_size,
+        decode_threads=args.decode_threads, prefetch=args.prefetch, threads_per_worker=args.threads_per_worker,
+        store_probs=args.store_probs, top_k=args.top_k, probs_dtype=args.probs_dtype, precision=args.precision,
+        merge=not args.no_merge
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import glob
+import os
+import queue
+import re
+import threading
+import torch
+
+def snapshot_state(state):
+    """
+    Copy every tensor of a (nested) state dict to the CPU
+
+    Much cheaper than copy.deepcopy: only tensor storage is copied, and
+    containers are rebuilt. The result no longer shares memory with the
+    model or optimizer, so it can be written while training continues.
+    """
+    if torch.is_tensor(state):
+        return state.detach().to('cpu', copy=True)
+    if isinstance(state, dict):
+        return type(state)((key, snapshot_state(value)) for key, value in state.items())
+    if isinstance(state, (list, tuple)):
+        return type(state)(snapshot_state(value) for value in state)
+    return state
+
+def atomic_save(obj, path):
+    """torch.save to a temporary file and rename it, so readers never see a partial file"""
+    tmp_path = path + '.tmp'
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+class CheckpointWriter:
+    """
+    Writes checkpoints from a background thread
+
+    save() snapshots the state on the calling thread and returns right away;
+    serialization and disk I/O happen on the writer thread. At most
+    max_pending snapshots are queued, after which save() blocks, so a slow
+    disk cannot make memory grow without bound.
+    """
+    def __init__(self, save_dir, keep_last=None, async_write=True, max_pending=2):
+        """
+        Args:
+            save_dir (str): Directory checkpoints are written to
+            keep_last (int, optional): Number of per-epoch checkpoints to keep; None keeps all
+            async_write (bool): Write from a background thread; False writes inline
+            max_pending (int): Maximum number of snapshots waiting to be written
+        """
+        self.save_dir = save_dir
+        self.keep_last = keep_last
+        self.async_write = async_write
+        self._error = None
+        os.makedirs(save_dir, exist_ok=True)
+
+        if async_write:
+            self._queue = queue.Queue(maxsize=max_pending)
+            self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+            self._thread.start()
+
+    def save(self, state, filename, copy=True):
+        """
+        Queue a checkpoint for writing
+
+        Args:
+            state (dict): Checkpoint contents
+            filename (str): File name inside save_dir
+            copy (bool): Snapshot the state first. Pass False only if the
+                state already comes from snapshot_state and is not reused.
+        """
+        self._raise_error()
+        if copy:
+            state = snapshot_state(state)
+        path = os.path.join(self.save_dir, filename)
+        if self.async_write:
+            self._queue.put((state, path))
+        else:
+            self._write(state, path)
+
+    def save_epoch(self, state, epoch, copy=True):
+        """Save a per-epoch checkpoint and drop the oldest ones beyond keep_last"""
+        self.save(state, f'checkpoint_epoch_{epoch:03d}.pth', copy=copy)
+
+    def wait(self):
+        """Block until every queued checkpoint has been written"""
+        if self.async_write:
+            self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Write everything that is still queued and stop the writer thread"""
+        if self.async_write:
+            self._queue.put(None)
+            self._thread.join()
+            self.async_write = False
+        self._raise_error()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    self._write(*item)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, state, path):
+        atomic_save(state, path)
+        if self.keep_last and re.fullmatch(r'checkpoint_epoch_\d+\.pth', os.path.basename(path)):
+            self._prune()
+
+    def _prune(self):
+        checkpoints = sorted(glob.glob(os.path.join(self.save_dir, 'checkpoint_epoch_*.pth')))
+        for path in checkpoints[:-self.keep_last]:
+            os.remove(path)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing a checkpoint failed") from error
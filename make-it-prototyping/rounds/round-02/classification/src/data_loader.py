@@ -1,15 +1,17 @@
 import os
-import pandas as pd
 import numpy as np
 from PIL import Image
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, DistributedSampler
 from torchvision import transforms
-from sklearn.preprocessing import LabelEncoder
-import matplotlib.pyplot as plt
+
+from .batch_augment import BatchAugmentation, IMAGENET_MEAN, IMAGENET_STD
+from .dataset_index import DatasetIndex, unpack_string
+from .distributed import get_rank, get_world_size, main_process_first
+from .image_cache import build_image_cache, cache_fingerprint, open_image_cache, read_cache_metadata
 
 class SportsDataset(Dataset):
-    def __init__(self, csv_file, root_dir, transform=None, split='train'):
+    def __init__(self, csv_file, root_dir, transform=None, split='train', cache_file=None, index=None):
         """
         Sports dataset loader
         
@@ -18,51 +20,191 @@ class SportsDataset(Dataset):
             root_dir (str): Directory with all the images
             transform (callable, optional): Optional transform to be applied on a sample
             split (str): Dataset split - 'train', 'valid', or 'test'
+            cache_file (str, optional): Decoded image cache built by build_image_cache.
+                When given, images are read from the memory-mapped cache instead of
+                decoding the JPEG files. It must have been built from the same
+                file paths and root_dir as this split.
+            index (DatasetIndex, optional): Pre-parsed CSV shared between splits.
+                Built from csv_file when not given.
         """
-        self.sports_frame = pd.read_csv(csv_file)
-        self.sports_frame = self.sports_frame[self.sports_frame['data set'] == split]
+        if index is None:
+            index = DatasetIndex.from_csv(csv_file)
         self.root_dir = root_dir
         self.transform = transform
         
-        # Create label encoder
-        self.label_encoder = LabelEncoder()
-        self.sports_frame['encoded_labels'] = self.label_encoder.fit_transform(self.sports_frame['labels'])
-        self.num_classes = len(self.label_encoder.classes_)
+        # Set by create_data_loaders(seed=...): random transforms are then
+        # seeded per sample from (seed, epoch, idx), see set_epoch
+        self.seed = None
+        self.epoch = 0
+        
+        # Labels are encoded against the vocabulary of the whole CSV, so class
+        # indices agree between splits
+        self.classes = index.classes
+        self.num_classes = index.num_classes
+        
+        # Views into the index arrays; the CSV is not needed after construction
+        self.labels, self._path_buffer, self._path_offsets = index.split(split)
         
+        # The memory map is opened lazily so every DataLoader worker maps the
+        # file itself and shares the page cache instead of receiving a copy
+        self.cache_file = cache_file
+        self._image_cache = None
+        if cache_file is not None:
+            metadata = read_cache_metadata(cache_file)
+            if metadata is None:
+                raise ValueError(f"Image cache {cache_file} has no metadata. Rebuild it with overwrite=True.")
+            fingerprint = cache_fingerprint(self._path_buffer, self._path_offsets, root_dir, metadata['image_size'])
+            if metadata['fingerprint'] != fingerprint:
+                raise ValueError(
+                    f"Image cache {cache_file} was built from other images than split '{split}' "
+                    f"of {csv_file} in {root_dir}. Rebuild it with overwrite=True."
+                )
+            num_cached = len(open_image_cache(cache_file))
+            if num_cached != len(self):
+                raise ValueError(
+                    f"Image cache {cache_file} has {num_cached} images but split '{split}' "
+                    f"has {len(self)}. Rebuild it with overwrite=True."
+                )
+        
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_image_cache'] = None
+        return state
+    
     def __len__(self):
-        return len(self.sports_frame)
+        return len(self.labels)
     
     def __getitem__(self, idx):
         if torch.is_tensor(idx):
             idx = idx.tolist()
             
-        img_path = os.path.join(self.root_dir, self.sports_frame.iloc[idx]['filepaths'])
-        image = Image.open(img_path).convert('RGB')
-        label = self.sports_frame.iloc[idx]['encoded_labels']
+        image = self._load_image(idx)
+        label = self.labels[idx]
         
         if self.transform:
-            image = self.transform(image)
+            # With a seed, augmentation depends only on (seed, epoch, idx) and
+            # not on which worker loads the sample or in which order, so an
+            # interrupted epoch can be replayed exactly
+            with torch.random.fork_rng(devices=[], enabled=self.seed is not None):
+                if self.seed is not None:
+                    torch.manual_seed(self._sample_seed(idx))
+                image = self.transform(image)
             
         return image, label
     
+    def set_epoch(self, epoch):
+        """Set the epoch used for per-sample augmentation seeds"""
+        self.epoch = epoch
+    
+    def _sample_seed(self, idx):
+        return ((self.seed * 1000003 + self.epoch) * 1000003 + idx) % (2 ** 63)
+    
+    def _load_image(self, idx):
+        if self.cache_file is not None:
+            if self._image_cache is None:
+                self._image_cache = open_image_cache(self.cache_file)
+            return Image.fromarray(self._image_cache[idx])
+        
+        img_path = os.path.join(self.root_dir, self.get_filepath(idx))
+        return Image.open(img_path).convert('RGB')
+    
+    def get_filepath(self, idx):
+        """Return the image path of a sample, relative to root_dir"""
+        return unpack_string(self._path_buffer, self._path_offsets, idx)
+    
     def get_class_names(self):
-        return self.label_encoder.classes_
+        return self.classes
     
     def get_class_distribution(self):
         """Return class distribution for the current split"""
-        return self.sports_frame['labels'].value_counts()
+        import pandas as pd
+        
+        counts = pd.Series(
+            np.bincount(self.labels, minlength=self.num_classes),
+            index=pd.Index(self.get_class_names(), name='labels'),
+            name='count'
+        )
+        return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+class ResumableSampler(DistributedSampler):
+    """
+    Sampler whose order depends only on (seed, epoch) and that can start mid-epoch
+    
+    Works with and without torch.distributed: outside a process group it
+    behaves like a seeded shuffle over the whole dataset. set_start_index
+    skips the samples of this replica that were already consumed before an
+    interruption; set_epoch resets it.
+    """
+    def __init__(self, dataset, shuffle=True, seed=0):
+        super().__init__(dataset, num_replicas=get_world_size(), rank=get_rank(), shuffle=shuffle, seed=seed)
+        self.start_index = 0
+    
+    def set_epoch(self, epoch):
+        super().set_epoch(epoch)
+        self.start_index = 0
+    
+    def set_start_index(self, start_index):
+        self.start_index = start_index
+    
+    def __iter__(self):
+        indices = list(super().__iter__())
+        return iter(indices[self.start_index:])
+    
+    def __len__(self):
+        return self.num_samples - self.start_index
+
+def stratified_subsample(labels, fraction, seed=0):
+    """
+    Pick the same fraction of every class, at least one sample each
+    
+    Args:
+        labels (array-like): Class index of every sample
+        fraction (float): Share of every class to keep, in (0, 1]
+        seed (int): Seed of the selection; the same seed gives the same subsample
+    
+    Returns:
+        np.ndarray: Sorted indices of the selected samples
+    """
+    if not 0 < fraction <= 1:
+        raise ValueError(f"fraction must be in (0, 1], got {fraction}")
+    rng = np.random.default_rng(seed)
+    labels = np.asarray(labels)
+    order = np.argsort(labels, kind='stable')
+    _, starts, counts = np.unique(labels[order], return_index=True, return_counts=True)
+    selected = []
+    for start, count in zip(starts, counts):
+        members = order[start:start + count]
+        selected.append(rng.choice(members, size=max(1, int(round(fraction * count))), replace=False))
+    return np.sort(np.concatenate(selected)) if selected else np.array([], dtype=np.int64)
 
-def get_transforms(image_size=224, augment=True):
+def get_transforms(image_size=224, augment=True, batch_augment=False, seed=0):
     """
     Get data transforms for training and validation
     
     Args:
         image_size (int): Target image size
         augment (bool): Whether to apply data augmentation
+        batch_augment (bool): Move augmentation and normalization out of the
+            per-sample transforms. The per-sample transforms then only resize
+            and return uint8 tensors, and the returned 'train_batch' and
+            'val_batch' callables process whole collated batches.
+        seed (int): Base seed of the batch-level augmentation
     
     Returns:
         dict: Dictionary containing train and val transforms
     """
+    if batch_augment:
+        sample_transform = transforms.Compose([
+            transforms.Resize((image_size, image_size)),
+            transforms.PILToTensor()
+        ])
+        return {
+            'train': sample_transform,
+            'val': sample_transform,
+            'train_batch': BatchAugmentation(augment=augment, seed=seed),
+            'val_batch': BatchAugmentation(augment=False)
+        }
+    
     if augment:
         train_transform = transforms.Compose([
             transforms.Resize((image_size, image_size)),
@@ -70,24 +212,26 @@ def get_transforms(image_size=224, augment=True):
             transforms.RandomRotation(degrees=15),
             transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1),
             transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+            transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
         ])
     else:
         train_transform = transforms.Compose([
             transforms.Resize((image_size, image_size)),
             transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+            transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
         ])
     
     val_transform = transforms.Compose([
         transforms.Resize((image_size, image_size)),
         transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
     ])
     
-    return {'train': train_transform, 'val': val_transform}
+    return {'train': train_transform, 'val': val_transform, 'train_batch': None, 'val_batch': None}
 
-def create_data_loaders(csv_file, root_dir, batch_size=32, image_size=224, num_workers=4):
+def create_data_loaders(csv_file, root_dir, batch_size=32, image_size=224, num_workers=4, cache_dir=None,
+                        batch_augment=False, index_file=None, distributed=False, seed=None,
+                        fast_val_fraction=None):
     """
     Create data loaders for train, validation, and test sets
     
@@ -97,29 +241,95 @@ def create_data_loaders(csv_file, root_dir, batch_size=32, image_size=224, num_w
         batch_size (int): Batch size for data loaders
         image_size (int): Target image size
         num_workers (int): Number of workers for data loading
+        cache_dir (str, optional): Directory for decoded image caches. Missing
+            caches are built on first use and reused by later runs.
+        batch_augment (bool): Load uint8 batches and return batch-level
+            transforms to apply after collation (see get_transforms)
+        index_file (str, optional): Binary sidecar for the parsed CSV. It is
+            written on first use and loaded instead of the CSV afterwards.
+        distributed (bool): Shard the train and validation splits across the
+            processes of the current torch.distributed process group
+        seed (int, optional): Makes data order and augmentation a function of
+            (seed, epoch) so training can be resumed mid-epoch exactly. The
+            train loader then uses a ResumableSampler.
+        fast_val_fraction (float, optional): Also return a 'fast_val_loader'
+            over a fixed stratified subsample of this share of the validation
+            split (see stratified_subsample), for cheap mid-epoch validation
     
     Returns:
-        dict: Dictionary containing data loaders and datasets
+        dict: Dictionary containing data loaders, datasets and batch transforms
     """
-    transforms_dict = get_transforms(image_size=image_size)
+    transforms_dict = get_transforms(image_size=image_size, batch_augment=batch_augment, seed=seed or 0)
+    
+    # Parse the CSV once for all splits
+    with main_process_first():
+        if index_file is not None:
+            index = DatasetIndex.from_csv_or_sidecar(csv_file, index_file)
+        else:
+            index = DatasetIndex.from_csv(csv_file)
+        
+        cache_files = {'train': None, 'valid': None, 'test': None}
+        if cache_dir is not None:
+            for split in cache_files:
+                cache_files[split] = build_image_cache(csv_file, root_dir, cache_dir, split=split,
+                                                       image_size=image_size, index=index)
     
     # Create datasets
-    train_dataset = SportsDataset(csv_file, root_dir, transform=transforms_dict['train'], split='train')
-    val_dataset = SportsDataset(csv_file, root_dir, transform=transforms_dict['val'], split='valid')
-    test_dataset = SportsDataset(csv_file, root_dir, transform=transforms_dict['val'], split='test')
+    train_dataset = SportsDataset(csv_file, root_dir, transform=transforms_dict['train'], split='train',
+                                  cache_file=cache_files['train'], index=index)
+    val_dataset = SportsDataset(csv_file, root_dir, transform=transforms_dict['val'], split='valid',
+                                cache_file=cache_files['valid'], index=index)
+    test_dataset = SportsDataset(csv_file, root_dir, transform=transforms_dict['val'], split='test',
+                                 cache_file=cache_files['test'], index=index)
+    
+    # Loaders get their own generators when seeded, so creating an iterator
+    # does not consume the global RNG that dropout and friends draw from
+    generators = {'train': None, 'valid': None, 'test': None}
+    if seed is not None:
+        for dataset in (train_dataset, val_dataset, test_dataset):
+            dataset.seed = seed
+        generators = {split: torch.Generator().manual_seed(seed) for split in generators}
     
     # Create data loaders
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
-    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+    if distributed or seed is not None:
+        train_sampler = ResumableSampler(train_dataset, shuffle=True, seed=seed or 0)
+        train_loader = DataLoader(train_dataset, batch_size=batch_size, sampler=train_sampler, num_workers=num_workers,
+                                  generator=generators['train'])
+    else:
+        train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers)
+    
+    if distributed:
+        # Validation is split without the padding DistributedSampler adds, so
+        # every sample is counted exactly once when metrics are all-reduced
+        val_sampler = range(get_rank(), len(val_dataset), get_world_size())
+        val_loader = DataLoader(val_dataset, batch_size=batch_size, sampler=val_sampler, num_workers=num_workers,
+                                generator=generators['valid'])
+    else:
+        val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers,
+                                generator=generators['valid'])
+    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers,
+                             generator=generators['test'])
+    
+    fast_val_loader = None
+    if fast_val_fraction:
+        subsample = stratified_subsample(val_dataset.labels, fast_val_fraction, seed=seed or 0)
+        if distributed:
+            subsample = subsample[get_rank()::get_world_size()]
+        # Always its own generator: mid-epoch validation must not consume the
+        # global RNG, or resumed runs would no longer match uninterrupted ones
+        fast_val_loader = DataLoader(val_dataset, batch_size=batch_size, sampler=subsample.tolist(),
+                                     num_workers=num_workers, generator=torch.Generator().manual_seed(seed or 0))
     
     return {
         'train_loader': train_loader,
         'val_loader': val_loader,
         'test_loader': test_loader,
+        'fast_val_loader': fast_val_loader,
         'train_dataset': train_dataset,
         'val_dataset': val_dataset,
-        'test_dataset': test_dataset
+        'test_dataset': test_dataset,
+        'train_batch_transform': transforms_dict['train_batch'],
+        'val_batch_transform': transforms_dict['val_batch']
     }
 
 def visualize_batch(data_loader, class_names, num_images=8):
@@ -131,12 +341,14 @@ def visualize_batch(data_loader, class_names, num_images=8):
         class_names: List of class names
         num_images: Number of images to display
     """
+    import matplotlib.pyplot as plt
+    
     dataiter = iter(data_loader)
     images, labels = next(dataiter)
     
     # Denormalize images for visualization
-    mean = torch.tensor([0.485, 0.456, 0.406])
-    std = torch.tensor([0.229, 0.224, 0.225])
+    mean = torch.tensor(IMAGENET_MEAN)
+    std = torch.tensor(IMAGENET_STD)
     
     fig, axes = plt.subplots(2, 4, figsize=(15, 8))
     axes = axes.ravel()
@@ -0,0 +1,142 @@
+import os
+import numpy as np
+
+def pack_strings(strings):
+    """
+    Pack a sequence of strings into one UTF-8 byte buffer plus offsets
+
+    String i is buffer[offsets[i]:offsets[i + 1]]. Two flat NumPy arrays are
+    much cheaper to index and to pickle than a column of Python objects.
+
+    Args:
+        strings (iterable): Strings to pack
+
+    Returns:
+        tuple: (uint8 buffer, int64 offsets of length len(strings) + 1)
+    """
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return buffer, offsets
+
+def unpack_string(buffer, offsets, idx):
+    """Return string idx from a buffer built by pack_strings"""
+    return buffer[offsets[idx]:offsets[idx + 1]].tobytes().decode('utf-8')
+
+class DatasetIndex:
+    """
+    Parsed contents of sports.csv, shared by all splits
+
+    The CSV is read once and the label vocabulary is fitted on all rows, so
+    class indices are identical in every split even when a split is missing
+    some classes. Rows are grouped by split, which makes each split a
+    contiguous slice: split() returns views and never copies.
+    """
+    def __init__(self, classes, labels, path_buffer, path_offsets, split_names, split_bounds):
+        """
+        Args:
+            classes (np.ndarray): Sorted class names
+            labels (np.ndarray): Encoded label of every row
+            path_buffer (np.ndarray): Packed file paths (see pack_strings)
+            path_offsets (np.ndarray): Offsets into path_buffer
+            split_names (np.ndarray): Names of the splits, in row order
+            split_bounds (np.ndarray): Row range of split i is split_bounds[i]:split_bounds[i + 1]
+        """
+        self.classes = classes
+        self.labels = labels
+        self.path_buffer = path_buffer
+        self.path_offsets = path_offsets
+        self.split_names = split_names
+        self.split_bounds = split_bounds
+
+    @classmethod
+    def from_csv(cls, csv_file):
+        """Build the index from a sports.csv file"""
+        # pandas is only needed to parse the CSV; loading a sidecar index skips it
+        import pandas as pd
+
+        sports_frame = pd.read_csv(csv_file)
+
+        # Stable sort by split keeps the CSV order within each split
+        split_names, split_codes = np.unique(sports_frame['data set'].to_numpy(dtype=str), return_inverse=True)
+        order = np.argsort(split_codes, kind='stable')
+        split_bounds = np.searchsorted(split_codes[order], np.arange(len(split_names) + 1))
+
+        # Same encoding as LabelEncoder: index into the sorted unique names
+        classes, labels = np.unique(sports_frame['labels'].to_numpy(dtype=str), return_inverse=True)
+        labels = labels[order].astype(np.int64)
+
+        path_buffer, path_offsets = pack_strings(sports_frame['filepaths'].to_numpy(dtype=str)[order])
+
+        return cls(classes, labels, path_buffer, path_offsets, split_names, split_bounds)
+
+    @classmethod
+    def load(cls, index_file):
+        """Load an index written by save()"""
+        with np.load(index_file) as arrays:
+            return cls(**{name: arrays[name] for name in arrays.files})
+
+    @classmethod
+    def from_csv_or_sidecar(cls, csv_file, index_file):
+        """
+        Load the binary sidecar if it is up to date, otherwise parse the CSV and write it
+
+        The sidecar is considered stale when the CSV has been modified after it
+        was written. If the CSV is not available the sidecar is used as is.
+        """
+        if os.path.exists(index_file) and (
+            not os.path.exists(csv_file) or os.path.getmtime(index_file) >= os.path.getmtime(csv_file)
+        ):
+            return cls.load(index_file)
+
+        index = cls.from_csv(csv_file)
+        index.save(index_file)
+        return index
+
+    def save(self, index_file):
+        """Save the index to an uncompressed .npz sidecar file"""
+        directory = os.path.dirname(index_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write through a file object so numpy does not append '.npz' to the name
+        tmp_file = index_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(
+                f,
+                classes=self.classes,
+                labels=self.labels,
+                path_buffer=self.path_buffer,
+                path_offsets=self.path_offsets,
+                split_names=self.split_names,
+                split_bounds=self.split_bounds
+            )
+        os.replace(tmp_file, index_file)
+
+    @property
+    def num_classes(self):
+        return len(self.classes)
+
+    def split(self, split):
+        """
+        Return the rows of one split as views into the shared arrays
+
+        Args:
+            split (str): Dataset split - 'train', 'valid', or 'test'
+
+        Returns:
+            tuple: (labels, path_buffer, path_offsets); path offsets index the
+                shared buffer, so the buffer itself is returned unchanged
+        """
+        matches = np.flatnonzero(self.split_names == split)
+        if len(matches) == 0:
+            start = end = 0
+        else:
+            start, end = self.split_bounds[matches[0]], self.split_bounds[matches[0] + 1]
+        return self.labels[start:end], self.path_buffer, self.path_offsets[start:end + 1]
+
+    def filepaths(self, split):
+        """Return the file paths of one split as a list of strings"""
+        _, path_buffer, path_offsets = self.split(split)
+        return [unpack_string(path_buffer, path_offsets, i) for i in range(len(path_offsets) - 1)]
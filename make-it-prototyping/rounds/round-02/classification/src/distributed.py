@@ -0,0 +1,90 @@
+import contextlib
+import os
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+def is_main_process():
+    """Only the main process (rank 0) writes checkpoints, plots and logs"""
+    return get_rank() == 0
+
+def all_reduce_sum(values):
+    """
+    Sum a list of numbers over all processes
+
+    Args:
+        values (list): Numbers contributed by this process
+
+    Returns:
+        list: Element-wise sums over all processes (the input when not distributed)
+    """
+    if not is_distributed():
+        return list(values)
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor)
+    return tensor.tolist()
+
+def all_gather_object(value):
+    """
+    Collect one picklable object from every process
+
+    Args:
+        value: Object contributed by this process
+
+    Returns:
+        list: The objects of all processes, indexed by rank ([value] when not distributed)
+    """
+    if not is_distributed():
+        return [value]
+    values = [None] * get_world_size()
+    dist.all_gather_object(values, value)
+    return values
+
+def launch_distributed(fn, world_size, kwargs, master_port=29500, backend='gloo'):
+    """
+    Run fn(**kwargs) in world_size local processes joined in one process group
+
+    Args:
+        fn (callable): Module-level function executed by every process
+        world_size (int): Number of processes to spawn
+        kwargs (dict): Keyword arguments passed to fn
+        master_port (int): Free local TCP port used for the rendezvous
+        backend (str): torch.distributed backend; gloo works on CPU-only machines
+    """
+    mp.spawn(_worker, args=(world_size, fn, kwargs, master_port, backend), nprocs=world_size, join=True)
+
+def _worker(rank, world_size, fn, kwargs, master_port, backend):
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(master_port)
+    dist.init_process_group(backend, rank=rank, world_size=world_size)
+
+    # Share the cores between workers instead of every process using all of them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+
+    try:
+        fn(**kwargs)
+    finally:
+        dist.destroy_process_group()
+
+@contextlib.contextmanager
+def main_process_first():
+    """
+    Let rank 0 run the enclosed block before the other ranks
+
+    Used around steps that write shared files (image caches, index sidecars),
+    so the other ranks find them ready instead of building them concurrently.
+    """
+    if is_distributed() and not is_main_process():
+        dist.barrier()
+    yield
+    if is_distributed() and is_main_process():
+        dist.barrier()
@@ -1,78 +1,193 @@
 import torch
 import torch.nn as nn
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.metrics import (
-    classification_report, confusion_matrix, 
-    accuracy_score, precision_recall_fscore_support,
-    top_k_accuracy_score
-)
-import pandas as pd
 from tqdm import tqdm
 import os
 import json
-from collections import defaultdict
+import argparse
 
 from .data_loader import create_data_loaders
 from .model import create_model
+from .precision import autocast
+from .prediction_store import PROBS_DTYPES, PredictionWriter
+from .reporting import REPORT_MODES, ReportWriter, draw_confusion_matrix, draw_per_class_metrics
 
 class ModelEvaluator:
-    def __init__(self, model, test_loader, device, class_names):
+    def __init__(self, model, test_loader, device, class_names, batch_transform=None,
+                 top_k=5, store_probs='full', probs_dtype='float32', precision='fp32'):
+        """
+        Args:
+            model: Model to evaluate
+            test_loader: Data loader over the evaluation split
+            device: Device to run the model on
+            class_names: Class names, indexed by label
+            batch_transform (callable, optional): Applied to each batch after it is moved to the device
+            top_k (int): k used for the top-k accuracy and for store_probs='topk'
+            store_probs (str): Which probabilities to keep: 'full' (every class),
+                'topk' (only the top_k largest per sample) or 'none'
+            probs_dtype (str): 'float32' or 'float16' storage for kept probabilities
+            precision (str): Inference precision - 'fp32', 'bf16' or 'fp16'
+        """
+        if store_probs not in ('full', 'topk', 'none'):
+            raise ValueError(f"Unsupported store_probs: {store_probs}")
+        
         self.model = model
         self.test_loader = test_loader
         self.device = device
+        self.batch_transform = batch_transform
         self.class_names = class_names
+        self.top_k = top_k
+        self.store_probs = store_probs
+        self.probs_dtype = np.dtype(probs_dtype)
+        self.precision = precision
         self.predictions = []
         self.true_labels = []
         self.prediction_probs = []
+        self.top_k_indices = None
+        self.confusion_matrix = None
+        self.top_k_correct = None
+        self._metrics = None
         
     def evaluate(self):
         """Evaluate the model on test data"""
         self.model.eval()
         
-        all_predictions = []
-        all_labels = []
-        all_probs = []
+        num_classes = len(self.class_names)
+        k = min(self.top_k, num_classes)
+        
+        # Results are written into preallocated buffers; they only grow if the
+        # loader yields more samples than its dataset reports
+        try:
+            capacity = len(self.test_loader.dataset)
+        except (AttributeError, TypeError):
+            capacity = 1024
+        predictions_buffer = np.empty(capacity, dtype=np.int64)
+        labels_buffer = np.empty(capacity, dtype=np.int64)
+        if self.store_probs == 'full':
+            probs_buffer = np.empty((capacity, num_classes), dtype=self.probs_dtype)
+        elif self.store_probs == 'topk':
+            probs_buffer = np.empty((capacity, k), dtype=self.probs_dtype)
+            top_k_buffer = np.empty((capacity, k), dtype=np.int64)
+        
+        # Running counters stay on the device and are updated once per batch
+        confusion = torch.zeros(num_classes * num_classes, dtype=torch.long, device=self.device)
+        correct = torch.zeros((), dtype=torch.long, device=self.device)
+        top_k_correct = torch.zeros((), dtype=torch.long, device=self.device)
+        num_samples = 0
         
         with torch.no_grad():
             progress_bar = tqdm(self.test_loader, desc="Evaluating")
             
             for inputs, labels in progress_bar:
                 inputs, labels = inputs.to(self.device), labels.to(self.device)
+                if self.batch_transform:
+                    inputs = self.batch_transform(inputs)
+                
+                with autocast(self.device, self.precision):
+                    outputs = self.model(inputs)
+                probabilities = torch.softmax(outputs.float(), dim=1)
+                top_probs, top_indices = probabilities.topk(k, dim=1)
+                predictions = top_indices[:, 0]
+                
+                correct += (predictions == labels).sum()
+                top_k_correct += (top_indices == labels.unsqueeze(1)).any(dim=1).sum()
+                confusion += torch.bincount(labels * num_classes + predictions, minlength=num_classes * num_classes)
                 
-                outputs = self.model(inputs)
-                probabilities = torch.softmax(outputs, dim=1)
-                _, predictions = torch.max(outputs, 1)
+                batch_size = labels.size(0)
+                end = num_samples + batch_size
+                if end > capacity:
+                    capacity = max(end, 2 * capacity)
+                    predictions_buffer = _grow(predictions_buffer, capacity)
+                    labels_buffer = _grow(labels_buffer, capacity)
+                    if self.store_probs != 'none':
+                        probs_buffer = _grow(probs_buffer, capacity)
+                    if self.store_probs == 'topk':
+                        top_k_buffer = _grow(top_k_buffer, capacity)
                 
-                all_predictions.extend(predictions.cpu().numpy())
-                all_labels.extend(labels.cpu().numpy())
-                all_probs.extend(probabilities.cpu().numpy())
+                predictions_buffer[num_samples:end] = predictions.cpu().numpy()
+                labels_buffer[num_samples:end] = labels.cpu().numpy()
+                if self.store_probs == 'full':
+                    probs_buffer[num_samples:end] = probabilities.cpu().numpy()
+                elif self.store_probs == 'topk':
+                    probs_buffer[num_samples:end] = top_probs.cpu().numpy()
+                    top_k_buffer[num_samples:end] = top_indices.cpu().numpy()
+                num_samples = end
                 
                 # Update progress bar with current accuracy
-                current_acc = accuracy_score(all_labels, all_predictions)
+                current_acc = correct.item() / num_samples
                 progress_bar.set_postfix({'Accuracy': f'{current_acc:.4f}'})
         
-        self.predictions = np.array(all_predictions)
-        self.true_labels = np.array(all_labels)
-        self.prediction_probs = np.array(all_probs)
+        self.predictions = predictions_buffer[:num_samples]
+        self.true_labels = labels_buffer[:num_samples]
+        if self.store_probs == 'full':
+            self.prediction_probs = probs_buffer[:num_samples]
+        elif self.store_probs == 'topk':
+            self.prediction_probs = probs_buffer[:num_samples]
+            self.top_k_indices = top_k_buffer[:num_samples]
+        else:
+            self.prediction_probs = None
+        self.confusion_matrix = confusion.view(num_classes, num_classes).cpu().numpy()
+        self.top_k_correct = top_k_correct.item()
+        self._metrics = None
         
         return self.predictions, self.true_labels, self.prediction_probs
     
+    def get_confusion_matrix(self):
+        """Confusion matrix (true label x predicted label), counted from the labels if evaluate() did not build it"""
+        if self.confusion_matrix is None:
+            self.confusion_matrix = confusion_matrix_from_labels(self.true_labels, self.predictions,
+                                                                 len(self.class_names))
+        return self.confusion_matrix
+    
+    def count_top_k_correct(self):
+        """
+        Number of samples whose label is among the top_k predictions
+        
+        Counted by evaluate(); otherwise recomputed from the stored top-k
+        indices or full probabilities. None when neither is available.
+        """
+        if self.top_k_correct is not None:
+            return self.top_k_correct
+        true_labels = np.asarray(self.true_labels)[:, None]
+        if self.top_k_indices is not None:
+            return int((self.top_k_indices[:, :self.top_k] == true_labels).any(axis=1).sum())
+        probs = self.prediction_probs
+        if probs is not None and np.ndim(probs) == 2 and np.shape(probs)[1] == len(self.class_names):
+            k = min(self.top_k, len(self.class_names))
+            top_indices = np.argpartition(-np.asarray(probs), k - 1, axis=1)[:, :k]
+            return int((top_indices == true_labels).any(axis=1).sum())
+        return None
+    
     def compute_metrics(self):
-        """Compute various evaluation metrics"""
+        """
+        Compute various evaluation metrics from the confusion matrix
+        
+        The result is computed once per evaluate() and shared by every later
+        call (plots, reports, save_results), so it must not be modified.
+        """
+        if self._metrics is None:
+            self._metrics = self._compute_metrics()
+        return self._metrics
+    
+    def _compute_metrics(self):
         metrics = {}
+        cm = self.get_confusion_matrix()
+        total = cm.sum()
         
         # Basic metrics
-        metrics['accuracy'] = accuracy_score(self.true_labels, self.predictions)
-        metrics['top_5_accuracy'] = top_k_accuracy_score(
-            self.true_labels, self.prediction_probs, k=5, labels=range(len(self.class_names))
-        )
-        
-        # Per-class metrics
-        precision, recall, f1, support = precision_recall_fscore_support(
-            self.true_labels, self.predictions, average=None
-        )
+        metrics['accuracy'] = np.trace(cm) / total
+        top_k_correct = self.count_top_k_correct()
+        if top_k_correct is not None:
+            metrics[f'top_{self.top_k}_accuracy'] = top_k_correct / total
+        
+        # Per-class metrics, with 0 where a class was never predicted or never seen
+        true_positives = np.diag(cm).astype(np.float64)
+        support = cm.sum(axis=1)
+        predicted = cm.sum(axis=0)
+        precision = np.divide(true_positives, predicted, out=np.zeros_like(true_positives), where=predicted > 0)
+        recall = np.divide(true_positives, support, out=np.zeros_like(true_positives), where=support > 0)
+        denominator = precision + recall
+        f1 = np.divide(2 * precision * recall, denominator, out=np.zeros_like(true_positives), where=denominator > 0)
         
         metrics['per_class'] = {
             'precision': precision,
@@ -81,10 +196,11 @@ class ModelEvaluator:
             'support': support
         }
         
-        # Macro averages
-        metrics['macro_precision'] = np.mean(precision)
-        metrics['macro_recall'] = np.mean(recall)
-        metrics['macro_f1'] = np.mean(f1)
+        # Macro averages over the classes that occur in the labels or predictions
+        present = (support > 0) | (predicted > 0)
+        metrics['macro_precision'] = np.mean(precision[present])
+        metrics['macro_recall'] = np.mean(recall[present])
+        metrics['macro_f1'] = np.mean(f1[present])
         
         # Weighted averages
         metrics['weighted_precision'] = np.average(precision, weights=support)
@@ -93,35 +209,24 @@ class ModelEvaluator:
         
         return metrics
     
-    def plot_confusion_matrix(self, normalize=True, save_path=None, figsize=(15, 12)):
-        """Plot confusion matrix"""
-        cm = confusion_matrix(self.true_labels, self.predictions)
-        
-        if normalize:
-            cm = cm.astype('float') / cm.sum(axis=1)[:, np.newaxis]
-            title = 'Normalized Confusion Matrix'
-            fmt = '.2f'
-        else:
-            title = 'Confusion Matrix'
-            fmt = 'd'
-        
-        plt.figure(figsize=figsize)
-        sns.heatmap(cm, annot=False, fmt=fmt, cmap='Blues',
-                   xticklabels=self.class_names, yticklabels=self.class_names)
-        plt.title(title)
-        plt.xlabel('Predicted Label')
-        plt.ylabel('True Label')
-        plt.xticks(rotation=45, ha='right')
-        plt.yticks(rotation=0)
+    def plot_confusion_matrix(self, normalize=True, save_path=None, figsize=(15, 12), dpi=300):
+        """Show the confusion matrix interactively; scripts should use add_to_report instead"""
+        import matplotlib.pyplot as plt
+        
+        fig = plt.figure(figsize=figsize)
+        cm = draw_confusion_matrix(fig, self.get_confusion_matrix(), self.class_names, normalize=normalize)
         
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            fig.savefig(save_path, dpi=dpi, bbox_inches='tight')
         plt.show()
         
         return cm
     
-    def plot_per_class_metrics(self, save_path=None):
-        """Plot per-class precision, recall, and F1-score"""
+    def plot_per_class_metrics(self, save_path=None, dpi=300):
+        """Show per-class precision, recall, and F1-score interactively"""
+        import matplotlib.pyplot as plt
+        import pandas as pd
+        
         metrics = self.compute_metrics()
         
         df = pd.DataFrame({
@@ -132,89 +237,105 @@ class ModelEvaluator:
             'Support': metrics['per_class']['support']
         })
         
-        fig, axes = plt.subplots(2, 2, figsize=(20, 12))
-        
-        # Precision
-        axes[0, 0].bar(range(len(self.class_names)), df['Precision'])
-        axes[0, 0].set_title('Per-Class Precision')
-        axes[0, 0].set_xlabel('Class')
-        axes[0, 0].set_ylabel('Precision')
-        axes[0, 0].set_xticks(range(len(self.class_names)))
-        axes[0, 0].set_xticklabels(self.class_names, rotation=90)
-        
-        # Recall
-        axes[0, 1].bar(range(len(self.class_names)), df['Recall'])
-        axes[0, 1].set_title('Per-Class Recall')
-        axes[0, 1].set_xlabel('Class')
-        axes[0, 1].set_ylabel('Recall')
-        axes[0, 1].set_xticks(range(len(self.class_names)))
-        axes[0, 1].set_xticklabels(self.class_names, rotation=90)
-        
-        # F1-Score
-        axes[1, 0].bar(range(len(self.class_names)), df['F1-Score'])
-        axes[1, 0].set_title('Per-Class F1-Score')
-        axes[1, 0].set_xlabel('Class')
-        axes[1, 0].set_ylabel('F1-Score')
-        axes[1, 0].set_xticks(range(len(self.class_names)))
-        axes[1, 0].set_xticklabels(self.class_names, rotation=90)
-        
-        # Support
-        axes[1, 1].bar(range(len(self.class_names)), df['Support'])
-        axes[1, 1].set_title('Per-Class Support (Number of Samples)')
-        axes[1, 1].set_xlabel('Class')
-        axes[1, 1].set_ylabel('Support')
-        axes[1, 1].set_xticks(range(len(self.class_names)))
-        axes[1, 1].set_xticklabels(self.class_names, rotation=90)
-        
-        plt.tight_layout()
+        fig = plt.figure(figsize=(20, 12))
+        draw_per_class_metrics(fig, self.class_names, **metrics['per_class'])
         
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            fig.savefig(save_path, dpi=dpi, bbox_inches='tight')
         plt.show()
         
         return df
     
+    def add_to_report(self, report_writer):
+        """Add the confusion matrix and per-class metrics plots to a ReportWriter"""
+        metrics = self.compute_metrics()
+        class_names = [str(name) for name in self.class_names]
+        report_writer.add('confusion_matrix', 'confusion_matrix', confusion_matrix=self.get_confusion_matrix(),
+                          class_names=class_names, normalize=True)
+        report_writer.add('per_class_metrics', 'per_class_metrics', class_names=class_names,
+                          **{key: np.asarray(value) for key, value in metrics['per_class'].items()})
+    
     def get_top_predictions(self, image_idx, top_k=5):
         """Get top-k predictions for a specific image"""
+        if self.prediction_probs is None:
+            raise ValueError("Probabilities were not stored (store_probs='none')")
         if image_idx >= len(self.prediction_probs):
             raise ValueError(f"Image index {image_idx} out of range")
         
         probs = self.prediction_probs[image_idx]
-        top_indices = np.argsort(probs)[-top_k:][::-1]
+        if self.top_k_indices is not None:
+            # Only the top-k probabilities were kept, already sorted
+            if top_k > probs.shape[0]:
+                raise ValueError(f"Only the top {probs.shape[0]} probabilities were stored")
+            class_indices = self.top_k_indices[image_idx][:top_k]
+            top_probs = probs[:top_k]
+        else:
+            class_indices = np.argsort(probs)[-top_k:][::-1]
+            top_probs = probs[class_indices]
         
         results = []
-        for idx in top_indices:
+        for idx, probability in zip(class_indices, top_probs):
             results.append({
                 'class': self.class_names[idx],
-                'probability': probs[idx],
+                'probability': probability,
                 'class_idx': idx
             })
         
         return results
     
     def analyze_misclassifications(self, top_n=10):
-        """Analyze the most common misclassifications"""
-        misclassified = self.true_labels != self.predictions
-        misclassified_indices = np.where(misclassified)[0]
-        
-        misclass_pairs = defaultdict(int)
-        for idx in misclassified_indices:
-            true_class = self.class_names[self.true_labels[idx]]
-            pred_class = self.class_names[self.predictions[idx]]
-            misclass_pairs[(true_class, pred_class)] += 1
+        """
+        Analyze the most common misclassifications
+        
+        The counts are the off-diagonal cells of the confusion matrix, so the
+        cost depends on the number of classes, not of samples.
+        
+        Returns:
+            list: ((true class, predicted class), count) pairs, most frequent first
+        """
+        counts = self.get_confusion_matrix().copy()
+        np.fill_diagonal(counts, 0)
+        counts = counts.ravel()
+        
+        # Only cells at least as large as the top_n-th largest are sorted;
+        # ties keep the row-major order
+        num_pairs = min(top_n, np.count_nonzero(counts))
+        if num_pairs:
+            threshold = np.partition(counts, len(counts) - num_pairs)[len(counts) - num_pairs]
+            candidates = np.flatnonzero(counts >= threshold)
+            top_cells = candidates[np.argsort(-counts[candidates], kind='stable')][:num_pairs]
+        else:
+            top_cells = []
         
-        # Sort by frequency
-        sorted_pairs = sorted(misclass_pairs.items(), key=lambda x: x[1], reverse=True)
+        num_classes = len(self.class_names)
+        sorted_pairs = [((self.class_names[cell // num_classes], self.class_names[cell % num_classes]),
+                         int(counts[cell])) for cell in top_cells]
         
         print(f"Top {top_n} most common misclassifications:")
         print("-" * 60)
-        for i, ((true_class, pred_class), count) in enumerate(sorted_pairs[:top_n]):
+        for i, ((true_class, pred_class), count) in enumerate(sorted_pairs):
             print(f"{i+1:2d}. {true_class} → {pred_class}: {count} times")
         
-        return sorted_pairs[:top_n]
+        return sorted_pairs
     
-    def save_results(self, save_dir, model_name="model"):
-        """Save evaluation results to files"""
+    def save_results(self, save_dir, model_name="model", predictions_format='csv', probs_dtype=None, append=False):
+        """
+        Save evaluation results to files
+        
+        Args:
+            save_dir (str): Output directory
+            model_name (str): Prefix of the file names
+            predictions_format (str): 'csv' writes <model_name>_predictions.csv with class
+                names per sample; 'columnar' writes the <model_name>_predictions prediction
+                store (see write_predictions), which also keeps file paths and probabilities
+            probs_dtype (str, optional): Probability storage of the columnar format:
+                'float32', 'float16' or 'uint8'; defaults to the evaluator's probs_dtype
+            append (bool): Append the columnar predictions to an existing store, e.g. one
+                shard of a sharded evaluation after the other
+        """
+        if predictions_format not in ('csv', 'columnar'):
+            raise ValueError(f"Unsupported predictions_format: {predictions_format}")
+        
         os.makedirs(save_dir, exist_ok=True)
         
         metrics = self.compute_metrics()
@@ -234,20 +355,102 @@ class ModelEvaluator:
             json.dump(metrics_serializable, f, indent=4)
         
         # Save classification report
-        report = classification_report(self.true_labels, self.predictions, 
-                                     target_names=self.class_names, output_dict=True)
+        report = self.classification_report()
         with open(os.path.join(save_dir, f'{model_name}_classification_report.json'), 'w') as f:
             json.dump(report, f, indent=4)
         
         # Save predictions
-        results_df = pd.DataFrame({
-            'true_label': [self.class_names[label] for label in self.true_labels],
-            'predicted_label': [self.class_names[pred] for pred in self.predictions],
-            'correct': self.true_labels == self.predictions
-        })
-        results_df.to_csv(os.path.join(save_dir, f'{model_name}_predictions.csv'), index=False)
+        if predictions_format == 'columnar':
+            self.write_predictions(os.path.join(save_dir, f'{model_name}_predictions'),
+                                   probs_dtype=probs_dtype, append=append)
+        else:
+            import pandas as pd
+            
+            # Categorical columns map label indices to names without a per-row lookup
+            class_names = [str(name) for name in self.class_names]
+            results_df = pd.DataFrame({
+                'true_label': pd.Categorical.from_codes(self.true_labels, categories=class_names),
+                'predicted_label': pd.Categorical.from_codes(self.predictions, categories=class_names),
+                'correct': self.true_labels == self.predictions
+            })
+            results_df.to_csv(os.path.join(save_dir, f'{model_name}_predictions.csv'), index=False)
         
         print(f"Evaluation results saved to {save_dir}")
+    
+    def sample_paths(self):
+        """File path of every evaluated sample, or None when the dataset does not provide them"""
+        dataset = getattr(self.test_loader, 'dataset', None)
+        if not hasattr(dataset, 'get_filepath') or len(dataset) != len(self.predictions):
+            return None
+        return [dataset.get_filepath(i) for i in range(len(dataset))]
+    
+    def write_predictions(self, path, probs_dtype=None, append=False):
+        """
+        Write predictions, labels, file paths and the kept probabilities to a prediction store
+        
+        Probabilities follow store_probs: every class, the top_k with their class
+        indices, or none. Read the store back with prediction_store.PredictionStore.
+        
+        Args:
+            path (str): Store directory
+            probs_dtype (str, optional): 'float32', 'float16' or 'uint8' (quantized);
+                defaults to the evaluator's probs_dtype
+            append (bool): Add the samples to an existing store with the same schema
+        
+        Returns:
+            PredictionWriter: The closed writer; num_rows is the size of the store
+        """
+        paths = self.sample_paths()
+        top_k = self.top_k_indices.shape[1] if self.top_k_indices is not None else self.top_k
+        with PredictionWriter(path, self.class_names, probs=self.store_probs, top_k=top_k,
+                              probs_dtype=probs_dtype or self.probs_dtype.name, paths=paths is not None,
+                              append=append) as writer:
+            writer.write(self.predictions, self.true_labels, paths=paths, probs=self.prediction_probs,
+                         top_k_indices=self.top_k_indices)
+        return writer
+    
+    def classification_report(self):
+        """
+        Per-class and averaged precision, recall, F1-score and support
+        
+        Same layout as sklearn's classification_report(output_dict=True,
+        zero_division=0), built from the cached metrics. As in sklearn without
+        labels=, the macro average only covers the classes that occur in the
+        labels or predictions, the same ones as compute_metrics' macro_*.
+        """
+        metrics = self.compute_metrics()
+        per_class = metrics['per_class']
+        support = per_class['support']
+        report = {}
+        for i, name in enumerate(self.class_names):
+            report[str(name)] = {
+                'precision': float(per_class['precision'][i]),
+                'recall': float(per_class['recall'][i]),
+                'f1-score': float(per_class['f1_score'][i]),
+                'support': float(support[i])
+            }
+        report['accuracy'] = float(metrics['accuracy'])
+        for average, prefix in (('macro avg', 'macro'), ('weighted avg', 'weighted')):
+            report[average] = {
+                'precision': float(metrics[f'{prefix}_precision']),
+                'recall': float(metrics[f'{prefix}_recall']),
+                'f1-score': float(metrics[f'{prefix}_f1']),
+                'support': float(support.sum())
+            }
+        return report
+
+def confusion_matrix_from_labels(true_labels, predictions, num_classes):
+    """Count (true label, predicted label) pairs with a single bincount"""
+    true_labels = np.asarray(true_labels, dtype=np.int64)
+    predictions = np.asarray(predictions, dtype=np.int64)
+    counts = np.bincount(true_labels * num_classes + predictions, minlength=num_classes * num_classes)
+    return counts.reshape(num_classes, num_classes)
+
+def _grow(buffer, capacity):
+    """Return a copy of buffer with its first dimension enlarged to capacity"""
+    grown = np.empty((capacity,) + buffer.shape[1:], dtype=buffer.dtype)
+    grown[:len(buffer)] = buffer
+    return grown
 
 def load_and_evaluate_model(
     model_path,
@@ -256,9 +459,36 @@ def load_and_evaluate_model(
     model_name='resnet50',
     batch_size=32,
     image_size=224,
-    save_dir='../outputs'
+    save_dir='../outputs',
+    cache_dir=None,
+    batch_augment=False,
+    index_file=None,
+    store_probs='full',
+    precision=None,
+    head='mlp',
+    report='background',
+    report_dpi=300,
+    report_format='png',
+    predictions_format='csv',
+    probs_dtype=None
 ):
-    """Load a saved model and evaluate it on test data"""
+    """
+    Load a saved model and evaluate it on test data
+    
+    precision defaults to the precision recorded in the checkpoint (fp32 for
+    checkpoints that predate mixed-precision training). head must match the
+    one custom_cnn was trained with.
+    
+    The confusion matrix and per-class metrics plots go through a
+    ReportWriter (see train_sports_classifier for report, report_dpi and
+    report_format); by default they are rendered in a background process.
+    
+    predictions_format='columnar' saves the predictions as a prediction store
+    with file paths and probabilities (see ModelEvaluator.save_results);
+    probs_dtype='uint8' quantizes the stored probabilities.
+    """
+    if report not in REPORT_MODES:
+        raise ValueError(f"Unsupported report mode: {report}. Choose from {list(REPORT_MODES)}")
     
     # Set device
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
@@ -270,7 +500,10 @@ def load_and_evaluate_model(
         root_dir=root_dir,
         batch_size=batch_size,
         image_size=image_size,
-        num_workers=4
+        num_workers=4,
+        cache_dir=cache_dir,
+        batch_augment=batch_augment,
+        index_file=index_file
     )
     
     test_loader = data_info['test_loader']
@@ -279,13 +512,18 @@ def load_and_evaluate_model(
     num_classes = len(class_names)
     
     # Load model
-    model = create_model(model_name=model_name, num_classes=num_classes, pretrained=False)
+    model = create_model(model_name=model_name, num_classes=num_classes, pretrained=False, head=head)
     checkpoint = torch.load(model_path, map_location=device)
     model.load_state_dict(checkpoint['model_state_dict'])
     model = model.to(device)
     
+    if precision is None:
+        precision = checkpoint.get('precision', 'fp32')
+    
     # Create evaluator and run evaluation
-    evaluator = ModelEvaluator(model, test_loader, device, class_names)
+    evaluator = ModelEvaluator(model, test_loader, device, class_names,
+                               batch_transform=data_info['val_batch_transform'],
+                               store_probs=store_probs, precision=precision)
     predictions, true_labels, prediction_probs = evaluator.evaluate()
     
     # Compute and display metrics
@@ -298,21 +536,51 @@ def load_and_evaluate_model(
     print(f"Weighted F1-Score: {metrics['weighted_f1']:.4f}")
     
     # Generate visualizations
-    evaluator.plot_confusion_matrix(save_path=os.path.join(save_dir, 'confusion_matrix.png'))
-    evaluator.plot_per_class_metrics(save_path=os.path.join(save_dir, 'per_class_metrics.png'))
+    report_writer = ReportWriter(save_dir, mode=report, dpi=report_dpi, formats=report_format)
+    evaluator.add_to_report(report_writer)
     
     # Analyze misclassifications
     evaluator.analyze_misclassifications()
     
     # Save results
-    evaluator.save_results(save_dir)
+    evaluator.save_results(save_dir, predictions_format=predictions_format, probs_dtype=probs_dtype)
+    report_writer.finish()
     
     return evaluator, metrics
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a trained model on the test split")
+    parser.add_argument('--model-path', default='../models/best_model.pth')
+    parser.add_argument('--csv-file', default='../archive/sports.csv')
+    parser.add_argument('--root-dir', default='../archive')
+    parser.add_argument('--model', default='resnet50')
+    parser.add_argument('--head', default='mlp', help='custom_cnn head')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--save-dir', default='../outputs')
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--index-file', default=None)
+    parser.add_argument('--batch-augment', action='store_true')
+    parser.add_argument('--store-probs', default='full', choices=('full', 'topk', 'none'))
+    parser.add_argument('--predictions-format', default='csv', choices=('csv', 'columnar'))
+    parser.add_argument('--probs-dtype', default=None, choices=PROBS_DTYPES,
+                        help='Probability storage of the columnar format')
+    parser.add_argument('--precision', default=None, choices=('fp32', 'bf16', 'fp16'))
+    parser.add_argument('--report', default='background', choices=REPORT_MODES)
+    parser.add_argument('--report-dpi', type=int, default=300)
+    parser.add_argument('--report-format', nargs='+', default=['png'])
+    args = parser.parse_args(argv)
+    
+    if not os.path.exists(args.model_path):
+        print(f"Model not found at {args.model_path}. Please train a model first.")
+        return
+    load_and_evaluate_model(
+        args.model_path, csv_file=args.csv_file, root_dir=args.root_dir, model_name=args.model,
+        batch_size=args.batch_size, image_size=args.image_size, save_dir=args.save_dir, cache_dir=args.cache_dir,
+        batch_augment=args.batch_augment, index_file=args.index_file, store_probs=args.store_probs,
+        precision=args.precision, head=args.head, report=args.report, report_dpi=args.report_dpi,
+        report_format=args.report_format, predictions_format=args.predictions_format, probs_dtype=args.probs_dtype
+    )
+
 if __name__ == "__main__":
-    # Example usage
-    model_path = '../models/best_model.pth'
-    if os.path.exists(model_path):
-        evaluator, metrics = load_and_evaluate_model(model_path)
-    else:
-        print(f"Model not found at {model_path}. Please train a model first.")
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Export a trained classifier as a self-contained TorchScript artifact
+
+The exported file holds a traced and frozen model that takes uint8 images
+of shape (B, 3, image_size, image_size) and does the normalization itself,
+plus a metadata.json with the class names and preprocessing constants.
+Loading it needs neither create_model, torchvision nor efficientnet_pytorch,
+and none of the optimizer state stored in training checkpoints.
+
+Usage:
+    python -m src.export --model-path ../models/best_model.pth --model resnet50 \\
+        --output ../models/sports_classifier.pt
+"""
+
+import argparse
+import json
+
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from .batch_augment import IMAGENET_MEAN, IMAGENET_STD
+
+METADATA_FILE = 'metadata.json'
+
+class NormalizedClassifier(nn.Module):
+    """Wraps a model so it takes uint8 images and normalizes them itself"""
+    def __init__(self, model, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        super().__init__()
+        self.model = model
+        self.register_buffer('mean', torch.tensor(mean).view(1, 3, 1, 1))
+        self.register_buffer('std', torch.tensor(std).view(1, 3, 1, 1))
+
+    def forward(self, images):
+        images = images.float().div(255)
+        return self.model((images - self.mean) / self.std)
+
+def export_model(model_path, output_path, csv_file='../archive/sports.csv', root_dir='../archive',
+                 model_name='resnet50', image_size=224, index_file=None, head='mlp'):
+    """
+    Trace a checkpoint written by train_sports_classifier into a frozen TorchScript file
+
+    Args:
+        model_path (str): Training checkpoint (best_model.pth or best_model_weights.pth)
+        output_path (str): Where to write the exported model
+        csv_file (str): Dataset CSV, for the class names
+        root_dir (str): Dataset root directory
+        model_name (str): Architecture passed to create_model
+        image_size (int): Input size the model was trained with
+        index_file (str, optional): DatasetIndex sidecar to read the class names from
+        head (str): custom_cnn head the model was trained with
+
+    Returns:
+        dict: The metadata embedded in the file
+    """
+    # Imported here so that loading an exported model never pulls them in
+    from .data_loader import SportsDataset
+    from .dataset_index import DatasetIndex
+    from .model import create_model
+
+    index = DatasetIndex.from_csv_or_sidecar(csv_file, index_file) if index_file else None
+    class_names = SportsDataset(csv_file, root_dir, split='train', index=index).get_class_names()
+
+    model = create_model(model_name=model_name, num_classes=len(class_names), pretrained=False, head=head)
+    checkpoint = torch.load(model_path, map_location='cpu')
+    model.load_state_dict(checkpoint['model_state_dict'])
+
+    metadata = save_traced(model, output_path, class_names, image_size, model_name=model_name,
+                           precision=checkpoint.get('precision', 'fp32'), epoch=checkpoint.get('epoch'),
+                           best_val_accuracy=checkpoint.get('best_val_accuracy'))
+    print(f"Exported {model_name} with {len(class_names)} classes to {output_path}")
+    return metadata
+
+def save_traced(model, output_path, class_names, image_size, **extra_metadata):
+    """
+    Trace and freeze a model in the exported format that ExportedClassifier loads
+
+    Args:
+        model (nn.Module): Model taking normalized float images
+        output_path (str): Where to write the TorchScript file
+        class_names (list): Class name of every output index
+        image_size (int): Input size the model expects
+        **extra_metadata: Further JSON-serializable entries for metadata.json
+
+    Returns:
+        dict: The metadata embedded in the file
+    """
+    backbone = getattr(model, 'backbone', None)
+    if hasattr(backbone, 'set_swish'):
+        # The memory-efficient swish of efficientnet_pytorch is a custom autograd function that cannot be traced
+        backbone.set_swish(memory_efficient=False)
+
+    wrapped = NormalizedClassifier(model).eval()
+    example = torch.zeros(1, 3, image_size, image_size, dtype=torch.uint8)
+    with torch.no_grad():
+        traced = torch.jit.trace(wrapped, example)
+    frozen = torch.jit.freeze(traced)
+
+    metadata = {
+        'class_names': list(class_names),
+        'image_size': image_size,
+        'mean': IMAGENET_MEAN,
+        'std': IMAGENET_STD,
+        'input': 'uint8 RGB, shape (B, 3, image_size, image_size), resized with bilinear interpolation',
+    }
+    metadata.update(extra_metadata)
+    torch.jit.save(frozen, output_path, _extra_files={METADATA_FILE: json.dumps(metadata)})
+    return metadata
+
+class ExportedClassifier:
+    """
+    Inference wrapper around a model written by export_model
+
+    Preprocessing matches the validation transforms of get_transforms:
+    a bilinear resize to image_size x image_size, then the normalization
+    baked into the exported model.
+    """
+    def __init__(self, path, device='cpu'):
+        """
+        Args:
+            path (str): File written by export_model
+            device: Device to load the model on
+        """
+        extra_files = {METADATA_FILE: ''}
+        self.device = torch.device(device)
+        self.model = torch.jit.load(path, map_location=self.device, _extra_files=extra_files)
+        self.metadata = json.loads(extra_files[METADATA_FILE])
+        self.class_names = self.metadata['class_names']
+        self.image_size = self.metadata['image_size']
+
+    def preprocess(self, image):
+        """Turn a PIL image into a uint8 (3, H, W) tensor"""
+        image = image.convert('RGB').resize((self.image_size, self.image_size), Image.BILINEAR)
+        return torch.from_numpy(np.asarray(image).copy()).permute(2, 0, 1)
+
+    def predict(self, images, top_k=5):
+        """
+        Classify a list of PIL images
+
+        Returns:
+            list: Per image, the top_k (class name, probability) pairs
+        """
+        batch = torch.stack([self.preprocess(image) for image in images]).to(self.device)
+        with torch.no_grad():
+            probabilities = torch.softmax(self.model(batch), dim=1)
+        top_probs, top_indices = probabilities.topk(min(top_k, len(self.class_names)), dim=1)
+        return [
+            [(self.class_names[index], prob) for index, prob in zip(indices, probs)]
+            for indices, probs in zip(top_indices.tolist(), top_probs.tolist())
+        ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-path', default='../models/best_model.pth')
+    parser.add_argument('--output', default='../models/sports_classifier.pt')
+    parser.add_argument('--model', default='resnet50')
+    parser.add_argument('--head', default='mlp', help='custom_cnn head')
+    parser.add_argument('--csv-file', default='../archive/sports.csv')
+    parser.add_argument('--root-dir', default='../archive')
+    parser.add_argument('--index-file', default=None)
+    parser.add_argument('--image-size', type=int, default=224)
+    args = parser.parse_args(argv)
+
+    export_model(args.model_path, args.output, csv_file=args.csv_file, root_dir=args.root_dir,
+                 model_name=args.model, image_size=args.image_size, index_file=args.index_file, head=args.head)
+
+if __name__ == "__main__":
+    main()
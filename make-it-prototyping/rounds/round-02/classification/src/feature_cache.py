@@ -0,0 +1,303 @@
+import argparse
+import contextlib
+import hashlib
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset
+from tqdm import tqdm
+
+from .checkpoint import atomic_save
+from .data_loader import SportsDataset, get_transforms
+from .dataset_index import DatasetIndex, pack_strings, unpack_string
+from .model import CustomCNN, SportsClassifier, create_model
+from .train import Trainer
+
+def get_head(model):
+    """
+    Locate the final classification layer of a model from create_model
+
+    Returns:
+        tuple: (parent module, attribute name) of the head. The features
+        cached for head-only training are the inputs of this module.
+    """
+    if isinstance(model, CustomCNN):
+        return model.classifier, str(len(model.classifier) - 1)
+    if isinstance(model, SportsClassifier):
+        backbone = model.backbone
+        if 'resnet' in model.model_name:
+            return backbone, 'fc'
+        if 'efficientnet' in model.model_name:
+            return backbone, '_fc'
+        if 'vgg' in model.model_name:
+            return backbone.classifier, '6'
+    raise ValueError(f"Cannot find the classification head of {type(model).__name__}")
+
+def get_feature_dim(model):
+    """Number of features the head of a model takes as input"""
+    parent, name = get_head(model)
+    for module in getattr(parent, name).modules():
+        if isinstance(module, nn.Linear):
+            return module.in_features
+    raise ValueError(f"Cannot find the input size of the classification head of {type(model).__name__}")
+
+@contextlib.contextmanager
+def head_removed(model):
+    """Temporarily replace the head with nn.Identity so the model returns its features"""
+    parent, name = get_head(model)
+    head = getattr(parent, name)
+    setattr(parent, name, nn.Identity())
+    try:
+        yield head
+    finally:
+        setattr(parent, name, head)
+
+def compute_model_hash(model, model_name, image_size):
+    """
+    Hash everything that determines the cached features
+
+    Covers the architecture, the input size and every parameter and buffer
+    outside the head, so retraining the head keeps the cache valid while any
+    change to the backbone invalidates it.
+    """
+    parent, name = get_head(model)
+    head_keys = {id(tensor) for tensor in getattr(parent, name).state_dict(keep_vars=True).values()}
+    digest = hashlib.sha1(f'{model_name}:{image_size}'.encode())
+    for key, tensor in model.state_dict(keep_vars=True).items():
+        if id(tensor) in head_keys:
+            continue
+        digest.update(key.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+class FeatureStore:
+    """
+    Memory-mapped penultimate-layer features of every image of a split
+
+    Stored under cache_dir/<model hash>/ as {split}.npy (num_images x
+    feature_dim) next to {split}_paths.npz with the file path of every row,
+    so rows are looked up by path and a store can only be used with the
+    backbone that produced it.
+    """
+    def __init__(self, cache_dir, model_hash):
+        self.directory = os.path.join(cache_dir, model_hash)
+        self.model_hash = model_hash
+
+    def _paths_file(self, split):
+        return os.path.join(self.directory, f'{split}_paths.npz')
+
+    def _features_file(self, split):
+        return os.path.join(self.directory, f'{split}.npy')
+
+    def has(self, split, filepaths):
+        """Whether the split is stored and contains every one of filepaths"""
+        if not os.path.exists(self._features_file(split)) or not os.path.exists(self._paths_file(split)):
+            return False
+        stored = set(self.filepaths(split))
+        return all(filepath in stored for filepath in filepaths)
+
+    def filepaths(self, split):
+        with np.load(self._paths_file(split)) as data:
+            buffer, offsets = data['path_buffer'], data['path_offsets']
+        return [unpack_string(buffer, offsets, i) for i in range(len(offsets) - 1)]
+
+    def open(self, split):
+        """Open the features of a split as a read-only memory-mapped array"""
+        return np.load(self._features_file(split), mmap_mode='r')
+
+    def lookup(self, split, filepaths):
+        """Return the store rows holding the features of filepaths"""
+        rows = {filepath: row for row, filepath in enumerate(self.filepaths(split))}
+        return np.array([rows[filepath] for filepath in filepaths], dtype=np.int64)
+
+    def build(self, model, dataset, split, device, batch_size=64, num_workers=4, dtype=np.float32):
+        """
+        Run the model without its head over an un-augmented dataset and store the features
+
+        Args:
+            model (nn.Module): Model from create_model
+            dataset (SportsDataset): Split to encode, with validation transforms
+            split (str): Name to store the features under
+            device: Device to run the backbone on
+            batch_size (int): Batch size of the forward passes
+            num_workers (int): Data loader workers
+            dtype: Storage dtype of the features (float16 halves the size)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+        model.eval()
+
+        # Written to temporary files first so an interrupted build never leaves a partial store behind
+        # An empty split still gets a (0, feature_dim) store
+        tmp_features = self._features_file(split) + '.tmp'
+        features = np.lib.format.open_memmap(tmp_features, mode='w+', dtype=dtype,
+                                             shape=(len(dataset), get_feature_dim(model)))
+        start = 0
+        with torch.no_grad(), head_removed(model):
+            for inputs, _ in tqdm(loader, desc=f"Extracting {split} features"):
+                outputs = model(inputs.to(device)).flatten(1).cpu().numpy()
+                if outputs.shape[1] != features.shape[1]:
+                    raise ValueError(f"Expected {features.shape[1]} features per image, "
+                                     f"the backbone returned {outputs.shape[1]}")
+                features[start:start + len(outputs)] = outputs
+                start += len(outputs)
+        features.flush()
+        del features
+
+        path_buffer, path_offsets = pack_strings(dataset.get_filepath(i) for i in range(len(dataset)))
+        tmp_paths = self._paths_file(split) + '.tmp'
+        with open(tmp_paths, 'wb') as f:
+            np.savez(f, path_buffer=path_buffer, path_offsets=path_offsets)
+        os.replace(tmp_features, self._features_file(split))
+        os.replace(tmp_paths, self._paths_file(split))
+
+class CachedFeatureDataset(Dataset):
+    """(feature vector, label) pairs of a split, read from a FeatureStore"""
+    def __init__(self, store, split, dataset):
+        """
+        Args:
+            store (FeatureStore): Store holding the features of the split
+            split (str): Split name in the store
+            dataset (SportsDataset): Dataset the features were extracted from; provides labels and paths
+        """
+        self.store = store
+        self.split = split
+        self.labels = dataset.labels
+        self.rows = store.lookup(split, [dataset.get_filepath(i) for i in range(len(dataset))])
+        self._features = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_features'] = None
+        return state
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, idx):
+        if self._features is None:
+            self._features = self.store.open(self.split)
+        return torch.from_numpy(np.array(self._features[self.rows[idx]], dtype=np.float32)), self.labels[idx]
+
+def create_feature_loaders(model, model_name, csv_file, root_dir, cache_dir='../feature_cache', image_size=224,
+                           batch_size=256, device='cpu', index_file=None, num_workers=4,
+                           extract_batch_size=64, dtype=np.float32, splits=('train', 'valid', 'test')):
+    """
+    Build (or reuse) the feature store of a model and return loaders over it
+
+    Every split is encoded once with the validation transforms; later calls
+    with the same backbone weights only open the memory-mapped files.
+
+    Returns:
+        dict: '<split>_loader' and '<split>_dataset' for every split, and 'store'
+    """
+    model_hash = compute_model_hash(model, model_name, image_size)
+    store = FeatureStore(cache_dir, model_hash)
+    index = DatasetIndex.from_csv_or_sidecar(csv_file, index_file) if index_file else DatasetIndex.from_csv(csv_file)
+    transform = get_transforms(image_size=image_size, augment=False)['val']
+
+    result = {'store': store}
+    for split in splits:
+        dataset = SportsDataset(csv_file, root_dir, transform=transform, split=split, index=index)
+        filepaths = [dataset.get_filepath(i) for i in range(len(dataset))]
+        if store.has(split, filepaths):
+            print(f"Using cached {split} features from {store.directory}")
+        else:
+            store.build(model, dataset, split, device, batch_size=extract_batch_size,
+                        num_workers=num_workers, dtype=dtype)
+        feature_dataset = CachedFeatureDataset(store, split, dataset)
+        # Features are small; reading them in the main process beats starting workers
+        result[f'{split}_loader'] = DataLoader(feature_dataset, batch_size=batch_size, shuffle=split == 'train')
+        result[f'{split}_dataset'] = feature_dataset
+    return result
+
+def train_head_on_features(
+    csv_file='../archive/sports.csv',
+    root_dir='../archive',
+    model_name='resnet50',
+    num_epochs=20,
+    batch_size=256,
+    learning_rate=0.001,
+    image_size=224,
+    pretrained=True,
+    save_dir='../models',
+    cache_dir='../feature_cache',
+    model_path=None,
+    index_file=None,
+    num_workers=4,
+    head='mlp'
+):
+    """
+    Transfer learning with a frozen backbone: train only the head on cached features
+
+    The backbone (pretrained weights, or the ones in model_path) runs once
+    per image to fill the feature store; every epoch after that is a pass of
+    the head over the stored features. The trained head is put back into the
+    full model, which is saved as best_model.pth in save_dir so it can be
+    evaluated, exported or fine-tuned like any other checkpoint.
+
+    Returns:
+        tuple: (full model with the best head, Trainer of the head)
+    """
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"Using device: {device}")
+
+    index = DatasetIndex.from_csv_or_sidecar(csv_file, index_file) if index_file else DatasetIndex.from_csv(csv_file)
+    model = create_model(model_name=model_name, num_classes=index.num_classes, pretrained=pretrained, head=head)
+    if model_path:
+        model.load_state_dict(torch.load(model_path, map_location='cpu')['model_state_dict'])
+    model = model.to(device)
+
+    loaders = create_feature_loaders(model, model_name, csv_file, root_dir, cache_dir=cache_dir,
+                                     image_size=image_size, batch_size=batch_size, device=device,
+                                     index_file=index_file, num_workers=num_workers)
+
+    parent, name = get_head(model)
+    head_module = getattr(parent, name)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(head_module.parameters(), lr=learning_rate, weight_decay=1e-4)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=3)
+
+    # The head is a submodule of model, so training it in place updates the full model
+    trainer = Trainer(head_module, loaders['train_loader'], loaders['valid_loader'], criterion, optimizer,
+                      device, scheduler)
+    trainer.train(num_epochs=num_epochs, save_dir=os.path.join(save_dir, 'head_only'))
+
+    atomic_save({
+        'epoch': len(trainer.val_accuracies),
+        'model_state_dict': model.state_dict(),
+        'best_val_accuracy': max(trainer.val_accuracies),
+        'precision': 'fp32',
+        'feature_cache': loaders['store'].directory,
+    }, os.path.join(save_dir, 'best_model.pth'))
+    print(f"Full model with the trained head saved to {os.path.join(save_dir, 'best_model.pth')}")
+    return model, trainer
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the head of a frozen backbone on cached features")
+    parser.add_argument('--csv-file', default='../archive/sports.csv')
+    parser.add_argument('--root-dir', default='../archive')
+    parser.add_argument('--model', default='resnet50')
+    parser.add_argument('--head', default='mlp', help='custom_cnn head')
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--learning-rate', type=float, default=0.001)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--no-pretrained', action='store_true')
+    parser.add_argument('--save-dir', default='../models')
+    parser.add_argument('--feature-cache-dir', default='../feature_cache')
+    parser.add_argument('--model-path', default=None, help='Checkpoint with the backbone weights to use')
+    parser.add_argument('--index-file', default=None)
+    parser.add_argument('--num-workers', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    train_head_on_features(
+        csv_file=args.csv_file, root_dir=args.root_dir, model_name=args.model, num_epochs=args.epochs,
+        batch_size=args.batch_size, learning_rate=args.learning_rate, image_size=args.image_size,
+        pretrained=not args.no_pretrained, save_dir=args.save_dir, cache_dir=args.feature_cache_dir,
+        model_path=args.model_path, index_file=args.index_file, num_workers=args.num_workers, head=args.head
+    )
+
+if __name__ == "__main__":
+    main()
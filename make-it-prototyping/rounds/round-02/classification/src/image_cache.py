@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import numpy as np
+from PIL import Image
+from torchvision import transforms
+from tqdm import tqdm
+
+from .dataset_index import DatasetIndex
+
+def get_cache_path(cache_dir, split, image_size):
+    """Return the location of the decoded image cache for a split and image size"""
+    return os.path.join(cache_dir, f'{split}_{image_size}.npy')
+
+def get_metadata_path(cache_path):
+    """Sidecar file recording what a cache was built from"""
+    return cache_path + '.json'
+
+def cache_fingerprint(path_buffer, path_offsets, root_dir, image_size):
+    """
+    Hash of everything the cached pixels depend on
+    
+    Covers the split's file paths in order, the image root and the image
+    size, so an edited, reordered or re-rooted CSV of the same length does
+    not match a cache built from the old one.
+    
+    Args:
+        path_buffer (np.ndarray): Packed path bytes (see dataset_index.pack_strings)
+        path_offsets (np.ndarray): Offsets of the split's paths into path_buffer
+        root_dir (str): Directory with all the images
+        image_size (int): Cached image size
+    
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(os.path.abspath(root_dir).encode('utf-8') + b'\0')
+    digest.update(str(int(image_size)).encode('utf-8') + b'\0')
+    if len(path_offsets):
+        digest.update(path_buffer[path_offsets[0]:path_offsets[-1]].tobytes())
+        digest.update(np.ascontiguousarray(path_offsets - path_offsets[0], dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+def read_cache_metadata(cache_path):
+    """Return the metadata written next to a cache, or None for caches without one"""
+    metadata_path = get_metadata_path(cache_path)
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path) as f:
+        return json.load(f)
+
+def build_image_cache(csv_file, root_dir, cache_dir, split='train', image_size=224, overwrite=False, index=None):
+    """
+    Decode and resize every image of a split into a single uint8 array on disk
+
+    The array has shape (num_samples, image_size, image_size, 3) and is stored
+    in .npy format so it can be memory-mapped. Rows follow the order of the
+    split in the CSV file, which is the order SportsDataset uses. A .json
+    sidecar records the cache_fingerprint of the split; an existing cache
+    whose fingerprint does not match (or that has no sidecar) is rebuilt.
+
+    Args:
+        csv_file (str): Path to the CSV file with annotations
+        root_dir (str): Directory with all the images
+        cache_dir (str): Directory where the cache file is written
+        split (str): Dataset split - 'train', 'valid', or 'test'
+        image_size (int): Target image size
+        overwrite (bool): Rebuild the cache even if it already exists
+        index (DatasetIndex, optional): Pre-parsed CSV; built from csv_file when not given
+
+    Returns:
+        str: Path to the cache file
+    """
+    cache_path = get_cache_path(cache_dir, split, image_size)
+    if index is None:
+        index = DatasetIndex.from_csv(csv_file)
+    _, path_buffer, path_offsets = index.split(split)
+    fingerprint = cache_fingerprint(path_buffer, path_offsets, root_dir, image_size)
+
+    metadata = read_cache_metadata(cache_path)
+    if os.path.exists(cache_path) and not overwrite:
+        if metadata is not None and metadata['fingerprint'] == fingerprint:
+            return cache_path
+        print(f"Image cache {cache_path} was built from other images; rebuilding it")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    filepaths = index.filepaths(split)
+
+    # Same resize as get_transforms so cached pixels match the JPEG path
+    resize = transforms.Resize((image_size, image_size))
+
+    # Write to a temporary file first so an interrupted build never leaves a partial cache behind
+    tmp_path = cache_path + '.tmp'
+    cache = np.lib.format.open_memmap(
+        tmp_path, mode='w+', dtype=np.uint8, shape=(len(filepaths), image_size, image_size, 3)
+    )
+    for i, filepath in enumerate(tqdm(filepaths, desc=f"Caching {split}")):
+        image = Image.open(os.path.join(root_dir, filepath)).convert('RGB')
+        cache[i] = np.asarray(resize(image))
+    cache.flush()
+    del cache
+
+    # The sidecar goes first, so a cache file never sits next to a sidecar of older contents
+    metadata_path = get_metadata_path(cache_path)
+    if os.path.exists(metadata_path):
+        os.remove(metadata_path)
+    os.replace(tmp_path, cache_path)
+    with open(metadata_path + '.tmp', 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'root_dir': os.path.abspath(root_dir), 'image_size': image_size,
+                   'num_images': len(filepaths)}, f, indent=4)
+    os.replace(metadata_path + '.tmp', metadata_path)
+
+    return cache_path
+
+def open_image_cache(cache_path):
+    """Open a decoded image cache as a read-only memory-mapped array"""
+    return np.load(cache_path, mmap_mode='r')
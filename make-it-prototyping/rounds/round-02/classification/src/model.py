@@ -1,7 +1,6 @@
 import torch
 import torch.nn as nn
 import torchvision.models as models
-from efficientnet_pytorch import EfficientNet
 
 class SportsClassifier(nn.Module):
     def __init__(self, num_classes=100, model_name='resnet50', pretrained=True, dropout_rate=0.5):
@@ -32,6 +31,9 @@ class SportsClassifier(nn.Module):
             raise ValueError(f"Unsupported model: {model_name}")
         
     def _create_efficientnet(self, model_name, pretrained):
+        # Optional dependency, only imported for EfficientNet models
+        from efficientnet_pytorch import EfficientNet
+        
         if pretrained:
             model = EfficientNet.from_pretrained(model_name, num_classes=self.num_classes)
         else:
@@ -74,12 +76,31 @@ class SportsClassifier(nn.Module):
     def forward(self, x):
         return self.backbone(x)
 
+# Every architecture create_model accepts
+MODEL_NAMES = (
+    'resnet18', 'resnet34', 'resnet50', 'resnet101',
+    *(f'efficientnet-b{i}' for i in range(8)),
+    'vgg16', 'vgg19',
+    'custom_cnn',
+)
+
+CUSTOM_CNN_HEADS = ('mlp', 'gap', 'dwsep')
+
 class CustomCNN(nn.Module):
     """
     Simple custom CNN for sports classification
+    
+    Heads on top of the 512-channel convolutional features:
+        'mlp'    7x7 average pool into a 25088-4096-4096 MLP (~120M parameters)
+        'gap'    global average pool into a single Linear layer
+        'dwsep'  depthwise-separable conv block (512 -> 1024 channels), then
+                 global average pool and a single Linear layer
     """
-    def __init__(self, num_classes=100, input_channels=3):
+    def __init__(self, num_classes=100, input_channels=3, head='mlp'):
         super(CustomCNN, self).__init__()
+        if head not in CUSTOM_CNN_HEADS:
+            raise ValueError(f"Unsupported head: {head}. Choose from {list(CUSTOM_CNN_HEADS)}")
+        self.head = head
         
         self.features = nn.Sequential(
             # Block 1
@@ -125,26 +146,48 @@ class CustomCNN(nn.Module):
             nn.MaxPool2d(kernel_size=2, stride=2),
         )
         
-        self.avgpool = nn.AdaptiveAvgPool2d((7, 7))
+        # Extra convolutions between the features and the pooling (dwsep head only)
+        self.neck = nn.Identity()
         
-        self.classifier = nn.Sequential(
-            nn.Linear(512 * 7 * 7, 4096),
-            nn.ReLU(inplace=True),
-            nn.Dropout(0.5),
-            nn.Linear(4096, 4096),
-            nn.ReLU(inplace=True),
-            nn.Dropout(0.5),
-            nn.Linear(4096, num_classes),
-        )
+        if head == 'mlp':
+            self.avgpool = nn.AdaptiveAvgPool2d((7, 7))
+            self.classifier = nn.Sequential(
+                nn.Linear(512 * 7 * 7, 4096),
+                nn.ReLU(inplace=True),
+                nn.Dropout(0.5),
+                nn.Linear(4096, 4096),
+                nn.ReLU(inplace=True),
+                nn.Dropout(0.5),
+                nn.Linear(4096, num_classes),
+            )
+        else:
+            num_features = 512
+            if head == 'dwsep':
+                num_features = 1024
+                self.neck = nn.Sequential(
+                    # Depthwise 3x3, then pointwise 1x1
+                    nn.Conv2d(512, 512, kernel_size=3, padding=1, groups=512, bias=False),
+                    nn.BatchNorm2d(512),
+                    nn.ReLU(inplace=True),
+                    nn.Conv2d(512, num_features, kernel_size=1, bias=False),
+                    nn.BatchNorm2d(num_features),
+                    nn.ReLU(inplace=True),
+                )
+            self.avgpool = nn.AdaptiveAvgPool2d(1)
+            self.classifier = nn.Sequential(
+                nn.Dropout(0.5),
+                nn.Linear(num_features, num_classes),
+            )
         
     def forward(self, x):
         x = self.features(x)
+        x = self.neck(x)
         x = self.avgpool(x)
         x = torch.flatten(x, 1)
         x = self.classifier(x)
         return x
 
-def create_model(model_name='resnet50', num_classes=100, pretrained=True):
+def create_model(model_name='resnet50', num_classes=100, pretrained=True, head='mlp'):
     """
     Factory function to create models
     
@@ -152,17 +195,28 @@ def create_model(model_name='resnet50', num_classes=100, pretrained=True):
         model_name (str): Model architecture name
         num_classes (int): Number of output classes
         pretrained (bool): Whether to use pretrained weights
+        head (str): Classifier head of custom_cnn ('mlp', 'gap' or 'dwsep');
+            ignored by the other architectures
     
     Returns:
         torch.nn.Module: Created model
     """
     if model_name == 'custom_cnn':
-        return CustomCNN(num_classes=num_classes)
+        return CustomCNN(num_classes=num_classes, head=head)
     else:
         return SportsClassifier(num_classes=num_classes, model_name=model_name, pretrained=pretrained)
 
-def count_parameters(model):
-    """Count the number of trainable parameters in a model"""
+def count_parameters(model, per_module=False):
+    """
+    Count the number of trainable parameters in a model
+    
+    Args:
+        model: The model to inspect
+        per_module (bool): Return a dict with the count of every top-level
+            submodule instead of the total
+    """
+    if per_module:
+        return {name: count_parameters(module) for name, module in model.named_children()}
     return sum(p.numel() for p in model.parameters() if p.requires_grad)
 
 def freeze_backbone(model, freeze=True):
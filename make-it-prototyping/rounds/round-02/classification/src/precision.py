@@ -0,0 +1,46 @@
+import contextlib
+import torch
+
+# Supported precision modes and the autocast dtype they use
+PRECISIONS = {
+    'fp32': None,
+    'bf16': torch.bfloat16,
+    'fp16': torch.float16,
+}
+
+def check_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unsupported precision: {precision}. Choose from {list(PRECISIONS)}")
+
+def autocast(device, precision='fp32'):
+    """
+    Return a context manager that runs the enclosed forward pass in the given precision
+
+    Args:
+        device: Device the model runs on
+        precision (str): 'fp32', 'bf16' or 'fp16'
+
+    Returns:
+        Context manager; a no-op for fp32
+    """
+    check_precision(precision)
+    dtype = PRECISIONS[precision]
+    if dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=torch.device(device).type, dtype=dtype)
+
+def create_grad_scaler(device, precision='fp32'):
+    """
+    Create a gradient scaler for the given precision
+
+    Only fp16 needs loss scaling; bfloat16 has the same exponent range as fp32.
+    For every other mode the returned scaler is disabled and passes calls
+    straight through, so training code can use it unconditionally.
+    """
+    check_precision(precision)
+    device_type = torch.device(device).type
+    enabled = precision == 'fp16'
+    if hasattr(torch.amp, 'GradScaler'):
+        return torch.amp.GradScaler(device_type, enabled=enabled)
+    # Older PyTorch only provides a CUDA scaler
+    return torch.cuda.amp.GradScaler(enabled=enabled and device_type == 'cuda')
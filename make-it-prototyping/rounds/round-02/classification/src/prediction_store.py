@@ -0,0 +1,315 @@
+"""
+Columnar binary storage for per-sample predictions
+
+A prediction store is a directory holding one raw little-endian file per
+column (whatever the byte order of the machine that wrote it) plus
+schema.json with the dtype and row shape of every column, the class names
+and the number of complete rows:
+
+    prediction.bin      predicted class index per sample (int16 or int32)
+    label.bin           true class index per sample, -1 where it is unknown
+    path_end.bin        end offset of the sample's file path in path_bytes.bin
+    path_bytes.bin      UTF-8 file paths, concatenated
+    probs.bin           class probabilities: every class, or only the top k
+    top_k_indices.bin   class indices of the top-k probabilities (probs='topk')
+
+Probabilities can be kept as float32, float16 or uint8 (quantized to
+multiples of 1/255, absolute error at most 1/510). Raw files can be
+appended to and are read back through np.memmap, so nothing is loaded until
+it is used. Rows are only counted once all their columns have been written;
+a writer reopening the store in append mode drops the rest of an
+interrupted write.
+
+Usage:
+    with PredictionWriter('../outputs/model_predictions', class_names, probs='topk', top_k=5) as writer:
+        writer.write(predictions, labels, paths=paths, probs=top_probs, top_k_indices=top_indices)
+
+    store = PredictionStore('../outputs/model_predictions')
+    accuracy = (store.predictions == store.labels).mean()
+"""
+
+import json
+import os
+
+import numpy as np
+
+SCHEMA_FILE = 'schema.json'
+FORMAT_VERSION = 1
+PROBS_MODES = ('full', 'topk', 'none')
+PROBS_DTYPES = ('float32', 'float16', 'uint8')
+
+# uint8 probabilities store round(p * 255)
+UINT8_SCALE = 1 / 255
+
+def _class_dtype(num_classes):
+    return 'int16' if num_classes <= np.iinfo(np.int16).max else 'int32'
+
+def _file_dtype(dtype):
+    """Byte layout of a column file: the schema dtype, always little-endian"""
+    return np.dtype(dtype).newbyteorder('<')
+
+def _read_schema(path):
+    with open(os.path.join(path, SCHEMA_FILE)) as f:
+        schema = json.load(f)
+    if schema['format_version'] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported prediction store version: {schema['format_version']}")
+    return schema
+
+def _write_schema(path, schema):
+    schema_file = os.path.join(path, SCHEMA_FILE)
+    with open(schema_file + '.tmp', 'w') as f:
+        json.dump(schema, f, indent=4)
+    os.replace(schema_file + '.tmp', schema_file)
+
+def quantize_probs(probs):
+    """Map probabilities in [0, 1] to uint8"""
+    return np.rint(np.clip(probs, 0.0, 1.0) / UINT8_SCALE).astype(np.uint8)
+
+class PredictionWriter:
+    """
+    Writes predictions to a columnar store, batch by batch
+
+    Every write() appends to the column files and then records the new row
+    count in schema.json, so a store is readable (up to the last complete
+    write) while it is being written and after a crash.
+    """
+    def __init__(self, path, class_names, probs='full', top_k=5, probs_dtype='float16', paths=True,
+                 append=False):
+        """
+        Args:
+            path (str): Store directory
+            class_names (list): Class names, indexed by label
+            probs (str): Probabilities to keep: 'full' (every class), 'topk' or 'none'
+            top_k (int): Number of probabilities per sample for probs='topk'
+            probs_dtype (str): 'float32', 'float16' or 'uint8' (quantized)
+            paths (bool): Store a file path per sample
+            append (bool): Add rows to an existing store instead of replacing it;
+                its schema must match the other arguments
+        """
+        if probs not in PROBS_MODES:
+            raise ValueError(f"Unsupported probs: {probs}. Choose from {list(PROBS_MODES)}")
+        if probs_dtype not in PROBS_DTYPES:
+            raise ValueError(f"Unsupported probs_dtype: {probs_dtype}. Choose from {list(PROBS_DTYPES)}")
+
+        class_names = [str(name) for name in class_names]
+        class_dtype = _class_dtype(len(class_names))
+        columns = {
+            'prediction': {'dtype': class_dtype, 'shape': []},
+            'label': {'dtype': class_dtype, 'shape': []},
+        }
+        if paths:
+            columns['path_end'] = {'dtype': 'int64', 'shape': []}
+        if probs != 'none':
+            width = len(class_names) if probs == 'full' else min(top_k, len(class_names))
+            columns['probs'] = {'dtype': probs_dtype, 'shape': [width]}
+        if probs == 'topk':
+            columns['top_k_indices'] = {'dtype': class_dtype, 'shape': [width]}
+        schema = {
+            'format_version': FORMAT_VERSION,
+            'num_rows': 0,
+            'class_names': class_names,
+            'probs': probs,
+            'probs_scale': UINT8_SCALE if probs_dtype == 'uint8' else None,
+            'columns': columns,
+            'path_bytes': 0 if paths else None,
+        }
+
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if append and os.path.exists(os.path.join(path, SCHEMA_FILE)):
+            existing = _read_schema(path)
+            for key in ('class_names', 'probs', 'probs_scale', 'columns'):
+                if existing[key] != schema[key]:
+                    raise ValueError(f"Cannot append to {path}: its {key} differ from this writer's")
+            schema = existing
+        elif os.path.exists(os.path.join(path, SCHEMA_FILE)):
+            # Replacing a store: remove columns the new schema does not have
+            existing = _read_schema(path)
+            for name in set(existing['columns']) - set(schema['columns']):
+                os.remove(os.path.join(path, f'{name}.bin'))
+            if existing['path_bytes'] is not None and not paths:
+                os.remove(os.path.join(path, 'path_bytes.bin'))
+        self.schema = schema
+
+        # Start every column at the recorded row count, dropping any partial write
+        self._files = {}
+        for name, column in self.schema['columns'].items():
+            row_bytes = np.dtype(column['dtype']).itemsize * int(np.prod(column['shape']))
+            self._files[name] = self._open(f'{name}.bin', self.schema['num_rows'] * row_bytes)
+        if paths:
+            self._files['path_bytes'] = self._open('path_bytes.bin', self.schema['path_bytes'])
+        _write_schema(path, self.schema)
+
+    def _open(self, filename, size):
+        f = open(os.path.join(self.path, filename), 'ab')
+        f.truncate(size)
+        return f
+
+    @property
+    def num_rows(self):
+        return self.schema['num_rows']
+
+    def write(self, predictions, labels, paths=None, probs=None, top_k_indices=None):
+        """
+        Append a batch of samples
+
+        Args:
+            predictions (array): Predicted class indices
+            labels (array): True class indices
+            paths (list, optional): File path of every sample; required when the store keeps paths
+            probs (array, optional): Probabilities, (N, num_classes) or (N, top_k) as configured;
+                float values are quantized for uint8 stores
+            top_k_indices (array, optional): Class indices of probs, for probs='topk'
+        """
+        columns = self.schema['columns']
+        num_rows = len(predictions)
+        values = {'prediction': predictions, 'label': labels, 'probs': probs, 'top_k_indices': top_k_indices}
+
+        # Everything is validated and converted before the first byte is written
+        chunks = {}
+        for name, column in columns.items():
+            if name == 'path_end':
+                continue
+            if values[name] is None:
+                raise ValueError(f"Column {name} is required by this store")
+            array = np.asarray(values[name])
+            if array.shape != (num_rows, *column['shape']):
+                raise ValueError(f"Column {name} has shape {array.shape}, expected {(num_rows, *column['shape'])}")
+            if column['dtype'] == 'uint8' and array.dtype != np.uint8:
+                array = quantize_probs(array)
+            chunks[name] = np.ascontiguousarray(array, dtype=_file_dtype(column['dtype'])).tobytes()
+
+        path_bytes = self.schema['path_bytes']
+        if 'path_end' in columns:
+            if paths is None or len(paths) != num_rows:
+                raise ValueError("This store keeps a file path per sample")
+            encoded = [str(path).encode('utf-8') for path in paths]
+            ends = path_bytes + np.cumsum([len(item) for item in encoded], dtype=np.int64)
+            chunks['path_end'] = ends.astype(_file_dtype('int64')).tobytes()
+            chunks['path_bytes'] = b''.join(encoded)
+            path_bytes += len(chunks['path_bytes'])
+
+        for name, chunk in chunks.items():
+            self._files[name].write(chunk)
+        for f in self._files.values():
+            f.flush()
+        self.schema['num_rows'] += num_rows
+        self.schema['path_bytes'] = path_bytes
+        _write_schema(self.path, self.schema)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class PredictionStore:
+    """
+    Read access to a store written by PredictionWriter
+
+    Columns are memory-mapped read-only arrays, so opening a store is cheap
+    regardless of its size and slices only read the rows they cover.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Store directory
+        """
+        self.path = path
+        self.schema = _read_schema(path)
+        self.class_names = self.schema['class_names']
+        self.num_rows = self.schema['num_rows']
+        self._columns = {}
+
+    def __len__(self):
+        return self.num_rows
+
+    @property
+    def columns(self):
+        return list(self.schema['columns'])
+
+    def column(self, name):
+        """Memory-mapped array of one column, shape (num_rows, *row shape)"""
+        if name not in self._columns:
+            column = self.schema['columns'][name]
+            shape = (self.num_rows, *column['shape'])
+            if self.num_rows == 0:
+                self._columns[name] = np.empty(shape, dtype=_file_dtype(column['dtype']))
+            else:
+                self._columns[name] = np.memmap(os.path.join(self.path, f'{name}.bin'),
+                                                dtype=_file_dtype(column['dtype']), mode='r', shape=shape)
+        return self._columns[name]
+
+    @property
+    def predictions(self):
+        return self.column('prediction')
+
+    @property
+    def labels(self):
+        return self.column('label')
+
+    @property
+    def top_k_indices(self):
+        """Class indices of the stored probabilities (probs='topk' only)"""
+        return self.column('top_k_indices')
+
+    def probabilities(self, rows=slice(None)):
+        """
+        Stored probabilities of the selected rows as float32
+
+        Args:
+            rows: Any NumPy index into the rows
+
+        Returns:
+            np.ndarray: (rows, num_classes) for probs='full', (rows, top_k) for
+                probs='topk', in the order of top_k_indices
+        """
+        if self.schema['probs'] == 'none':
+            raise ValueError(f"{self.path} does not store probabilities")
+        probs = np.asarray(self.column('probs')[rows], dtype=np.float32)
+        if self.schema['probs_scale'] is not None:
+            probs *= self.schema['probs_scale']
+        return probs
+
+    def path_of(self, idx):
+        """File path of sample idx"""
+        ends = self.column('path_end')
+        start = ends[idx - 1] if idx > 0 else 0
+        with open(os.path.join(self.path, 'path_bytes.bin'), 'rb') as f:
+            f.seek(start)
+            return f.read(ends[idx] - start).decode('utf-8')
+
+    def paths(self):
+        """File paths of all samples"""
+        if 'path_end' not in self.schema['columns']:
+            raise ValueError(f"{self.path} does not store file paths")
+        with open(os.path.join(self.path, 'path_bytes.bin'), 'rb') as f:
+            buffer = f.read(self.schema['path_bytes'])
+        starts = np.concatenate(([0], self.column('path_end')[:-1]))
+        return [buffer[start:end].decode('utf-8') for start, end in zip(starts, self.column('path_end'))]
+
+    def to_dataframe(self):
+        """
+        Predictions, labels and paths as a pandas DataFrame with categorical class columns
+
+        Class index -1 (unknown label, undecodable image) becomes a missing
+        value; the label columns are left out when no sample has a label.
+        """
+        import pandas as pd
+
+        data = {}
+        labels = np.asarray(self.labels)
+        labeled = (labels >= 0).any()
+        if labeled:
+            data['true_label'] = pd.Categorical.from_codes(labels, categories=self.class_names)
+        data['predicted_label'] = pd.Categorical.from_codes(self.predictions, categories=self.class_names)
+        if labeled:
+            data['correct'] = (labels == np.asarray(self.predictions)) & (labels >= 0)
+        if 'path_end' in self.schema['columns']:
+            data['path'] = self.paths()
+        return pd.DataFrame(data)
@@ -0,0 +1,208 @@
+import contextlib
+import json
+import os
+import time
+import torch
+
+class StepProfiler:
+    """
+    Records where the time of every training step goes
+
+    Stages are timed with stage() context managers; the wait for the next
+    batch is timed by iterating the data loader through iterate(). CUDA
+    work is asynchronous, so on a GPU the device is synchronized at stage
+    boundaries (synchronize=True); that costs a little throughput but
+    attributes kernel time to the stage that launched it.
+
+    Per epoch, totals and per-step means of every stage are summarized;
+    export() writes the summaries and a Chrome-trace timeline (open in
+    chrome://tracing or https://ui.perfetto.dev). With torch_profiler=True,
+    torch.profiler additionally records operator-level traces of a few
+    steps, annotated with the same stage names.
+    """
+    def __init__(self, enabled=True, device=None, synchronize=True, output_dir=None, record_timeline=True,
+                 torch_profiler=False, profiler_schedule=None, rank=0):
+        """
+        Args:
+            enabled (bool): When False every method is a cheap no-op
+            device: Training device; synchronized at stage boundaries when it is a GPU
+            synchronize (bool): Synchronize CUDA devices around every stage
+            output_dir (str, optional): Where export() and torch.profiler write their files
+            record_timeline (bool): Keep every stage interval for the Chrome trace
+            torch_profiler (bool): Also run torch.profiler
+            profiler_schedule (dict, optional): wait/warmup/active/repeat for torch.profiler.schedule;
+                defaults to skipping 5 steps and recording 5
+            rank (int): Process rank, used as the trace process id
+        """
+        self.enabled = enabled
+        self.device = torch.device(device) if device is not None else None
+        self.synchronize = synchronize and self.device is not None and self.device.type == 'cuda'
+        self.output_dir = output_dir
+        self.record_timeline = record_timeline
+        self.use_torch_profiler = torch_profiler
+        self.profiler_schedule = profiler_schedule or {'wait': 4, 'warmup': 1, 'active': 5, 'repeat': 1}
+        self.rank = rank
+
+        self.epoch = None
+        self.step_index = 0
+        self.epoch_summaries = []
+        self.timeline = []
+        self._totals = {}
+        self._counts = {}
+        self._epoch_start = None
+        self._origin = time.perf_counter()
+        self._torch_profiler = None
+
+    def _sync(self):
+        if self.synchronize:
+            torch.cuda.synchronize(self.device)
+
+    def _add(self, name, start, end):
+        self._totals[name] = self._totals.get(name, 0.0) + end - start
+        self._counts[name] = self._counts.get(name, 0) + 1
+        if self.record_timeline:
+            self.timeline.append((name, start, end, self.epoch, self.step_index))
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        self._sync()
+        start = time.perf_counter()
+        if self._torch_profiler is not None:
+            with torch.profiler.record_function(name):
+                yield
+        else:
+            yield
+        self._sync()
+        self._add(name, start, time.perf_counter())
+
+    def stage(self, name):
+        """Context manager timing the enclosed block as stage name"""
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timed(name)
+
+    def iterate(self, iterable, name='data_wait'):
+        """Iterate over iterable, timing every wait for the next item as stage name"""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self._add(name, start, time.perf_counter())
+            yield item
+
+    def step(self):
+        """Mark the end of a training step (one batch)"""
+        if not self.enabled:
+            return
+        self.step_index += 1
+        if self._torch_profiler is not None:
+            self._torch_profiler.step()
+
+    def start_epoch(self, epoch):
+        if not self.enabled:
+            return
+        self.epoch = epoch
+        self.step_index = 0
+        self._totals = {}
+        self._counts = {}
+        # torch.profiler traces only a few steps, so it only runs in the first profiled epoch
+        if self.use_torch_profiler and not self.epoch_summaries:
+            self._start_torch_profiler()
+        self._epoch_start = time.perf_counter()
+
+    def _start_torch_profiler(self):
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if self.device is not None and self.device.type == 'cuda':
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        output_dir = self.output_dir or '.'
+        os.makedirs(output_dir, exist_ok=True)
+        trace_path = os.path.join(output_dir, f'torch_trace_rank{self.rank}.json')
+        self._torch_profiler = torch.profiler.profile(
+            activities=activities,
+            schedule=torch.profiler.schedule(**self.profiler_schedule),
+            on_trace_ready=lambda profiler: profiler.export_chrome_trace(trace_path),
+            record_shapes=True,
+        )
+        self._torch_profiler.__enter__()
+
+    def end_epoch(self):
+        """
+        Summarize the epoch that just ended
+
+        Returns:
+            dict: Epoch wall time, number of steps, and per stage the total
+            seconds, milliseconds per step, number of timed intervals and
+            share of the epoch
+        """
+        if not self.enabled:
+            return None
+        self._sync()
+        epoch_seconds = time.perf_counter() - self._epoch_start
+        stages = {}
+        for name in sorted(self._totals, key=lambda name: -self._totals[name]):
+            total = self._totals[name]
+            stages[name] = {
+                'total_s': total,
+                'ms_per_step': 1000 * total / max(self.step_index, 1),
+                'count': self._counts[name],
+                'fraction': total / epoch_seconds if epoch_seconds else 0.0,
+            }
+        untracked = epoch_seconds - sum(self._totals.values())
+        summary = {
+            'epoch': self.epoch,
+            'steps': self.step_index,
+            'epoch_s': epoch_seconds,
+            'untracked_s': max(untracked, 0.0),
+            'stages': stages,
+        }
+        self.epoch_summaries.append(summary)
+
+        if self._torch_profiler is not None:
+            self._torch_profiler.__exit__(None, None, None)
+            self._torch_profiler = None
+        return summary
+
+    def format_summary(self, summary):
+        """One-line description of an epoch summary, e.g. for logging"""
+        parts = [f"{name} {stage['ms_per_step']:.1f}ms ({100 * stage['fraction']:.0f}%)"
+                 for name, stage in summary['stages'].items()]
+        return f"Step profile over {summary['steps']} steps: " + ', '.join(parts)
+
+    def export(self, output_dir=None):
+        """
+        Write profile_summary.json and the Chrome-trace timeline.json
+
+        Returns:
+            tuple: Paths of the summary and the timeline (None when not recorded)
+        """
+        if not self.enabled:
+            return None, None
+        output_dir = output_dir or self.output_dir or '.'
+        os.makedirs(output_dir, exist_ok=True)
+
+        summary_path = os.path.join(output_dir, 'profile_summary.json')
+        with open(summary_path, 'w') as f:
+            json.dump({'synchronized': self.synchronize, 'epochs': self.epoch_summaries}, f, indent=4)
+
+        timeline_path = None
+        if self.record_timeline:
+            timeline_path = os.path.join(output_dir, 'timeline.json')
+            events = [{
+                'name': name,
+                'cat': 'train',
+                'ph': 'X',
+                'ts': (start - self._origin) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': self.rank,
+                'tid': 0,
+                'args': {'epoch': epoch, 'step': step},
+            } for name, start, end, epoch, step in self.timeline]
+            with open(timeline_path, 'w') as f:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return summary_path, timeline_path
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Post-training int8 quantization for CPU inference
+
+Produces, from a trained checkpoint:
+    dynamic   Linear layers quantized to int8; activations quantized on the fly
+    static    Whole network quantized (FX graph mode), with activation ranges
+              calibrated on the first batches of the valid split
+
+CustomCNN has its Conv+BatchNorm+ReLU blocks folded first; for the other
+architectures FX graph mode folds them during static quantization. Every
+variant is evaluated on the test split with ModelEvaluator next to the fp32
+model, and the fastest variant whose accuracy drop stays within
+max_accuracy_drop is exported as a TorchScript file loadable with
+ExportedClassifier.
+
+Usage:
+    python -m src.quantize --model-path ../models/best_model.pth --model resnet50 \\
+        --modes dynamic static --max-accuracy-drop 0.01
+"""
+
+import argparse
+import copy
+import io
+import json
+import os
+import time
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import fuse_modules, get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from .data_loader import create_data_loaders
+from .evaluate import ModelEvaluator
+from .export import save_traced
+from .model import CustomCNN, create_model
+
+QUANTIZATION_MODES = ('dynamic', 'static')
+
+def select_quantized_engine():
+    """Pick the best available int8 kernel backend (x86 > fbgemm > qnnpack)"""
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise RuntimeError("This PyTorch build has no quantized engine")
+
+def fuse_custom_cnn(model):
+    """
+    Fold every Conv2d+BatchNorm2d(+ReLU) of a CustomCNN into a single module
+
+    Covers the convolutional features and the neck of the 'dwsep' head.
+    Returns an eval-mode copy; the model passed in is left unchanged.
+    """
+    model = copy.deepcopy(model).eval()
+    groups = []
+    for prefix in ('features', 'neck'):
+        sequential = getattr(model, prefix)
+        if not isinstance(sequential, nn.Sequential):
+            continue
+        layers = list(sequential)
+        for i, layer in enumerate(layers):
+            if isinstance(layer, nn.Conv2d) and i + 1 < len(layers) and isinstance(layers[i + 1], nn.BatchNorm2d):
+                group = [f'{prefix}.{i}', f'{prefix}.{i + 1}']
+                if i + 2 < len(layers) and isinstance(layers[i + 2], nn.ReLU):
+                    group.append(f'{prefix}.{i + 2}')
+                groups.append(group)
+    return fuse_modules(model, groups)
+
+def prepare_for_quantization(model):
+    """Eval-mode copy of the model, with Conv+BN folded for CustomCNN"""
+    if isinstance(model, CustomCNN):
+        return fuse_custom_cnn(model)
+    model = copy.deepcopy(model).eval()
+    backbone = getattr(model, 'backbone', None)
+    if hasattr(backbone, 'set_swish'):
+        # The memory-efficient swish of efficientnet_pytorch cannot be traced by FX
+        backbone.set_swish(memory_efficient=False)
+    return model
+
+def quantize_dynamic_linear(model):
+    """Quantize the weights of every Linear layer to int8"""
+    return quantize_dynamic(prepare_for_quantization(model), {nn.Linear}, dtype=torch.qint8)
+
+def quantize_static(model, calibration_loader, num_calibration_batches=10, batch_transform=None, engine=None):
+    """
+    Quantize weights and activations to int8 with FX graph mode
+
+    Args:
+        model (nn.Module): Trained fp32 model
+        calibration_loader: Loader whose first batches are used to observe activation ranges
+        num_calibration_batches (int): Number of batches to calibrate on
+        batch_transform (callable, optional): Applied to each calibration batch
+        engine (str, optional): Quantized backend; defaults to select_quantized_engine()
+
+    Returns:
+        torch.fx.GraphModule: Quantized model (CPU only)
+    """
+    engine = engine or select_quantized_engine()
+    model = prepare_for_quantization(model)
+    example_inputs = (next(iter(calibration_loader))[0],)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(engine), example_inputs)
+
+    with torch.no_grad():
+        for batch_idx, (inputs, _) in enumerate(calibration_loader):
+            if batch_idx >= num_calibration_batches:
+                break
+            if batch_transform:
+                inputs = batch_transform(inputs)
+            prepared(inputs)
+    return convert_fx(prepared)
+
+def model_size_mb(model):
+    """Size of the serialized state dict in MB"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes / 1e6
+
+def measure_latency(model, image_size, batch_size=1, repeats=20, warmup=3):
+    """Mean forward time in milliseconds for one batch of random images"""
+    inputs = torch.randn(batch_size, 3, image_size, image_size)
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(inputs)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(inputs)
+    return (time.perf_counter() - start) / repeats * 1000
+
+def quantize_and_report(model_path, csv_file='../archive/sports.csv', root_dir='../archive',
+                        model_name='resnet50', image_size=224, batch_size=32, modes=QUANTIZATION_MODES,
+                        num_calibration_batches=10, max_accuracy_drop=0.01, latency_batch_size=1,
+                        output_path='../models/sports_classifier_int8.pt', save_dir='../outputs/quantization',
+                        cache_dir=None, index_file=None, num_workers=4, head='mlp'):
+    """
+    Quantize a checkpoint, evaluate every variant and export the best one
+
+    Args:
+        model_path (str): Training checkpoint written by train_sports_classifier
+        csv_file (str): Dataset CSV
+        root_dir (str): Dataset root directory
+        model_name (str): Architecture passed to create_model
+        image_size (int): Input size the model was trained with
+        batch_size (int): Batch size for calibration and evaluation
+        modes (tuple): Quantization modes to try, from QUANTIZATION_MODES
+        num_calibration_batches (int): valid batches used to calibrate static quantization
+        max_accuracy_drop (float): Largest acceptable loss of test accuracy (absolute, 0-1)
+        latency_batch_size (int): Batch size of the latency measurement
+        output_path (str): Where to export the selected quantized model; None to skip
+        save_dir (str): Directory for quantization_report.json
+        cache_dir (str, optional): Image cache directory, see create_data_loaders
+        index_file (str, optional): DatasetIndex sidecar, see create_data_loaders
+        num_workers (int): Data loader workers
+        head (str): custom_cnn head the model was trained with
+
+    Returns:
+        dict: Per variant accuracy, top-k accuracy, latency, size and whether it is within the accuracy budget
+    """
+    for mode in modes:
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization mode: {mode}. Choose from {list(QUANTIZATION_MODES)}")
+
+    # Quantized kernels only exist for the CPU
+    device = torch.device('cpu')
+    engine = select_quantized_engine()
+    print(f"Quantized engine: {engine}")
+
+    data_info = create_data_loaders(csv_file=csv_file, root_dir=root_dir, batch_size=batch_size,
+                                    image_size=image_size, num_workers=num_workers, cache_dir=cache_dir,
+                                    index_file=index_file)
+    class_names = data_info['train_dataset'].get_class_names()
+
+    model = create_model(model_name=model_name, num_classes=len(class_names), pretrained=False, head=head)
+    checkpoint = torch.load(model_path, map_location=device)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+
+    variants = {'fp32': model}
+    if isinstance(model, CustomCNN):
+        variants['fp32_fused'] = fuse_custom_cnn(model)
+    if 'dynamic' in modes:
+        variants['dynamic'] = quantize_dynamic_linear(model)
+    if 'static' in modes:
+        variants['static'] = quantize_static(model, data_info['val_loader'], num_calibration_batches, engine=engine)
+
+    report = {}
+    for name, variant in variants.items():
+        print(f"\n=== {name} ===")
+        evaluator = ModelEvaluator(variant, data_info['test_loader'], device, class_names, store_probs='none')
+        evaluator.evaluate()
+        metrics = evaluator.compute_metrics()
+        report[name] = {
+            'accuracy': float(metrics['accuracy']),
+            f'top_{evaluator.top_k}_accuracy': float(metrics[f'top_{evaluator.top_k}_accuracy']),
+            'latency_ms': measure_latency(variant, image_size, batch_size=latency_batch_size),
+            'size_mb': model_size_mb(variant),
+        }
+
+    baseline = report['fp32']
+    for name, result in report.items():
+        result['accuracy_drop'] = baseline['accuracy'] - result['accuracy']
+        result['speedup'] = baseline['latency_ms'] / result['latency_ms']
+        result['within_budget'] = result['accuracy_drop'] <= max_accuracy_drop
+
+    print(f"\n{'variant':>10} | {'accuracy':>8} | {'drop':>7} | {'latency ms':>10} | {'speedup':>7} | {'size MB':>7}")
+    for name, result in report.items():
+        flag = '' if result['within_budget'] else '  (over budget)'
+        print(f"{name:>10} | {result['accuracy']:8.4f} | {result['accuracy_drop']:7.4f} | "
+              f"{result['latency_ms']:10.2f} | {result['speedup']:6.2f}x | {result['size_mb']:7.1f}{flag}")
+
+    candidates = [name for name in modes if report[name]['within_budget']]
+    selected = min(candidates, key=lambda name: report[name]['latency_ms']) if candidates else None
+    if selected is None:
+        print(f"\nNo quantized variant stays within an accuracy drop of {max_accuracy_drop}")
+    elif output_path:
+        save_traced(variants[selected], output_path, class_names, image_size, model_name=model_name,
+                    precision=f'int8_{selected}', quantized_engine=engine, epoch=checkpoint.get('epoch'))
+        print(f"\nExported {selected} int8 model to {output_path}")
+
+    os.makedirs(save_dir, exist_ok=True)
+    with open(os.path.join(save_dir, 'quantization_report.json'), 'w') as f:
+        json.dump({'model_name': model_name, 'engine': engine, 'max_accuracy_drop': max_accuracy_drop,
+                   'selected': selected, 'variants': report}, f, indent=4)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-path', default='../models/best_model.pth')
+    parser.add_argument('--model', default='resnet50')
+    parser.add_argument('--head', default='mlp', help='custom_cnn head')
+    parser.add_argument('--csv-file', default='../archive/sports.csv')
+    parser.add_argument('--root-dir', default='../archive')
+    parser.add_argument('--index-file', default=None)
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--modes', nargs='+', default=list(QUANTIZATION_MODES), choices=QUANTIZATION_MODES)
+    parser.add_argument('--calibration-batches', type=int, default=10)
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01)
+    parser.add_argument('--latency-batch-size', type=int, default=1)
+    parser.add_argument('--num-workers', type=int, default=4)
+    parser.add_argument('--output', default='../models/sports_classifier_int8.pt')
+    parser.add_argument('--save-dir', default='../outputs/quantization')
+    args = parser.parse_args(argv)
+
+    quantize_and_report(
+        args.model_path, csv_file=args.csv_file, root_dir=args.root_dir, model_name=args.model,
+        image_size=args.image_size, batch_size=args.batch_size, modes=args.modes,
+        num_calibration_batches=args.calibration_batches, max_accuracy_drop=args.max_accuracy_drop,
+        latency_batch_size=args.latency_batch_size, output_path=args.output, save_dir=args.save_dir,
+        cache_dir=args.cache_dir, index_file=args.index_file, num_workers=args.num_workers, head=args.head
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Report stage: raw training/evaluation data first, rendered plots later
+
+ReportWriter stores the data behind every plot under <output_dir>/report/ as
+<name>.json (plot kind and small fields) plus one <name>.<field>.npy per
+array, which is fast and never touches matplotlib. Rendering then happens
+according to the mode:
+
+    background  a separate `python -m src.reporting` process renders the
+                plots with the non-interactive Agg backend; the caller does
+                not wait for it
+    inline      rendered in the calling process (still Agg, nothing is shown)
+    raw         only the data is written; render later with
+                python -m src.reporting <output_dir>/report --dpi 150 --format png pdf
+
+Usage:
+    python -m src.reporting ../outputs/report --dpi 300 --format png
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+REPORT_MODES = ('background', 'inline', 'raw', 'none')
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def draw_training_history(fig, train_losses, val_losses, train_accuracies, val_accuracies, learning_rates=()):
+    """
+    Draw loss, accuracy and learning-rate curves into a figure
+
+    NaN validation entries (epochs validated on the subsample only) are
+    skipped, so the validation curves connect the full validations.
+    """
+    ((ax1, ax2), (ax3, ax4)) = fig.subplots(2, 2)
+    val_epochs = np.flatnonzero(~np.isnan(np.asarray(val_losses, dtype=float)))
+    val_losses = np.asarray(val_losses, dtype=float)[val_epochs]
+    val_accuracies = np.asarray(val_accuracies, dtype=float)[val_epochs]
+
+    # Loss plot
+    ax1.plot(train_losses, label='Train Loss', color='blue')
+    ax1.plot(val_epochs, val_losses, label='Validation Loss', color='red')
+    ax1.set_title('Training and Validation Loss')
+    ax1.set_xlabel('Epoch')
+    ax1.set_ylabel('Loss')
+    ax1.legend()
+    ax1.grid(True)
+
+    # Accuracy plot
+    ax2.plot(train_accuracies, label='Train Accuracy', color='blue')
+    ax2.plot(val_epochs, val_accuracies, label='Validation Accuracy', color='red')
+    ax2.set_title('Training and Validation Accuracy')
+    ax2.set_xlabel('Epoch')
+    ax2.set_ylabel('Accuracy (%)')
+    ax2.legend()
+    ax2.grid(True)
+
+    # Learning rate plot
+    if len(learning_rates):
+        ax3.plot(learning_rates, color='green')
+        ax3.set_title('Learning Rate Schedule')
+        ax3.set_xlabel('Epoch')
+        ax3.set_ylabel('Learning Rate')
+        ax3.set_yscale('log')
+        ax3.grid(True)
+
+    # Combined loss and accuracy
+    ax4_twin = ax4.twinx()
+    ax4.plot(train_losses, label='Train Loss', color='blue', alpha=0.7)
+    ax4.plot(val_epochs, val_losses, label='Val Loss', color='red', alpha=0.7)
+    ax4_twin.plot(train_accuracies, label='Train Acc', color='blue', linestyle='--')
+    ax4_twin.plot(val_epochs, val_accuracies, label='Val Acc', color='red', linestyle='--')
+
+    ax4.set_xlabel('Epoch')
+    ax4.set_ylabel('Loss')
+    ax4_twin.set_ylabel('Accuracy (%)')
+    ax4.set_title('Combined Loss and Accuracy')
+    ax4.grid(True)
+
+    # Combine legends
+    lines1, labels1 = ax4.get_legend_handles_labels()
+    lines2, labels2 = ax4_twin.get_legend_handles_labels()
+    ax4.legend(lines1 + lines2, labels1 + labels2, loc='center right')
+
+    fig.tight_layout()
+
+def normalize_confusion_matrix(cm):
+    """Divide every row by its number of samples (rows without samples stay zero)"""
+    row_sums = cm.sum(axis=1, keepdims=True)
+    return np.divide(cm, row_sums, out=np.zeros(cm.shape), where=row_sums > 0)
+
+def draw_confusion_matrix(fig, confusion_matrix, class_names, normalize=True):
+    """Draw a confusion matrix heatmap into a figure; returns the plotted matrix"""
+    import seaborn as sns
+
+    cm = np.asarray(confusion_matrix)
+    if normalize:
+        cm = normalize_confusion_matrix(cm)
+        title = 'Normalized Confusion Matrix'
+        fmt = '.2f'
+    else:
+        title = 'Confusion Matrix'
+        fmt = 'd'
+
+    ax = fig.subplots()
+    sns.heatmap(cm, annot=False, fmt=fmt, cmap='Blues',
+                xticklabels=class_names, yticklabels=class_names, ax=ax)
+    ax.set_title(title)
+    ax.set_xlabel('Predicted Label')
+    ax.set_ylabel('True Label')
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+    ax.tick_params(axis='y', labelrotation=0)
+    return cm
+
+def draw_per_class_metrics(fig, class_names, precision, recall, f1_score, support):
+    """Draw per-class precision, recall, F1-score and support bars into a figure"""
+    axes = fig.subplots(2, 2)
+    panels = [
+        (axes[0, 0], precision, 'Per-Class Precision', 'Precision'),
+        (axes[0, 1], recall, 'Per-Class Recall', 'Recall'),
+        (axes[1, 0], f1_score, 'Per-Class F1-Score', 'F1-Score'),
+        (axes[1, 1], support, 'Per-Class Support (Number of Samples)', 'Support'),
+    ]
+    for ax, values, title, ylabel in panels:
+        ax.bar(range(len(class_names)), values)
+        ax.set_title(title)
+        ax.set_xlabel('Class')
+        ax.set_ylabel(ylabel)
+        ax.set_xticks(range(len(class_names)))
+        ax.set_xticklabels(class_names, rotation=90)
+    fig.tight_layout()
+
+# kind -> (draw function, figure size)
+PLOTS = {
+    'training_history': (draw_training_history, (15, 10)),
+    'confusion_matrix': (draw_confusion_matrix, (15, 12)),
+    'per_class_metrics': (draw_per_class_metrics, (20, 12)),
+}
+
+def render(kind, data, save_path, dpi=300):
+    """
+    Render one plot to a file without pyplot, so no GUI backend is involved
+
+    Args:
+        kind (str): Plot kind, a key of PLOTS
+        data (dict): Keyword arguments of the draw function
+        save_path (str): Output file; the format follows its extension
+        dpi (int): Resolution of raster formats
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    draw, figsize = PLOTS[kind]
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    draw(fig, **data)
+    fig.savefig(save_path, dpi=dpi, bbox_inches='tight')
+
+def save_plot_data(report_dir, name, kind, data):
+    """Write the data of one plot as <name>.json plus one <name>.<field>.npy per array"""
+    os.makedirs(report_dir, exist_ok=True)
+    fields, arrays = {}, []
+    for key, value in data.items():
+        if isinstance(value, np.ndarray):
+            np.save(os.path.join(report_dir, f'{name}.{key}.npy'), value)
+            arrays.append(key)
+        else:
+            fields[key] = value
+    with open(os.path.join(report_dir, f'{name}.json'), 'w') as f:
+        json.dump({'kind': kind, 'fields': fields, 'arrays': arrays}, f, indent=4)
+
+def load_plot_data(report_dir, name):
+    """Inverse of save_plot_data; returns (kind, data)"""
+    with open(os.path.join(report_dir, f'{name}.json')) as f:
+        entry = json.load(f)
+    data = dict(entry['fields'])
+    for key in entry['arrays']:
+        data[key] = np.load(os.path.join(report_dir, f'{name}.{key}.npy'))
+    return entry['kind'], data
+
+def render_report(report_dir, output_dir=None, names=None, dpi=300, formats=('png',)):
+    """
+    Render plots from data written by ReportWriter
+
+    Args:
+        report_dir (str): Directory with the plot data
+        output_dir (str, optional): Where the images go; defaults to the parent of report_dir
+        names (list, optional): Plots to render; defaults to all in report_dir
+        dpi (int): Resolution of raster formats
+        formats (tuple): File formats, e.g. ('png', 'pdf')
+
+    Returns:
+        list: Paths of the written images
+    """
+    output_dir = output_dir or os.path.dirname(os.path.abspath(report_dir))
+    if names is None:
+        names = sorted(file[:-len('.json')] for file in os.listdir(report_dir) if file.endswith('.json'))
+    written = []
+    for name in names:
+        kind, data = load_plot_data(report_dir, name)
+        for fmt in formats:
+            save_path = os.path.join(output_dir, f'{name}.{fmt}')
+            render(kind, data, save_path, dpi=dpi)
+            written.append(save_path)
+    return written
+
+class ReportWriter:
+    """
+    Collects the plots of a run and renders them according to mode
+
+    add() writes the raw data at once; finish() renders (inline), starts a
+    detached renderer process (background) or does nothing (raw). Images are
+    written to output_dir under the plot names, e.g. confusion_matrix.png.
+    """
+    def __init__(self, output_dir, mode='background', dpi=300, formats=('png',)):
+        """
+        Args:
+            output_dir (str): Directory for the images; the data goes to output_dir/report
+            mode (str): 'background', 'inline', 'raw' or 'none' (nothing is written)
+            dpi (int): Resolution of raster formats
+            formats (tuple or str): Image formats, e.g. ('png', 'svg')
+        """
+        if mode not in REPORT_MODES:
+            raise ValueError(f"Unsupported report mode: {mode}. Choose from {list(REPORT_MODES)}")
+        self.output_dir = output_dir
+        self.report_dir = os.path.join(output_dir, 'report')
+        self.mode = mode
+        self.dpi = dpi
+        self.formats = (formats,) if isinstance(formats, str) else tuple(formats)
+        self.names = []
+        self.process = None
+
+    def add(self, name, kind, **data):
+        """Record the data of one plot; arrays are stored as .npy, everything else as JSON"""
+        if kind not in PLOTS:
+            raise ValueError(f"Unsupported plot kind: {kind}. Choose from {list(PLOTS)}")
+        if self.mode == 'none':
+            return
+        save_plot_data(self.report_dir, name, kind, data)
+        self.names.append(name)
+
+    def finish(self, wait=False):
+        """
+        Render the recorded plots according to mode
+
+        Args:
+            wait (bool): In background mode, wait for the renderer process
+
+        Returns:
+            subprocess.Popen or None: The renderer process in background mode
+        """
+        if not self.names or self.mode in ('raw', 'none'):
+            if self.names:
+                print(f"Report data written to {self.report_dir}; render with python -m src.reporting {self.report_dir}")
+            return None
+        if self.mode == 'inline':
+            render_report(self.report_dir, self.output_dir, self.names, dpi=self.dpi, formats=self.formats)
+            return None
+
+        command = [sys.executable, '-m', 'src.reporting', os.path.abspath(self.report_dir),
+                   '--output-dir', os.path.abspath(self.output_dir), '--dpi', str(self.dpi),
+                   '--format', *self.formats, '--names', *self.names]
+        log_file = open(os.path.join(self.report_dir, 'render.log'), 'w')
+        env = dict(os.environ, MPLBACKEND='Agg')
+        self.process = subprocess.Popen(command, cwd=PROJECT_DIR, env=env, stdout=log_file, stderr=log_file,
+                                        stdin=subprocess.DEVNULL, start_new_session=True)
+        log_file.close()
+        print(f"Rendering {', '.join(self.names)} in the background (log: {log_file.name})")
+        if wait:
+            self.process.wait()
+        return self.process
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('report_dir')
+    parser.add_argument('--output-dir', default=None, help='Defaults to the parent of report_dir')
+    parser.add_argument('--names', nargs='+', default=None, help='Plots to render (default: all)')
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--format', nargs='+', default=['png'], dest='formats')
+    args = parser.parse_args(argv)
+
+    for path in render_report(args.report_dir, args.output_dir, args.names, dpi=args.dpi, formats=args.formats):
+        print(f"Wrote {path}")
+
+if __name__ == "__main__":
+    main()
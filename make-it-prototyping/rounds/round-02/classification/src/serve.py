@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Local HTTP inference service with dynamic micro-batching
+
+Requests are queued and grouped into batches of at most max_batch_size
+images; a batch is dispatched as soon as it is full or max_wait_ms after its
+first request arrived, whichever comes first. Each batch is one forward pass.
+
+Endpoints:
+    POST /predict   Body: an encoded image (JPEG, PNG, ...).
+                    Returns {"predictions": [{"class": ..., "probability": ...}, ...]}
+    GET  /health    Returns {"status": "ok"}
+
+Usage:
+    python -m src.serve --model-path ../models/best_model.pth --model resnet50 --port 8000
+    python -m src.serve --model-path ../models/best_model.pth --unix-socket /tmp/sports.sock
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from PIL import Image
+
+from .data_loader import SportsDataset, get_transforms
+from .dataset_index import DatasetIndex
+from .model import create_model
+from .precision import PRECISIONS, autocast
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+class MicroBatcher:
+    """
+    Groups concurrent requests into batches for a single forward pass
+
+    submit() is called from the event loop and returns once the batch the
+    input ended up in has been processed. predict_fn runs on a dedicated
+    thread, so new requests keep being accepted and queued meanwhile.
+    """
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0):
+        """
+        Args:
+            predict_fn (callable): Maps a list of inputs to a list of results
+            max_batch_size (int): Maximum number of inputs per batch
+            max_wait_ms (float): Maximum time the first input of a batch waits for more
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.num_batches = 0
+        self.num_items = 0
+        self._queue = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+
+    def start(self):
+        """Start the batching task on the running event loop"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, item):
+        """Queue one input and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Requests cancelled while queued (client went away) are dropped
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(self._executor, self.predict_fn, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.num_batches += 1
+            self.num_items += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+class InferenceServer:
+    """
+    Serves top-k predictions of a classifier over HTTP/1.1
+
+    Images are decoded and preprocessed on a thread pool with the same
+    transforms as validation, then batched by a MicroBatcher.
+    """
+    def __init__(self, model, class_names, device, image_size=224, top_k=5, max_batch_size=32,
+                 max_wait_ms=5.0, precision='fp32', max_body_bytes=10 * 1024 * 1024):
+        """
+        Args:
+            model (nn.Module): Trained classifier
+            class_names (list): Class name of every output index
+            device: Device the model runs on
+            image_size (int): Input size the model was trained with
+            top_k (int): Number of classes returned per image
+            max_batch_size (int): Maximum number of images per forward pass
+            max_wait_ms (float): Maximum time a request waits for a batch to fill
+            precision (str): 'fp32', 'bf16' or 'fp16' (see precision.py)
+            max_body_bytes (int): Largest accepted request body
+        """
+        self.model = model.to(device).eval()
+        self.class_names = list(class_names)
+        self.device = device
+        self.top_k = min(top_k, len(self.class_names))
+        self.precision = precision
+        self.max_body_bytes = max_body_bytes
+        self.transform = get_transforms(image_size=image_size, augment=False)['val']
+        self.batcher = MicroBatcher(self._predict_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self._server = None
+
+    def preprocess(self, image_bytes):
+        """Decode an encoded image into a normalized CHW tensor"""
+        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+        return self.transform(image)
+
+    def _predict_batch(self, images):
+        inputs = torch.stack(images).to(self.device, non_blocking=True)
+        with torch.no_grad(), autocast(self.device, self.precision):
+            outputs = self.model(inputs)
+        probabilities = torch.softmax(outputs.float(), dim=1)
+        top_probs, top_indices = probabilities.topk(self.top_k, dim=1)
+        top_probs, top_indices = top_probs.cpu().tolist(), top_indices.cpu().tolist()
+        return [
+            [{'class': self.class_names[index], 'probability': prob} for index, prob in zip(indices, probs)]
+            for indices, probs in zip(top_indices, top_probs)
+        ]
+
+    async def predict(self, image_bytes):
+        """Return the top-k predictions for one encoded image"""
+        image = await asyncio.get_running_loop().run_in_executor(None, self.preprocess, image_bytes)
+        return await self.batcher.submit(image)
+
+    async def start(self, host='127.0.0.1', port=8000, unix_socket=None):
+        """Start listening on a TCP port, or on a Unix socket if one is given"""
+        self.batcher.start()
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=unix_socket)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def _handle_connection(self, reader, writer):
+        # Connections are kept alive until the client closes them or asks to
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                content_length = int(headers.get('content-length', 0))
+                if content_length > self.max_body_bytes:
+                    await self._respond(writer, 413, {'error': 'Request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(content_length) if content_length else b''
+
+                status, payload = await self._route(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        path = path.split('?', 1)[0]
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path != '/predict':
+            return 404, {'error': f'Unknown path: {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST with an image as the request body'}
+        try:
+            predictions = await self.predict(body)
+        except (OSError, Image.DecompressionBombError) as e:
+            return 400, {'error': f'Cannot decode image: {e}'}
+        except Exception as e:
+            return 500, {'error': str(e)}
+        return 200, {'predictions': predictions}
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode()
+        head = (f'HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+def load_inference_server(model_path, csv_file='../archive/sports.csv', root_dir='../archive',
+                          model_name='resnet50', image_size=224, index_file=None, top_k=5,
+                          max_batch_size=32, max_wait_ms=5.0, precision=None, head='mlp'):
+    """
+    Build an InferenceServer for a checkpoint written by train_sports_classifier
+
+    Class names come from the training split of the dataset, so the output
+    indices match the ones used in training. precision defaults to the one
+    recorded in the checkpoint; head must match the one custom_cnn was
+    trained with.
+
+    Returns:
+        InferenceServer: Ready to start()
+    """
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    index = DatasetIndex.from_csv_or_sidecar(csv_file, index_file) if index_file else None
+    class_names = SportsDataset(csv_file, root_dir, split='train', index=index).get_class_names()
+
+    model = create_model(model_name=model_name, num_classes=len(class_names), pretrained=False, head=head)
+    checkpoint = torch.load(model_path, map_location=device)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    if precision is None:
+        precision = checkpoint.get('precision', 'fp32')
+
+    return InferenceServer(model, class_names, device, image_size=image_size, top_k=top_k,
+                           max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, precision=precision)
+
+async def serve_forever(server, host='127.0.0.1', port=8000, unix_socket=None):
+    listener = await server.start(host=host, port=port, unix_socket=unix_socket)
+    address = unix_socket or f'http://{host}:{port}'
+    print(f"Serving on {address} (max batch {server.batcher.max_batch_size}, "
+          f"max wait {server.batcher.max_wait * 1000:g} ms)")
+    start = time.perf_counter()
+    try:
+        await listener.serve_forever()
+    finally:
+        elapsed = time.perf_counter() - start
+        batcher = server.batcher
+        if batcher.num_batches:
+            print(f"Served {batcher.num_items} images in {batcher.num_batches} batches "
+                  f"(mean batch {batcher.num_items / batcher.num_batches:.1f}) over {elapsed:.0f}s")
+        await server.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-path', default='../models/best_model.pth')
+    parser.add_argument('--model', default='resnet50')
+    parser.add_argument('--head', default='mlp', help='custom_cnn head')
+    parser.add_argument('--csv-file', default='../archive/sports.csv')
+    parser.add_argument('--root-dir', default='../archive')
+    parser.add_argument('--index-file', default=None)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--precision', default=None, choices=list(PRECISIONS),
+                        help='Defaults to the precision stored in the checkpoint')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-socket', default=None, help='Listen on this Unix socket instead of TCP')
+    args = parser.parse_args(argv)
+
+    server = load_inference_server(
+        args.model_path, csv_file=args.csv_file, root_dir=args.root_dir, model_name=args.model,
+        image_size=args.image_size, index_file=args.index_file, top_k=args.top_k,
+        max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms, precision=args.precision,
+        head=args.head
+    )
+    try:
+        asyncio.run(serve_forever(server, host=args.host, port=args.port, unix_socket=args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,95 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.optim.lr_scheduler import StepLR, ReduceLROnPlateau
+from torch.nn.parallel import DistributedDataParallel
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.metrics import classification_report, confusion_matrix
 import time
-import copy
+import contextlib
 import os
+import random
 from tqdm import tqdm
 import json
+import argparse
 
+from .checkpoint import CheckpointWriter, atomic_save, snapshot_state
 from .data_loader import create_data_loaders
+from .distributed import (is_distributed, is_main_process, get_rank, get_world_size, all_reduce_sum,
+                          all_gather_object, launch_distributed)
 from .model import create_model, count_parameters
+from .precision import autocast, create_grad_scaler
+from .profiling import StepProfiler
+from .reporting import REPORT_MODES, ReportWriter, draw_training_history
+
+def seed_everything(seed):
+    """Seed the python, numpy and torch generators"""
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+def _get_rng_state():
+    # The numpy key array is stored as a tensor so checkpoints stay loadable with weights_only
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    state = {
+        'python': random.getstate(),
+        'numpy': (name, torch.from_numpy(keys.astype(np.int64)), pos, has_gauss, cached_gaussian),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def _set_rng_state(state):
+    name, keys, pos, has_gauss, cached_gaussian = state['numpy']
+    random.setstate(state['python'])
+    np.random.set_state((name, keys.numpy().astype(np.uint32), pos, has_gauss, cached_gaussian))
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+class MetricAccumulator:
+    """
+    Running loss and accuracy sums of an epoch, kept on the device
+    
+    update() only queues device operations; the host waits for the device
+    in sync() alone, so the training loop reads the metrics back every few
+    steps instead of after every batch.
+    """
+    def __init__(self, device, loss_sum=0.0, correct=0, total=0):
+        self.loss_sum = torch.tensor(float(loss_sum), dtype=torch.float64, device=device)
+        self.correct = torch.tensor(int(correct), dtype=torch.int64, device=device)
+        self.total = total
+        self.batches = 0
+        self._window_loss = float(loss_sum)
+        self._window_batches = 0
+    
+    def update(self, loss, outputs, labels):
+        self.loss_sum += loss.detach()
+        self.correct += (outputs.detach().argmax(1) == labels).sum()
+        self.total += labels.size(0)
+        self.batches += 1
+    
+    def sync(self):
+        """Return (loss sum, number of correct predictions) as Python numbers"""
+        loss_sum, correct = torch.stack([self.loss_sum, self.correct.double()]).tolist()
+        return loss_sum, int(correct)
+    
+    def postfix(self):
+        """Progress bar fields: mean batch loss since the previous call and accuracy so far"""
+        loss_sum, correct = self.sync()
+        window = self.batches - self._window_batches
+        loss = (loss_sum - self._window_loss) / window if window else 0.0
+        self._window_loss, self._window_batches = loss_sum, self.batches
+        return {'Loss': f'{loss:.4f}', 'Acc': f'{100 * correct / max(self.total, 1):.2f}%'}
 
 class Trainer:
-    def __init__(self, model, train_loader, val_loader, criterion, optimizer, device, scheduler=None):
+    def __init__(self, model, train_loader, val_loader, criterion, optimizer, device, scheduler=None,
+                 train_batch_transform=None, val_batch_transform=None, precision='fp32',
+                 accumulation_steps=1, scheduler_interval='epoch', profiler=None, log_interval=10):
+        if scheduler_interval not in ('epoch', 'step'):
+            raise ValueError(f"Unsupported scheduler_interval: {scheduler_interval}")
+        if scheduler_interval == 'step' and isinstance(scheduler, ReduceLROnPlateau):
+            raise ValueError("ReduceLROnPlateau needs a validation loss and can only step per epoch")
+        
         self.model = model
         self.train_loader = train_loader
         self.val_loader = val_loader
@@ -25,195 +99,621 @@ class Trainer:
         self.scheduler = scheduler
         self.device = device
         
+        # Batch-level transforms applied on the device after collation (see get_transforms)
+        self.train_batch_transform = train_batch_transform
+        self.val_batch_transform = val_batch_transform
+        
+        # Mixed precision: autocast for forward passes, loss scaling for fp16
+        self.precision = precision
+        self.scaler = create_grad_scaler(device, precision)
+        
+        # Gradient accumulation: one optimizer step per accumulation_steps batches.
+        # With scheduler_interval='step' the scheduler advances per optimizer step.
+        self.accumulation_steps = accumulation_steps
+        self.scheduler_interval = scheduler_interval
+        self.optimizer_steps = 0
+        
+        # With DistributedDataParallel metrics are all-reduced and only the
+        # main process prints and writes files
+        self.is_main_process = is_main_process()
+        
+        # Resumable training: state restored by load_checkpoint, and periodic
+        # mid-epoch checkpoints written to last_checkpoint.pth
+        self.seed = None
+        self.start_epoch = 0
+        self.best_val_accuracy = 0.0
+        self.checkpoint_every_steps = 0
+        self._checkpoint_writer = None
+        self._resume_progress = None
+        self._current_epoch = 0
+        
+        # Per-stage step timings (see StepProfiler); disabled unless a profiler is passed
+        self.profiler = profiler or StepProfiler(enabled=False)
+        
+        # Metrics stay on the device (see MetricAccumulator) and are read back to
+        # refresh the progress bar every log_interval optimizer steps (training)
+        # or batches (validation); 0 reads them only at the end of an epoch
+        self.log_interval = log_interval
+        
+        # Validation on a fixed subsample of the validation split (fast_val_loader),
+        # every val_every_steps optimizer steps and at the end of every epoch; the
+        # full split is only evaluated when the subsample loss improved. Early
+        # stopping counts evaluations without an improvement of the monitored loss.
+        self.fast_val_loader = None
+        self.val_every_steps = 0
+        self.early_stopping_patience = 0
+        self.early_stopping_min_delta = 0.0
+        self.best_monitored_loss = float('inf')
+        self.evals_without_improvement = 0
+        self.stopped_epoch = None
+        self.fast_val_history = []
+        self.full_validation = []
+        self._improved = False
+        
         self.train_losses = []
         self.val_losses = []
         self.train_accuracies = []
         self.val_accuracies = []
         self.learning_rates = []
+        # Cumulative wall-clock seconds at the end of every epoch (training + validation)
+        self.epoch_times = []
+        
+    def set_data_loaders(self, train_loader, val_loader, train_batch_transform=None, val_batch_transform=None,
+                         fast_val_loader=None):
+        """
+        Swap the data loaders between epochs, e.g. to change the image size
         
+        A new batch augmentation continues the batch count of the one it
+        replaces, so its per-batch seeds do not repeat those of earlier stages.
+        """
+        previous_batches = getattr(self.train_batch_transform, 'num_batches', None)
+        if previous_batches is not None and hasattr(train_batch_transform, 'num_batches'):
+            train_batch_transform.num_batches = previous_batches
+        self.train_loader = train_loader
+        self.val_loader = val_loader
+        self.train_batch_transform = train_batch_transform
+        self.val_batch_transform = val_batch_transform
+        self.fast_val_loader = fast_val_loader
+    
+    def time_to_accuracy(self, target_accuracy):
+        """
+        Return (epoch, seconds) of the first epoch whose validation accuracy
+        reached target_accuracy (in %), or None if none did; epochs validated
+        on the subsample only are not counted
+        """
+        for epoch, (accuracy, seconds, full) in enumerate(zip(self.val_accuracies, self.epoch_times,
+                                                             self.full_validation)):
+            if full and accuracy >= target_accuracy:
+                return epoch + 1, seconds
+        return None
+    
+    def final_val_accuracy(self):
+        """Accuracy of the last full validation, or None if there was none"""
+        for accuracy, full in zip(reversed(self.val_accuracies), reversed(self.full_validation)):
+            if full:
+                return accuracy
+        return None
+    
     def train_epoch(self):
         self.model.train()
-        running_loss = 0.0
-        correct_predictions = 0
-        total_samples = 0
         
-        progress_bar = tqdm(self.train_loader, desc="Training")
+        # A resumed epoch continues from the sums saved with its checkpoint;
+        # the sampler already skips the batches that were trained on
+        progress = self._resume_progress or {'batches': 0, 'running_loss': 0.0, 'correct': 0, 'total': 0}
+        self._resume_progress = None
+        metrics = MetricAccumulator(self.device, progress['running_loss'], progress['correct'], progress['total'])
+        start_batch = progress['batches']
+        
+        num_batches = start_batch + len(self.train_loader)
+        
+        progress_bar = tqdm(self.train_loader, desc="Training", disable=not self.is_main_process)
+        
+        self.optimizer.zero_grad()
         
-        for inputs, labels in progress_bar:
-            inputs, labels = inputs.to(self.device), labels.to(self.device)
+        profiler = self.profiler
+        batches = profiler.iterate(progress_bar, 'data_wait')
+        for batch_idx, (inputs, labels) in enumerate(batches, start=start_batch):
+            with profiler.stage('host_to_device'):
+                inputs, labels = inputs.to(self.device), labels.to(self.device)
+            if self.train_batch_transform:
+                with profiler.stage('batch_transform'):
+                    inputs = self.train_batch_transform(inputs)
+            
+            # The last group of an epoch can hold fewer batches; dividing by the
+            # real group size keeps the accumulated gradient a mean over batches
+            group_start = batch_idx - batch_idx % self.accumulation_steps
+            group_size = min(self.accumulation_steps, num_batches - group_start)
+            is_step = batch_idx + 1 - group_start == group_size
             
-            self.optimizer.zero_grad()
+            # DDP only needs to all-reduce gradients on the last batch of a group
+            if isinstance(self.model, DistributedDataParallel) and not is_step:
+                sync_context = self.model.no_sync()
+            else:
+                sync_context = contextlib.nullcontext()
+            
+            with sync_context:
+                with profiler.stage('forward'), autocast(self.device, self.precision):
+                    outputs = self.model(inputs)
+                    loss = self.criterion(outputs, labels)
+                
+                with profiler.stage('backward'):
+                    self.scaler.scale(loss / group_size).backward()
             
-            outputs = self.model(inputs)
-            loss = self.criterion(outputs, labels)
+            with profiler.stage('logging'):
+                metrics.update(loss, outputs, labels)
+            
+            if not is_step:
+                profiler.step()
+                continue
+            
+            with profiler.stage('optimizer'):
+                self.scaler.step(self.optimizer)
+                self.scaler.update()
+                self.optimizer.zero_grad()
+                self.optimizer_steps += 1
+                if self.scheduler and self.scheduler_interval == 'step':
+                    self.scheduler.step()
             
-            loss.backward()
-            self.optimizer.step()
+            # Mid-epoch validation on the subsample; before the checkpoint so it is part of it
+            if (self.fast_val_loader is not None and self.val_every_steps
+                    and self.optimizer_steps % self.val_every_steps == 0 and batch_idx + 1 < num_batches):
+                with profiler.stage('validation'):
+                    self.fast_validate()
+                    self.model.train()
             
-            running_loss += loss.item()
-            _, predicted = torch.max(outputs.data, 1)
-            total_samples += labels.size(0)
-            correct_predictions += (predicted == labels).sum().item()
+            if (self.checkpoint_every_steps and self.optimizer_steps % self.checkpoint_every_steps == 0
+                    and batch_idx + 1 < num_batches):
+                with profiler.stage('checkpoint'):
+                    running_loss, correct_predictions = metrics.sync()
+                    self._save_last_checkpoint({
+                        'batches': batch_idx + 1,
+                        'running_loss': running_loss,
+                        'correct': correct_predictions,
+                        'total': metrics.total
+                    })
             
             # Update progress bar
-            current_accuracy = 100 * correct_predictions / total_samples
-            progress_bar.set_postfix({
-                'Loss': f'{loss.item():.4f}',
-                'Acc': f'{current_accuracy:.2f}%'
-            })
+            if self.is_main_process and self.log_interval and self.optimizer_steps % self.log_interval == 0:
+                with profiler.stage('logging'):
+                    progress_bar.set_postfix(dict(metrics.postfix(), Step=self.optimizer_steps))
+            profiler.step()
         
-        epoch_loss = running_loss / len(self.train_loader)
+        running_loss, correct_predictions = metrics.sync()
+        running_loss, num_batches, correct_predictions, total_samples = all_reduce_sum(
+            [running_loss, num_batches, correct_predictions, metrics.total]
+        )
+        epoch_loss = running_loss / num_batches
         epoch_accuracy = 100 * correct_predictions / total_samples
         
         return epoch_loss, epoch_accuracy
     
-    def validate_epoch(self):
+    def log(self, message):
+        """Print a message from the main process only"""
+        if self.is_main_process:
+            print(message)
+    
+    def unwrapped_model(self):
+        """Return the model without its DistributedDataParallel wrapper"""
+        if isinstance(self.model, DistributedDataParallel):
+            return self.model.module
+        return self.model
+    
+    def validate_epoch(self, loader=None):
+        """Evaluate on loader (default: the validation loader) and return (loss, accuracy)"""
+        if loader is None:
+            loader = self.val_loader
         self.model.eval()
-        running_loss = 0.0
-        correct_predictions = 0
-        total_samples = 0
+        metrics = MetricAccumulator(self.device)
         
         with torch.no_grad():
-            progress_bar = tqdm(self.val_loader, desc="Validation")
+            desc = "Validation" if loader is self.val_loader else "Validation (subsample)"
+            progress_bar = tqdm(loader, desc=desc, leave=loader is self.val_loader,
+                                disable=not self.is_main_process)
             
-            for inputs, labels in progress_bar:
+            for batch_idx, (inputs, labels) in enumerate(progress_bar):
                 inputs, labels = inputs.to(self.device), labels.to(self.device)
+                if self.val_batch_transform:
+                    inputs = self.val_batch_transform(inputs)
                 
-                outputs = self.model(inputs)
-                loss = self.criterion(outputs, labels)
+                with autocast(self.device, self.precision):
+                    outputs = self.model(inputs)
+                    loss = self.criterion(outputs, labels)
                 
-                running_loss += loss.item()
-                _, predicted = torch.max(outputs.data, 1)
-                total_samples += labels.size(0)
-                correct_predictions += (predicted == labels).sum().item()
+                metrics.update(loss, outputs, labels)
                 
                 # Update progress bar
-                current_accuracy = 100 * correct_predictions / total_samples
-                progress_bar.set_postfix({
-                    'Loss': f'{loss.item():.4f}',
-                    'Acc': f'{current_accuracy:.2f}%'
-                })
+                if self.is_main_process and self.log_interval and (batch_idx + 1) % self.log_interval == 0:
+                    progress_bar.set_postfix(metrics.postfix())
         
-        epoch_loss = running_loss / len(self.val_loader)
+        running_loss, correct_predictions = metrics.sync()
+        running_loss, num_batches, correct_predictions, total_samples = all_reduce_sum(
+            [running_loss, len(loader), correct_predictions, metrics.total]
+        )
+        epoch_loss = running_loss / num_batches
         epoch_accuracy = 100 * correct_predictions / total_samples
         
         return epoch_loss, epoch_accuracy
     
-    def train(self, num_epochs, save_dir='../models', save_best=True):
-        best_val_accuracy = 0.0
-        best_model_wts = copy.deepcopy(self.model.state_dict())
+    def _check_improvement(self, val_loss):
+        """Update the early-stopping state with a monitored validation loss; return whether it improved"""
+        if val_loss < self.best_monitored_loss - self.early_stopping_min_delta:
+            self.best_monitored_loss = val_loss
+            self.evals_without_improvement = 0
+            return True
+        self.evals_without_improvement += 1
+        return False
+    
+    def fast_validate(self):
+        """Validate on the subsample loader and update the early-stopping state"""
+        val_loss, val_accuracy = self.validate_epoch(self.fast_val_loader)
+        self.fast_val_history.append((self.optimizer_steps, val_loss, val_accuracy))
+        if self._check_improvement(val_loss):
+            self._improved = True
+        if self.is_main_process:
+            message = f'Step {self.optimizer_steps}: subsample Val Loss: {val_loss:.4f}, Val Acc: {val_accuracy:.2f}%'
+            if self.evals_without_improvement:
+                message += f' (no improvement for {self.evals_without_improvement})'
+            # tqdm.write keeps the training progress bar intact
+            tqdm.write(message)
+        return val_loss, val_accuracy
+    
+    def checkpoint_state(self, epoch, best_val_accuracy, model_state_dict, rng_states=None):
+        """
+        Build a training checkpoint
         
-        # Create save directory
-        os.makedirs(save_dir, exist_ok=True)
+        model_state_dict must already be a snapshot (see snapshot_state); the
+        remaining state is snapshotted here so the checkpoint can be written
+        in the background while training continues. rng_states maps every
+        rank to its RNG state (see gather_rng_states); without it only this
+        process's state is stored.
+        """
+        if rng_states is None:
+            rng_states = {get_rank(): _get_rng_state()}
+        checkpoint = snapshot_state({
+            'epoch': epoch,
+            'optimizer_state_dict': self.optimizer.state_dict(),
+            'best_val_accuracy': best_val_accuracy,
+            'train_losses': self.train_losses,
+            'val_losses': self.val_losses,
+            'train_accuracies': self.train_accuracies,
+            'val_accuracies': self.val_accuracies,
+            'precision': self.precision,
+            'optimizer_steps': self.optimizer_steps,
+            'scheduler_state_dict': self.scheduler.state_dict() if self.scheduler else None,
+            'scaler_state_dict': self.scaler.state_dict(),
+            'learning_rates': self.learning_rates,
+            'epoch_times': self.epoch_times,
+            'seed': self.seed,
+            'batch_augment_batches': getattr(self.train_batch_transform, 'num_batches', None),
+            'rng_states': rng_states,
+            'early_stopping': {
+                'best_monitored_loss': self.best_monitored_loss,
+                'evals_without_improvement': self.evals_without_improvement,
+                'improved': self._improved,
+            },
+            'fast_val_history': self.fast_val_history,
+            'full_validation': self.full_validation,
+        })
+        checkpoint['model_state_dict'] = model_state_dict
+        return checkpoint
+    
+    def load_checkpoint(self, checkpoint):
+        """
+        Restore the full training state from a checkpoint written by train()
         
-        print(f"Starting training for {num_epochs} epochs...")
-        print(f"Model parameters: {count_parameters(self.model):,}")
+        Any checkpoint works: best_model.pth and checkpoint_epoch_NNN.pth resume
+        at the next epoch, last_checkpoint.pth can also resume mid-epoch. Call
+        before train(); training continues from the saved epoch and batch.
+        """
+        self.unwrapped_model().load_state_dict(checkpoint['model_state_dict'])
+        self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        if self.scheduler and checkpoint.get('scheduler_state_dict') is not None:
+            self.scheduler.load_state_dict(checkpoint['scheduler_state_dict'])
+        if checkpoint.get('scaler_state_dict'):
+            self.scaler.load_state_dict(checkpoint['scaler_state_dict'])
         
-        for epoch in range(num_epochs):
-            print(f'\nEpoch {epoch+1}/{num_epochs}')
-            print('-' * 50)
-            
-            # Training phase
-            train_loss, train_accuracy = self.train_epoch()
-            
-            # Validation phase
-            val_loss, val_accuracy = self.validate_epoch()
-            
-            # Store metrics
-            self.train_losses.append(train_loss)
-            self.val_losses.append(val_loss)
-            self.train_accuracies.append(train_accuracy)
-            self.val_accuracies.append(val_accuracy)
-            
-            # Learning rate scheduling
-            if self.scheduler:
-                if isinstance(self.scheduler, ReduceLROnPlateau):
-                    self.scheduler.step(val_loss)
-                else:
-                    self.scheduler.step()
-                self.learning_rates.append(self.optimizer.param_groups[0]['lr'])
-            
-            print(f'Train Loss: {train_loss:.4f}, Train Acc: {train_accuracy:.2f}%')
-            print(f'Val Loss: {val_loss:.4f}, Val Acc: {val_accuracy:.2f}%')
-            
-            if self.scheduler:
-                print(f'Learning Rate: {self.optimizer.param_groups[0]["lr"]:.6f}')
-            
-            # Save best model
-            if save_best and val_accuracy > best_val_accuracy:
-                best_val_accuracy = val_accuracy
-                best_model_wts = copy.deepcopy(self.model.state_dict())
-                torch.save({
-                    'epoch': epoch + 1,
-                    'model_state_dict': best_model_wts,
-                    'optimizer_state_dict': self.optimizer.state_dict(),
-                    'best_val_accuracy': best_val_accuracy,
-                    'train_losses': self.train_losses,
-                    'val_losses': self.val_losses,
-                    'train_accuracies': self.train_accuracies,
-                    'val_accuracies': self.val_accuracies,
-                }, os.path.join(save_dir, 'best_model.pth'))
-                print(f'New best model saved! Val Accuracy: {best_val_accuracy:.2f}%')
+        self.train_losses = list(checkpoint['train_losses'])
+        self.val_losses = list(checkpoint['val_losses'])
+        self.train_accuracies = list(checkpoint['train_accuracies'])
+        self.val_accuracies = list(checkpoint['val_accuracies'])
+        self.learning_rates = list(checkpoint.get('learning_rates', []))
+        self.epoch_times = list(checkpoint.get('epoch_times', []))
+        self.optimizer_steps = checkpoint.get('optimizer_steps', 0)
+        self.best_val_accuracy = checkpoint['best_val_accuracy']
+        self.start_epoch = checkpoint['epoch']
+        self.fast_val_history = list(checkpoint.get('fast_val_history', []))
+        self.full_validation = list(checkpoint.get('full_validation', [True] * len(self.val_accuracies)))
+        if checkpoint.get('early_stopping'):
+            self.best_monitored_loss = checkpoint['early_stopping']['best_monitored_loss']
+            self.evals_without_improvement = checkpoint['early_stopping']['evals_without_improvement']
+            self._improved = checkpoint['early_stopping']['improved']
+        
+        # Partial epoch sums are global after the all-reduce at save time, so
+        # only one process may contribute them again
+        progress = checkpoint.get('epoch_progress')
+        if progress and not self.is_main_process:
+            progress = dict(progress, running_loss=0.0, correct=0, total=0)
+        self._resume_progress = progress
+        
+        if checkpoint.get('batch_augment_batches') is not None:
+            self.train_batch_transform.num_batches = checkpoint['batch_augment_batches']
+        rng_states = checkpoint.get('rng_states')
+        if rng_states is None and checkpoint.get('rng_state'):
+            # Checkpoints from before per-rank states hold a single one
+            rng_states = {0: checkpoint['rng_state']}
+        if rng_states:
+            if get_rank() in rng_states and len(rng_states) == get_world_size():
+                _set_rng_state(rng_states[get_rank()])
+            elif len(rng_states) > 1:
+                raise ValueError(f"Checkpoint holds the RNG states of {len(rng_states)} processes, "
+                                 f"cannot resume with {get_world_size()}")
+            else:
+                # Every rank restoring the same state would repeat rank 0's augmentations
+                self.log("Checkpoint holds no per-process RNG states, resuming with fresh ones")
+    
+    def gather_rng_states(self):
+        """RNG states of all processes keyed by rank; every process must call this"""
+        return dict(enumerate(all_gather_object(_get_rng_state())))
+    
+    def _save_last_checkpoint(self, epoch_progress=None):
+        """Write last_checkpoint.pth, optionally with the position inside the current epoch"""
+        # Every process contributes its RNG state, so each can restore its own stream
+        rng_states = self.gather_rng_states()
+        if epoch_progress:
+            # Every process contributes its partial sums, even though only the main process writes
+            running_loss, correct, total = all_reduce_sum(
+                [epoch_progress['running_loss'], epoch_progress['correct'], epoch_progress['total']]
+            )
+            epoch_progress = dict(epoch_progress, running_loss=running_loss, correct=int(correct), total=int(total))
+        if self._checkpoint_writer is None:
+            return
+        
+        model_state_dict = snapshot_state(self.unwrapped_model().state_dict())
+        checkpoint = self.checkpoint_state(self._current_epoch, self.best_val_accuracy, model_state_dict,
+                                           rng_states)
+        checkpoint['epoch_progress'] = epoch_progress
+        self._checkpoint_writer.save(checkpoint, 'last_checkpoint.pth', copy=False)
+    
+    def train(self, num_epochs, save_dir='../models', save_best=True, keep_last_checkpoints=0,
+              async_checkpoint=True, checkpoint_every_steps=0, epoch_start_callback=None,
+              val_every_steps=0, early_stopping_patience=0, early_stopping_min_delta=0.0):
+        """
+        Train for num_epochs, keeping the weights with the best validation accuracy
+        
+        Args:
+            num_epochs (int): Number of epochs to train
+            save_dir (str): Directory for checkpoints
+            save_best (bool): Write best_model.pth (full training state) and
+                best_model_weights.pth (weights only) when validation accuracy improves
+            keep_last_checkpoints (int): Also write a checkpoint after every
+                epoch and keep the latest this many; 0 disables them
+            async_checkpoint (bool): Write checkpoints from a background thread
+            checkpoint_every_steps (int): Also write last_checkpoint.pth every this
+                many optimizer steps and after every epoch, so an interrupted run
+                can resume mid-epoch; 0 disables it
+            epoch_start_callback (callable, optional): Called as
+                epoch_start_callback(trainer, epoch) before every epoch, e.g.
+                to swap the data loaders with set_data_loaders
+            val_every_steps (int): With a fast_val_loader, also validate on the
+                subsample every this many optimizer steps; 0 only at epoch ends
+            early_stopping_patience (int): Stop after this many validations in a
+                row without the validation loss improving; 0 disables it. With a
+                fast_val_loader every subsample validation counts, otherwise one
+                full validation per epoch.
+            early_stopping_min_delta (float): Smallest loss decrease counted as an improvement
+        
+        With a fast_val_loader, every epoch ends with a subsample validation and
+        the full validation split is only evaluated (and best_model.pth only
+        updated) when the subsample loss improved during the epoch. val_losses
+        and val_accuracies only hold full-split metrics (NaN for epochs
+        without), the subsample ones are in fast_val_history, the epoch-end
+        subsample loss drives ReduceLROnPlateau, and full_validation records
+        which epochs were evaluated fully.
+        
+        With a profiler, the per-stage step timings of every epoch, including
+        its end-of-epoch validation, are printed and written to save_dir as profile_summary.json and
+        timeline.json (see StepProfiler).
+        
+        Returns:
+            The model with the best weights loaded
+        """
+        self.checkpoint_every_steps = checkpoint_every_steps
+        self.val_every_steps = val_every_steps
+        self.early_stopping_patience = early_stopping_patience
+        self.early_stopping_min_delta = early_stopping_min_delta
+        self.stopped_epoch = None
+        best_model_wts = snapshot_state(self.unwrapped_model().state_dict())
+        best_weights_path = os.path.join(save_dir, 'best_model_weights.pth')
+        if self.start_epoch > 0 and os.path.exists(best_weights_path):
+            # Resumed run: the best weights so far come from the interrupted run
+            best_model_wts = torch.load(best_weights_path, map_location='cpu')['model_state_dict']
+        
+        if self.is_main_process:
+            self._checkpoint_writer = CheckpointWriter(save_dir, keep_last=keep_last_checkpoints or None,
+                                                       async_write=async_checkpoint)
+        writer = self._checkpoint_writer
+        
+        if self.start_epoch > 0:
+            self.log(f"Resuming training at epoch {self.start_epoch + 1}/{num_epochs}...")
+        else:
+            self.log(f"Starting training for {num_epochs} epochs...")
+        self.log(f"Model parameters: {count_parameters(self.model):,}")
+        
+        # Resumed runs continue the clock of the interrupted one
+        elapsed = self.epoch_times[-1] if self.epoch_times else 0.0
+        try:
+            for epoch in range(self.start_epoch, num_epochs):
+                epoch_start = time.perf_counter()
+                self._current_epoch = epoch
+                self.log(f'\nEpoch {epoch+1}/{num_epochs}')
+                self.log('-' * 50)
+                
+                if epoch_start_callback:
+                    epoch_start_callback(self, epoch)
+                
+                # DistributedSampler reshuffles per epoch only when told the epoch;
+                # seeded datasets derive their per-sample augmentation from it
+                sampler = self.train_loader.sampler
+                if hasattr(sampler, 'set_epoch'):
+                    sampler.set_epoch(epoch)
+                if hasattr(self.train_loader.dataset, 'set_epoch'):
+                    self.train_loader.dataset.set_epoch(epoch)
+                if self._resume_progress and hasattr(sampler, 'set_start_index'):
+                    # Skip the samples this process already trained on before the interruption
+                    sampler.set_start_index(self._resume_progress['batches'] * self.train_loader.batch_size)
+                
+                # Training phase
+                self.profiler.start_epoch(epoch)
+                train_loss, train_accuracy = self.train_epoch()
+                
+                # Validation phase; with a subsample loader, the full split only
+                # when the subsample signalled an improvement during the epoch
+                full_validation = True
+                subsample_loss = None
+                with self.profiler.stage('validation'):
+                    if self.fast_val_loader is not None:
+                        subsample_loss, _ = self.fast_validate()
+                        full_validation = self._improved
+                        self._improved = False
+                        if full_validation:
+                            val_loss, val_accuracy = self.validate_epoch()
+                        else:
+                            # The subsample metrics are only kept in fast_val_history
+                            val_loss = val_accuracy = float('nan')
+                            self.log('Subsample did not improve, skipping full validation')
+                    else:
+                        val_loss, val_accuracy = self.validate_epoch()
+                        self._check_improvement(val_loss)
+                self.full_validation.append(full_validation)
+                
+                # The epoch profile includes the validation above
+                profile = self.profiler.end_epoch()
+                if profile:
+                    self.log(self.profiler.format_summary(profile))
+                
+                # Store metrics
+                self.train_losses.append(train_loss)
+                self.val_losses.append(val_loss)
+                self.train_accuracies.append(train_accuracy)
+                self.val_accuracies.append(val_accuracy)
+                elapsed += time.perf_counter() - epoch_start
+                self.epoch_times.append(elapsed)
+                
+                # Learning rate scheduling
+                if self.scheduler:
+                    if isinstance(self.scheduler, ReduceLROnPlateau):
+                        # The subsample is the only loss measured at every epoch end
+                        self.scheduler.step(val_loss if subsample_loss is None else subsample_loss)
+                    elif self.scheduler_interval == 'epoch':
+                        self.scheduler.step()
+                    self.learning_rates.append(self.optimizer.param_groups[0]['lr'])
+                
+                self.log(f'Train Loss: {train_loss:.4f}, Train Acc: {train_accuracy:.2f}%')
+                if full_validation:
+                    self.log(f'Val Loss: {val_loss:.4f}, Val Acc: {val_accuracy:.2f}%')
+                
+                if self.scheduler:
+                    self.log(f'Learning Rate: {self.optimizer.param_groups[0]["lr"]:.6f}')
+                
+                # Collected on every process, even though only the main process writes
+                rng_states = self.gather_rng_states()
+                
+                # Save best model
+                if save_best and full_validation and val_accuracy > self.best_val_accuracy:
+                    self.best_val_accuracy = val_accuracy
+                    best_model_wts = snapshot_state(self.unwrapped_model().state_dict())
+                    if writer:
+                        checkpoint = self.checkpoint_state(epoch + 1, self.best_val_accuracy, best_model_wts,
+                                                           rng_states)
+                        writer.save(checkpoint, 'best_model.pth', copy=False)
+                        # Weights only, for inference without the optimizer state
+                        writer.save({
+                            'epoch': epoch + 1,
+                            'model_state_dict': best_model_wts,
+                            'best_val_accuracy': self.best_val_accuracy,
+                            'precision': self.precision,
+                        }, 'best_model_weights.pth', copy=False)
+                        self.log(f'New best model saved! Val Accuracy: {self.best_val_accuracy:.2f}%')
+                
+                if writer and keep_last_checkpoints:
+                    model_state_dict = snapshot_state(self.unwrapped_model().state_dict())
+                    checkpoint = self.checkpoint_state(epoch + 1, self.best_val_accuracy, model_state_dict,
+                                                       rng_states)
+                    writer.save_epoch(checkpoint, epoch + 1, copy=False)
+                
+                if checkpoint_every_steps:
+                    self._current_epoch = epoch + 1
+                    self._save_last_checkpoint()
+                
+                if early_stopping_patience and self.evals_without_improvement >= early_stopping_patience:
+                    self.stopped_epoch = epoch + 1
+                    self.log(f'Early stopping after epoch {epoch + 1}: validation loss did not improve '
+                             f'for {self.evals_without_improvement} validations')
+                    break
+        finally:
+            # Make sure queued checkpoints reach the disk
+            if writer:
+                writer.close()
+            self._checkpoint_writer = None
+            if self.profiler.enabled and self.is_main_process:
+                summary_path, timeline_path = self.profiler.export(save_dir)
+                print(f"Step profile written to {summary_path}" + (f" and {timeline_path}" if timeline_path else ""))
         
         # Load best model weights
-        self.model.load_state_dict(best_model_wts)
+        self.unwrapped_model().load_state_dict(best_model_wts)
         
-        return self.model
+        return self.unwrapped_model()
     
-    def plot_training_history(self, save_path=None):
-        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
-        
-        # Loss plot
-        ax1.plot(self.train_losses, label='Train Loss', color='blue')
-        ax1.plot(self.val_losses, label='Validation Loss', color='red')
-        ax1.set_title('Training and Validation Loss')
-        ax1.set_xlabel('Epoch')
-        ax1.set_ylabel('Loss')
-        ax1.legend()
-        ax1.grid(True)
-        
-        # Accuracy plot
-        ax2.plot(self.train_accuracies, label='Train Accuracy', color='blue')
-        ax2.plot(self.val_accuracies, label='Validation Accuracy', color='red')
-        ax2.set_title('Training and Validation Accuracy')
-        ax2.set_xlabel('Epoch')
-        ax2.set_ylabel('Accuracy (%)')
-        ax2.legend()
-        ax2.grid(True)
-        
-        # Learning rate plot
-        if self.learning_rates:
-            ax3.plot(self.learning_rates, color='green')
-            ax3.set_title('Learning Rate Schedule')
-            ax3.set_xlabel('Epoch')
-            ax3.set_ylabel('Learning Rate')
-            ax3.set_yscale('log')
-            ax3.grid(True)
-        
-        # Combined loss and accuracy
-        ax4_twin = ax4.twinx()
-        ax4.plot(self.train_losses, label='Train Loss', color='blue', alpha=0.7)
-        ax4.plot(self.val_losses, label='Val Loss', color='red', alpha=0.7)
-        ax4_twin.plot(self.train_accuracies, label='Train Acc', color='blue', linestyle='--')
-        ax4_twin.plot(self.val_accuracies, label='Val Acc', color='red', linestyle='--')
-        
-        ax4.set_xlabel('Epoch')
-        ax4.set_ylabel('Loss')
-        ax4_twin.set_ylabel('Accuracy (%)')
-        ax4.set_title('Combined Loss and Accuracy')
-        ax4.grid(True)
-        
-        # Combine legends
-        lines1, labels1 = ax4.get_legend_handles_labels()
-        lines2, labels2 = ax4_twin.get_legend_handles_labels()
-        ax4.legend(lines1 + lines2, labels1 + labels2, loc='center right')
-        
-        plt.tight_layout()
+    def history(self):
+        """Per-epoch metrics, as plotted by draw_training_history"""
+        return {
+            'train_losses': list(self.train_losses),
+            'val_losses': list(self.val_losses),
+            'train_accuracies': list(self.train_accuracies),
+            'val_accuracies': list(self.val_accuracies),
+            'learning_rates': list(self.learning_rates),
+        }
+    
+    def plot_training_history(self, save_path=None, dpi=300):
+        """Show the training history interactively; scripts should use a ReportWriter instead"""
+        import matplotlib.pyplot as plt
+        
+        fig = plt.figure(figsize=(15, 10))
+        draw_training_history(fig, **self.history())
         
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            fig.savefig(save_path, dpi=dpi, bbox_inches='tight')
         plt.show()
 
+def progressive_resize_schedule(num_epochs, final_size=224, start_size=128, num_stages=3, multiple=32):
+    """
+    Build an image-size schedule that grows from start_size to final_size
+    
+    The epochs are split into num_stages equally long stages with sizes
+    evenly spaced between start_size and final_size (rounded to multiple),
+    so the last stage always trains at final_size.
+    
+    Returns:
+        list: (first epoch, image size) pairs, as taken by train_sports_classifier
+    """
+    num_stages = max(1, min(num_stages, num_epochs))
+    sizes = np.linspace(start_size, final_size, num_stages)
+    schedule = []
+    for stage, size in enumerate(sizes):
+        size = final_size if stage == num_stages - 1 else int(round(size / multiple)) * multiple
+        schedule.append((int(round(stage * num_epochs / num_stages)), size))
+    return schedule
+
+def scale_batch_size(batch_size, image_size, final_size, multiple=8):
+    """
+    Scale the batch size inversely with the number of pixels per image
+    
+    Keeps activation memory per step roughly constant, so smaller images are
+    processed in larger batches. Never returns less than batch_size.
+    """
+    scaled = int(batch_size * (final_size / image_size) ** 2) // multiple * multiple
+    return max(batch_size, scaled)
+
 def train_sports_classifier(
     csv_file='../archive/sports.csv',
     root_dir='../archive',
@@ -223,32 +723,180 @@ def train_sports_classifier(
     learning_rate=0.001,
     image_size=224,
     pretrained=True,
-    save_dir='../models'
+    save_dir='../models',
+    cache_dir=None,
+    batch_augment=False,
+    index_file=None,
+    precision='fp32',
+    accumulation_steps=1,
+    world_size=1,
+    master_port=29500,
+    num_workers=4,
+    keep_last_checkpoints=0,
+    async_checkpoint=True,
+    checkpoint_every_steps=0,
+    resume_from=None,
+    seed=None,
+    head='mlp',
+    image_size_schedule=None,
+    scale_batch=True,
+    target_accuracy=None,
+    profile=False,
+    log_interval=10,
+    fast_val_fraction=None,
+    val_every_steps=0,
+    early_stopping_patience=0,
+    early_stopping_min_delta=0.0,
+    report='background',
+    report_dpi=300,
+    report_format='png'
 ):
     """
     Main training function for sports classifier
+    
+    With accumulation_steps > 1, gradients of that many batches are summed
+    before each optimizer step, for an effective batch size of
+    batch_size * accumulation_steps.
+    
+    With world_size > 1, world_size local processes are spawned and train
+    with DistributedDataParallel over the gloo backend, each on its own shard
+    of the data (batch_size is per process). Only rank 0 writes checkpoints,
+    plots and config.json. The calling process then returns the best model
+    loaded from save_dir and None instead of a trainer.
+    
+    head selects the classifier head of custom_cnn (see CustomCNN); with
+    'gap' or 'dwsep' the model has ~8M instead of ~128M parameters.
+    
+    image_size_schedule enables progressive resizing: a list of (first epoch,
+    image size) pairs (see progressive_resize_schedule), with image_size as
+    the final size. The data loaders are rebuilt whenever the size changes,
+    and with scale_batch the batch size grows as the images shrink (see
+    scale_batch_size). Validation runs at the current size. With
+    target_accuracy (validation %), the wall-clock time until it was first
+    reached is printed and recorded in config.json.
+    
+    Training is reproducible for a given seed: data order and augmentation
+    are derived from it, and every checkpoint stores the seed together with
+    the optimizer, scheduler, scaler and RNG states. resume_from continues
+    an interrupted run from any checkpoint (with checkpoint_every_steps,
+    from last_checkpoint.pth in the middle of an epoch) and reproduces the
+    uninterrupted run; num_epochs is the total, not the number of extra epochs.
+    
+    profile=True records where the time of every training step goes (data
+    wait, host-to-device copy, forward, backward, optimizer, logging) and
+    writes profile_summary.json and a Chrome-trace timeline.json next to
+    config.json; profile='torch' additionally records a torch.profiler trace
+    of a few steps (see StepProfiler).
+    
+    The progress bar, and with it the loss and accuracy read back from the
+    device, is refreshed every log_interval optimizer steps.
+    
+    fast_val_fraction validates on a fixed stratified subsample of the
+    validation split every val_every_steps optimizer steps and at every
+    epoch end; the full split is only evaluated when the subsample loss
+    improved. early_stopping_patience stops training after that many
+    validations without an improvement of more than early_stopping_min_delta
+    (see Trainer.train).
+    
+    The training history plot is produced by a ReportWriter: with
+    report='background' (default) it is rendered by a separate process after
+    training returns, 'inline' renders it before returning, 'raw' only writes
+    the data to save_dir/report for python -m src.reporting, and 'none'
+    skips it. report_dpi and report_format set resolution and file format.
     """
+    if report not in REPORT_MODES:
+        raise ValueError(f"Unsupported report mode: {report}. Choose from {list(REPORT_MODES)}")
+    if profile not in (False, True, 'torch'):
+        raise ValueError(f"Unsupported profile: {profile}")
+    kwargs = dict(locals())
+    
+    # Resolve the seed before spawning so every process shares it
+    checkpoint = None
+    if resume_from:
+        checkpoint = torch.load(resume_from, map_location='cpu')
+        if checkpoint.get('seed') is not None:
+            seed = checkpoint['seed']
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 31)
+    kwargs['seed'] = seed
+    
+    if world_size > 1 and not is_distributed():
+        launch_distributed(train_sports_classifier, world_size, kwargs, master_port=master_port)
+        
+        # Spawned workers cannot hand back their objects; reload what rank 0 saved
+        with open(os.path.join(save_dir, 'config.json')) as f:
+            config = json.load(f)
+        weights_path = os.path.join(save_dir, 'best_model_weights.pth')
+        if not os.path.exists(weights_path):
+            weights_path = os.path.join(save_dir, 'final_model_weights.pth')
+        if not os.path.exists(weights_path):
+            raise ValueError(f"Rank 0 saved neither best_model_weights.pth nor final_model_weights.pth in {save_dir}")
+        model = create_model(model_name=model_name, num_classes=config['num_classes'], pretrained=False, head=head)
+        model.load_state_dict(torch.load(weights_path, map_location='cpu')['model_state_dict'])
+        return model, None
+    
     # Set device
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    print(f"Using device: {device}")
+    if torch.cuda.is_available():
+        device = torch.device('cuda', get_rank() % torch.cuda.device_count())
+    else:
+        device = torch.device('cpu')
+    if is_main_process():
+        print(f"Using device: {device}")
+    
+    # Progressive resizing: the image size and batch size of every epoch
+    stages = sorted(image_size_schedule) if image_size_schedule else [(0, image_size)]
+    
+    def stage_at(epoch):
+        sizes = [size for first_epoch, size in stages if first_epoch <= epoch]
+        stage_size = sizes[-1] if sizes else stages[0][1]
+        stage_batch_size = scale_batch_size(batch_size, stage_size, image_size) if scale_batch else batch_size
+        return stage_size, stage_batch_size
+    
+    def build_data_loaders(epoch):
+        stage_size, stage_batch_size = stage_at(epoch)
+        return create_data_loaders(
+            csv_file=csv_file,
+            root_dir=root_dir,
+            batch_size=stage_batch_size,
+            image_size=stage_size,
+            num_workers=num_workers,
+            cache_dir=cache_dir,
+            batch_augment=batch_augment,
+            index_file=index_file,
+            distributed=is_distributed(),
+            seed=seed,
+            fast_val_fraction=fast_val_fraction
+        )
     
     # Create data loaders
-    data_info = create_data_loaders(
-        csv_file=csv_file,
-        root_dir=root_dir,
-        batch_size=batch_size,
-        image_size=image_size,
-        num_workers=4
-    )
+    start_epoch = checkpoint['epoch'] if checkpoint is not None else 0
+    data_info = build_data_loaders(start_epoch)
+    current_stage = [stage_at(start_epoch)]
+    if image_size_schedule and is_main_process():
+        print(f"Progressive resizing {stages}; image size {current_stage[0][0]}, batch size {current_stage[0][1]}")
+    
+    def update_stage(trainer, epoch):
+        stage = stage_at(epoch)
+        if stage != current_stage[0]:
+            current_stage[0] = stage
+            stage_info = build_data_loaders(epoch)
+            trainer.set_data_loaders(stage_info['train_loader'], stage_info['val_loader'],
+                                     stage_info['train_batch_transform'], stage_info['val_batch_transform'],
+                                     stage_info['fast_val_loader'])
+            if is_main_process():
+                print(f"Image size {stage[0]}, batch size {stage[1]}")
     
     train_loader = data_info['train_loader']
     val_loader = data_info['val_loader']
     train_dataset = data_info['train_dataset']
     
     # Create model
+    seed_everything(seed)
     num_classes = train_dataset.num_classes
-    model = create_model(model_name=model_name, num_classes=num_classes, pretrained=pretrained)
+    model = create_model(model_name=model_name, num_classes=num_classes, pretrained=pretrained, head=head)
     model = model.to(device)
+    if is_distributed():
+        model = DistributedDataParallel(model, device_ids=[device.index] if device.type == 'cuda' else None)
     
     # Loss function and optimizer
     criterion = nn.CrossEntropyLoss()
@@ -258,42 +906,159 @@ def train_sports_classifier(
     scheduler = ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=3)
     
     # Create trainer
-    trainer = Trainer(model, train_loader, val_loader, criterion, optimizer, device, scheduler)
+    trainer = Trainer(model, train_loader, val_loader, criterion, optimizer, device, scheduler,
+                      train_batch_transform=data_info['train_batch_transform'],
+                      val_batch_transform=data_info['val_batch_transform'],
+                      precision=precision, accumulation_steps=accumulation_steps,
+                      profiler=StepProfiler(enabled=bool(profile), device=device, output_dir=save_dir,
+                                            torch_profiler=profile == 'torch', rank=get_rank()),
+                      log_interval=log_interval)
+    trainer.seed = seed
+    trainer.fast_val_loader = data_info['fast_val_loader']
+    if checkpoint is not None:
+        trainer.load_checkpoint(checkpoint)
+        if is_main_process():
+            print(f"Resumed from {resume_from} (epoch {trainer.start_epoch}, seed {seed})")
     
     # Train the model
-    best_model = trainer.train(num_epochs=num_epochs, save_dir=save_dir)
+    best_model = trainer.train(num_epochs=num_epochs, save_dir=save_dir,
+                               keep_last_checkpoints=keep_last_checkpoints,
+                               async_checkpoint=async_checkpoint,
+                               checkpoint_every_steps=checkpoint_every_steps,
+                               epoch_start_callback=update_stage if image_size_schedule else None,
+                               val_every_steps=val_every_steps,
+                               early_stopping_patience=early_stopping_patience,
+                               early_stopping_min_delta=early_stopping_min_delta)
+    
+    if not trainer.is_main_process:
+        return best_model, trainer
+    
+    # Without a best model (no improvement after resuming, or no full validation),
+    # the launching process of a distributed run gets the weights train() returned
+    if world_size > 1 and not os.path.exists(os.path.join(save_dir, 'best_model_weights.pth')):
+        atomic_save({
+            'epoch': len(trainer.train_accuracies),
+            'model_state_dict': best_model.state_dict(),
+            'best_val_accuracy': trainer.best_val_accuracy,
+            'precision': precision,
+        }, os.path.join(save_dir, 'final_model_weights.pth'))
     
     # Plot training history
-    trainer.plot_training_history(save_path=os.path.join(save_dir, 'training_history.png'))
+    report_writer = ReportWriter(save_dir, mode=report, dpi=report_dpi, formats=report_format)
+    report_writer.add('training_history', 'training_history', **trainer.history())
     
     # Save training configuration
     config = {
         'model_name': model_name,
+        'head': head,
         'num_classes': num_classes,
         'num_epochs': num_epochs,
         'batch_size': batch_size,
+        'accumulation_steps': accumulation_steps,
+        'effective_batch_size': batch_size * accumulation_steps * world_size,
         'learning_rate': learning_rate,
         'image_size': image_size,
         'pretrained': pretrained,
+        'batch_augment': batch_augment,
+        'precision': precision,
+        'world_size': world_size,
+        'seed': seed,
+        'resumed_from': resume_from,
+        'image_size_schedule': [list(stage) for stage in stages],
+        'scale_batch': scale_batch,
+        # Forward/backward cost relative to training every epoch at image_size
+        'relative_compute': float(np.mean([(stage_at(epoch)[0] / image_size) ** 2 for epoch in range(num_epochs)])),
+        'training_time': trainer.epoch_times[-1] if trainer.epoch_times else None,
+        'profile': profile,
+        'fast_val_fraction': fast_val_fraction,
+        'val_every_steps': val_every_steps,
+        'early_stopping_patience': early_stopping_patience,
+        'early_stopping_min_delta': early_stopping_min_delta,
+        'epochs_trained': len(trainer.train_accuracies),
+        'stopped_epoch': trainer.stopped_epoch,
+        'full_validations': int(sum(trainer.full_validation)),
         'final_train_accuracy': trainer.train_accuracies[-1],
-        'final_val_accuracy': trainer.val_accuracies[-1],
-        'best_val_accuracy': max(trainer.val_accuracies)
+        'final_val_accuracy': trainer.final_val_accuracy(),
+        'best_val_accuracy': trainer.best_val_accuracy
     }
     
+    if target_accuracy is not None:
+        reached = trainer.time_to_accuracy(target_accuracy)
+        config['target_accuracy'] = target_accuracy
+        config['time_to_target_accuracy'] = reached[1] if reached else None
+        config['epochs_to_target_accuracy'] = reached[0] if reached else None
+    
     with open(os.path.join(save_dir, 'config.json'), 'w') as f:
         json.dump(config, f, indent=4)
     
     print(f"\nTraining completed!")
-    print(f"Best validation accuracy: {max(trainer.val_accuracies):.2f}%")
+    print(f"Best validation accuracy: {trainer.best_val_accuracy:.2f}%")
+    if config['training_time'] is not None:
+        print(f"Training time: {config['training_time']:.1f}s")
+    if target_accuracy is not None:
+        if config['time_to_target_accuracy'] is None:
+            print(f"Validation accuracy never reached {target_accuracy:.2f}%")
+        else:
+            print(f"Reached {target_accuracy:.2f}% validation accuracy after "
+                  f"{config['time_to_target_accuracy']:.1f}s (epoch {config['epochs_to_target_accuracy']})")
     print(f"Model saved to: {save_dir}")
+    report_writer.finish()
     
     return best_model, trainer
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a sports classifier")
+    parser.add_argument('--csv-file', default='../archive/sports.csv')
+    parser.add_argument('--root-dir', default='../archive')
+    parser.add_argument('--model', default='resnet50')
+    parser.add_argument('--head', default='mlp', help='custom_cnn head')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--learning-rate', type=float, default=0.001)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--no-pretrained', action='store_true')
+    parser.add_argument('--save-dir', default='../models')
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--index-file', default=None)
+    parser.add_argument('--batch-augment', action='store_true')
+    parser.add_argument('--precision', default='fp32', choices=('fp32', 'bf16', 'fp16'))
+    parser.add_argument('--accumulation-steps', type=int, default=1)
+    parser.add_argument('--world-size', type=int, default=1)
+    parser.add_argument('--num-workers', type=int, default=4)
+    parser.add_argument('--checkpoint-every-steps', type=int, default=0)
+    parser.add_argument('--resume-from', default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--progressive-resize', action='store_true',
+                        help='Grow the image size to --image-size (see progressive_resize_schedule)')
+    parser.add_argument('--target-accuracy', type=float, default=None)
+    parser.add_argument('--profile', nargs='?', const=True, default=False, choices=(True, 'torch'),
+                        help="Record per-stage step timings; 'torch' also runs torch.profiler")
+    parser.add_argument('--log-interval', type=int, default=10)
+    parser.add_argument('--fast-val-fraction', type=float, default=None)
+    parser.add_argument('--val-every-steps', type=int, default=0)
+    parser.add_argument('--early-stopping-patience', type=int, default=0)
+    parser.add_argument('--early-stopping-min-delta', type=float, default=0.0)
+    parser.add_argument('--report', default='background', choices=REPORT_MODES)
+    parser.add_argument('--report-dpi', type=int, default=300)
+    parser.add_argument('--report-format', nargs='+', default=['png'])
+    args = parser.parse_args(argv)
+    
+    schedule = None
+    if args.progressive_resize:
+        schedule = progressive_resize_schedule(args.epochs, final_size=args.image_size)
+    train_sports_classifier(
+        csv_file=args.csv_file, root_dir=args.root_dir, model_name=args.model, num_epochs=args.epochs,
+        batch_size=args.batch_size, learning_rate=args.learning_rate, image_size=args.image_size,
+        pretrained=not args.no_pretrained, save_dir=args.save_dir, cache_dir=args.cache_dir,
+        batch_augment=args.batch_augment, index_file=args.index_file, precision=args.precision,
+        accumulation_steps=args.accumulation_steps, world_size=args.world_size, num_workers=args.num_workers,
+        checkpoint_every_steps=args.checkpoint_every_steps, resume_from=args.resume_from, seed=args.seed,
+        head=args.head, image_size_schedule=schedule, target_accuracy=args.target_accuracy,
+        profile=args.profile, log_interval=args.log_interval, fast_val_fraction=args.fast_val_fraction,
+        val_every_steps=args.val_every_steps, early_stopping_patience=args.early_stopping_patience,
+        early_stopping_min_delta=args.early_stopping_min_delta, report=args.report, report_dpi=args.report_dpi,
+        report_format=args.report_format
+    )
+
 if __name__ == "__main__":
-    # Example usage
-    model, trainer = train_sports_classifier(
-        model_name='resnet50',
-        num_epochs=10,
-        batch_size=32,
-        learning_rate=0.001
-    )
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,32 @@
+"""
+Exact resume from last_checkpoint.pth, checked by benchmarks/check_resume.py
+
+Trains a tiny model on a synthetic dataset on CPU, so it runs in about a
+minute without a GPU or the real data.
+"""
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+
+# benchmarks/ and src/ are imported as top-level packages of the project directory
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from benchmarks import check_resume
+
+@pytest.mark.parametrize('augment', list(check_resume.AUGMENT_MODES))
+def test_resumed_run_matches_uninterrupted_run(augment, tmp_path):
+    # 30 training images in batches of 8: checkpoints after step 2 and at every epoch end,
+    # so the third one falls in the middle of the second epoch
+    status = check_resume.main([
+        '--data-dir', str(tmp_path / 'data'), '--num-classes', '5', '--train-per-class', '6',
+        '--image-size', '32', '--batch-size', '8', '--num-epochs', '2',
+        '--checkpoint-every-steps', '2', '--interrupt-after', '3', '--augment', augment,
+    ])
+    assert status == 0